@@ -1,7 +1,8 @@
 """
 ASGI config for facebook_clone_backend project.
 
-It exposes the ASGI callable as a module-level variable named ``application``.
+It exposes the ASGI callable as a module-level variable named ``application``. WebSocket connections
+carry GraphQL subscriptions (see fb_post.subscriptions), everything else is served by Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -13,4 +14,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "facebook_clone_backend.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once the app registry is ready
+from fb_post.schema import schema  # noqa: E402
+from fb_post.subscriptions import GraphQLWebSocketApplication  # noqa: E402
+
+websocket_application = GraphQLWebSocketApplication(schema)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
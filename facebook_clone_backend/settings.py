@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +52,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "fb_post.instrumentation.GraphQLProfilingMiddleware",
 ]
 
 # Update the ROOT_URLCONF setting
@@ -65,6 +67,58 @@ CSRF_TRUSTED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]
 
+GRAPHENE = {
+    "MIDDLEWARE": [
+        "fb_post.instrumentation.ResolverProfilingMiddleware",
+    ],
+}
+
+# Documents estimated to cost more than this (fields resolved, multiplied by expected list sizes) or
+# nested deeper than this are rejected before execution, see fb_post/complexity.py
+GRAPHQL_MAX_QUERY_COST = 10000
+GRAPHQL_MAX_QUERY_DEPTH = 10
+
+# Parsed and validated documents kept in memory, keyed by the sha256 of the query text
+GRAPHQL_DOCUMENT_CACHE_SIZE = 500
+
+# Optional JSON file of {sha256: query} accepted as persisted queries from startup
+GRAPHQL_PERSISTED_QUERIES_FILE = None
+
+# Requests repeating one SQL statement more often than this are logged as N+1 patterns
+GRAPHQL_N_PLUS_ONE_THRESHOLD = 10
+
+# Distinct values of one /metrics label, e.g. operation names sent by clients, beyond which requests are
+# counted under "other"
+GRAPHQL_METRICS_MAX_LABEL_VALUES = 200
+
+# Worker threads, each holding its own database connection, running the SQL of /graphql/async requests,
+# see fb_post/async_execution.py
+GRAPHQL_ASYNC_DATABASE_THREADS = int(os.environ.get("GRAPHQL_ASYNC_DATABASE_THREADS", 16))
+
+# GraphQL subscriptions over WebSocket, see fb_post/subscriptions.py and fb_post/pubsub.py. Reaction count
+# updates of a post are sent at most once per GRAPHQL_SUBSCRIPTION_COALESCE_SECONDS.
+GRAPHQL_WEBSOCKET_PATH = "/graphql"
+GRAPHQL_WEBSOCKET_INIT_TIMEOUT = 3
+GRAPHQL_PUBSUB_BACKEND = "fb_post.pubsub.InProcessPubSub"
+GRAPHQL_SUBSCRIPTION_COALESCE_SECONDS = 0.25
+
+# Class encoding GraphQL responses, see fb_post/encoders.py; None picks orjson when it is installed.
+# Responses with at least GRAPHQL_STREAM_MIN_ROWS list items are streamed in chunks of about
+# GRAPHQL_STREAM_CHUNK_SIZE bytes.
+GRAPHQL_JSON_ENCODER = None
+GRAPHQL_STREAM_MIN_ROWS = 1000
+GRAPHQL_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Bearer token of the /export/posts endpoint, see fb_post/utils/export.py; the endpoint is disabled without one
+EXPORT_API_TOKEN = os.environ.get("EXPORT_API_TOKEN")
+
+# Bearer token of the /metrics Prometheus endpoint, see fb_post/instrumentation.py; disabled without one
+METRICS_API_TOKEN = os.environ.get("METRICS_API_TOKEN")
+
+# Write a GroupFeedEntry with every post so group feed pages are read from one table, see fb_post/utils/feed.py.
+# Run `manage.py backfill_group_feed` when turning this on for an existing database.
+GROUP_FEED_FAN_OUT = False
+
 # Update the WSGI_APPLICATION setting
 WSGI_APPLICATION = 'facebook_clone_backend.wsgi.application'
 TEMPLATES = [
@@ -88,12 +142,116 @@ TEMPLATES = [
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
+# SQLite by default. DATABASE_ENGINE=postgresql switches to PostgreSQL configured by the POSTGRES_* variables,
+# with persistent connections (CONN_MAX_AGE) or, with DATABASE_POOL_MAX_SIZE set, a psycopg connection pool.
+# DATABASE_REPLICA adds a "replica" alias (a host for PostgreSQL, a file for SQLite) that read-only GraphQL
+# queries and the read tasks are routed to, see fb_post/routers.py.
+
+DATABASE_ENGINE = os.environ.get("DATABASE_ENGINE", "sqlite3")
+
+if DATABASE_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("POSTGRES_DB", "facebook_clone"),
+            "USER": os.environ.get("POSTGRES_USER", "postgres"),
+            "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+            "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+            "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+            "CONN_MAX_AGE": int(os.environ.get("DATABASE_CONN_MAX_AGE", 60)),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    }
+    if os.environ.get("DATABASE_POOL_MAX_SIZE"):
+        # the pool keeps the connections open, Django refuses persistent connections on top of it
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DATABASE_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ["DATABASE_POOL_MAX_SIZE"]),
+            "timeout": int(os.environ.get("DATABASE_POOL_TIMEOUT", 10)),
+        }
+    replica = {"HOST": os.environ.get("DATABASE_REPLICA")}
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": str(BASE_DIR / 'db.sqlite3'),
+            # keeps each thread's connection, and so the PRAGMAs run on it, across requests
+            "CONN_MAX_AGE": int(os.environ.get("DATABASE_CONN_MAX_AGE", 60)),
+        }
+    }
+    replica = {"NAME": os.environ.get("DATABASE_REPLICA")}
+
+if os.environ.get("DATABASE_REPLICA"):
+    DATABASES["replica"] = {**DATABASES["default"], **replica, "TEST": {"MIRROR": "default"}}
+
+DATABASE_ROUTERS = ["fb_post.routers.PrimaryReplicaRouter"]
+
+# Run on every new SQLite connection, see fb_post/sqlite.py. busy_timeout is in milliseconds, a negative
+# cache_size in KiB.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "wal"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "normal"),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", -64000)),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000)),
+}
+
+# Run GraphQL mutations one at a time per process, in arrival order, when the database is SQLite
+SQLITE_SERIALIZE_WRITES = os.environ.get("SQLITE_SERIALIZE_WRITES", "1") == "1"
 
-DATABASES = {
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Any backend can be plugged in for the GraphQL response cache, e.g. Redis when running several processes.
+# LocMemCache evicts the least recently used entry once MAX_ENTRIES is reached.
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": str(BASE_DIR / 'db.sqlite3'),
-    }
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "graphql": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "graphql-responses",
+        "TIMEOUT": 300,
+        "OPTIONS": {
+            "MAX_ENTRIES": 1000,
+        },
+    },
+    # Automatic Persisted Queries registered by clients, kept apart so responses cannot evict them
+    "graphql-persisted-queries": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "graphql-persisted-queries",
+        "TIMEOUT": None,
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
+    },
+}
+
+GRAPHQL_RESPONSE_CACHE_ALIAS = "graphql"
+GRAPHQL_PERSISTED_QUERY_CACHE_ALIAS = "graphql-persisted-queries"
+
+
+# Logging
+# One JSON line per GraphQL request is logged to "fb_post.graphql", N+1 patterns as warnings.
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+        },
+    },
+    "loggers": {
+        "fb_post.graphql": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
 }
 
 
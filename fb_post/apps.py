@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class FbPostConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "fb_post"
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.models.signals import post_migrate
+        from fb_post import signals, sqlite  # noqa: F401
+        from fb_post.search import restore_search_triggers
+
+        post_migrate.connect(restore_search_triggers, sender=self)
+
+        if getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_FILE', None):
+            from fb_post.persisted_queries import warm_document_cache
+            from fb_post.schema import schema
+            warm_document_cache(schema.graphql_schema)
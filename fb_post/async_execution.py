@@ -0,0 +1,86 @@
+"""
+Database access for the async GraphQL view.
+
+Django's async ORM methods (aget, acount, async for) hand every query to one shared thread, so two root
+fields of the same document would still wait on the database one after the other. Instead, resolvers that
+query the database are run with database_sync_to_async, which uses a worker thread, and so a connection,
+of their own: independent root fields and the DataLoader batches of one level overlap their waits.
+
+AsyncDatabaseMiddleware decides which resolvers those are: root fields, and fields reading a foreign key
+of a model instance that was not fetched with select_related. List fields go through the DataLoaders in
+fb_post.loaders, which batch the keys requested during one turn of the event loop.
+
+The worker threads come from a pool of settings.GRAPHQL_ASYNC_DATABASE_THREADS rather than the event
+loop's default executor, which is sized by the number of CPUs and not by how many queries can wait on
+the database at once. Each thread keeps its connection for CONN_MAX_AGE, so the pool size also bounds
+the connections the async view opens.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import close_old_connections, models
+from graphene.utils.str_converters import to_snake_case
+
+from fb_post.instrumentation import current_profile, profiled_connections
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_database_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.GRAPHQL_ASYNC_DATABASE_THREADS,
+                                           thread_name_prefix='graphql-db')
+        return _executor
+
+
+def database_sync_to_async(func):
+    @wraps(func)
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            with profiled_connections(current_profile.get()):
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False, executor=get_database_executor())
+
+
+@lru_cache(maxsize=None)
+def get_model_field_name(field_name):
+    return to_snake_case(field_name)
+
+
+def is_unloaded_relation(root, field_name):
+    if not isinstance(root, models.Model):
+        return False
+    try:
+        field = root._meta.get_field(get_model_field_name(field_name))
+    except FieldDoesNotExist:
+        return False
+    return bool(field.many_to_one or field.one_to_one) and field.concrete \
+        and not field.is_cached(root) and getattr(root, field.attname) is not None
+
+
+def evaluate(result):
+    # a queryset returned by a resolver would otherwise be iterated on the event loop
+    return list(result) if isinstance(result, models.QuerySet) else result
+
+
+class AsyncDatabaseMiddleware:
+    """
+    Graphene middleware of the async view, must come last so it wraps the resolver itself
+    """
+
+    def resolve(self, next, root, info, **args):
+        is_root_field = info.parent_type is info.schema.query_type
+        if is_root_field or is_unloaded_relation(root, info.field_name):
+            return database_sync_to_async(lambda: evaluate(next(root, info, **args)))()
+        return next(root, info, **args)
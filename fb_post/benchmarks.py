@@ -0,0 +1,281 @@
+"""
+Benchmark suite of the task layer and the GraphQL API, for the run_benchmarks command.
+
+Every scale seeds a dataset generated by SyntheticData with a fixed seed and end time, so that runs on
+different commits read the same rows, through the BulkImporter, inside a transaction rolled back at the end.
+The benchmark_* commands seed their own shapes of data the same way, with import_records() and rolled_back().
+Every case runs once to warm up and then `repeat` times, measuring wall time and SQL queries; the peak memory
+allocated by Python is traced in one more run, as tracing slows the code down. Cases that write run in a
+savepoint rolled back after every run, so that every run sees the same rows. Responses are not cached and
+DEBUG is off, so the query log takes no time or memory.
+
+Results are JSON:
+    {"environment": {"commit": "2155a9a...", "database": "sqlite", ...},
+     "results": [{"scale": "small", "case": "get_post busiest", "queries": 4, "best_ms": 1.91,
+                  "median_ms": 2.03, "peak_kib": 210.4}, ...]}
+compare_results() lists the cases that run more queries than in a baseline, or take more time or memory by
+more than a threshold.
+"""
+import gc
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+
+from fb_post.constants.enum import ReactionType
+from fb_post.models import User, Membership, Post, React
+from fb_post.utils.assign_7 import get_group_feed, get_user_posts
+from fb_post.utils.importer import BulkImporter, finish_import
+from fb_post.utils.synthetic_data import SyntheticData
+from fb_post.utils.tasks import get_post, get_reaction_metrics, get_reactions_to_post, react_to_post
+
+SCALES = {
+    'small': {'users': 200, 'groups': 5, 'members_per_group': 100, 'posts': 1000},
+    'medium': {'users': 2000, 'groups': 10, 'members_per_group': 500, 'posts': 10000},
+    'large': {'users': 20000, 'groups': 20, 'members_per_group': 2000, 'posts': 100000},
+}
+SEED = 2024
+END = datetime(2024, 1, 1)
+FEED_PAGE_SIZE = 20
+WARMUP_RUNS = 3
+
+# differences in time below this are noise whatever the threshold
+TIME_NOISE_MS = 0.2
+
+UNCACHED = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "graphql": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+    "graphql-persisted-queries": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+USER_POSTS_DOCUMENT = """
+query UserPosts($userId: Int!) {
+  allPostsByUser(userId: $userId) {
+    postId content postedAt commentsCount reactionsCount
+    postedBy { userId name profilePic }
+    group { id name }
+    reactionMetrics { reaction count }
+    comments {
+      commentId content commentedAt commentedBy { userId name }
+      reactions { reaction }
+      replies { commentId content commentedAt commentedBy { userId name } }
+    }
+  }
+}
+"""
+
+POSTS_PAGE_DOCUMENT = """
+query PostsPage {
+  allPosts(first: 20) {
+    edges { cursor node { postId content postedAt commentsCount reactionsCount postedBy { userId name } } }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+POST_COMMENTS_DOCUMENT = """
+query PostComments($postId: Int!) {
+  allCommentsByPost(postId: $postId) {
+    commentId content commentedAt commentedBy { userId name profilePic }
+    reactions { reaction reactedBy { userId name } }
+    replies { commentId content commentedBy { userId name } }
+  }
+}
+"""
+
+REACT_TO_POSTS_DOCUMENT = """
+mutation ReactToPosts($reactions: [ReactionInput!]!) {
+  reactToPosts(reactions: $reactions) { results { index success error } }
+}
+"""
+
+
+def import_records(records):
+    """
+    Writes import_fb_post records, e.g. those of a SyntheticData, through the BulkImporter and finishes the
+    import, so that counters are filled in
+
+    :returns: {record type: {record id as a string: pk}}
+    """
+    importer = BulkImporter()
+    for record in records:
+        importer.add(record.pop('type'), record)
+    importer.flush_all()
+    finish_import()
+    return importer.ids
+
+
+def seed(scale):
+    """
+    :returns: the ids the cases read, see get_targets
+    """
+    ids = import_records(SyntheticData(END, seed=SEED, **SCALES[scale]))
+    return get_targets(min(ids['user'].values()), min(ids['post'].values()))
+
+
+def get_targets(first_user_id, first_post_id):
+    """
+    Picks the seeded rows the cases read, the pks of a dataset start at first_user_id and first_post_id
+    """
+    posts = Post.objects.filter(post_id__gte=first_post_id).order_by('comments_count', 'post_id')
+    busiest_post_id, group_id = posts.values_list('post_id', 'group_id').last()
+    most_reacted_post_id = posts.order_by('reactions_count', 'post_id').values_list('post_id', flat=True).last()
+    typical_post_id = posts.values_list('post_id', flat=True)[posts.count() // 2]
+    poster_id = posts.order_by().values('posted_by').annotate(posts=Count('*')) \
+        .order_by('-posts', 'posted_by').values_list('posted_by', flat=True)[0]
+    member_id = Membership.objects.filter(group_id=group_id).order_by('id').values_list('member_id', flat=True)[0]
+    reactor_id = User.objects.filter(user_id__gte=first_user_id) \
+        .exclude(user_id__in=React.objects.filter(post_id=most_reacted_post_id).values('reacted_by')) \
+        .order_by('user_id').values_list('user_id', flat=True)[0]
+    return {'busiest_post_id': busiest_post_id, 'typical_post_id': typical_post_id,
+            'most_reacted_post_id': most_reacted_post_id, 'group_id': group_id, 'member_id': member_id,
+            'poster_id': poster_id, 'reactor_id': reactor_id}
+
+
+def post_graphql(document, variables=None):
+    response = Client().post("/graphql", {"query": document, "variables": variables or {}},
+                             content_type="application/json")
+    content = b"".join(response.streaming_content) if response.streaming else response.content
+    if response.status_code != 200 or b'"errors"' in content:
+        raise RuntimeError(content[:500].decode())
+    return content
+
+
+def get_cases(targets):
+    """
+    :returns: [(case name, function running it, whether it writes)]
+    """
+    t = targets
+    reaction = ReactionType.WOW.value
+    return [
+        ("get_post typical", lambda: get_post(t['typical_post_id']), False),
+        ("get_post busiest", lambda: get_post(t['busiest_post_id']), False),
+        ("get_group_feed", lambda: get_group_feed(t['member_id'], t['group_id'], 0, FEED_PAGE_SIZE), False),
+        ("get_user_posts", lambda: get_user_posts(t['poster_id']), False),
+        ("get_reaction_metrics", lambda: get_reaction_metrics(t['most_reacted_post_id']), False),
+        ("get_reactions_to_post", lambda: get_reactions_to_post(t['most_reacted_post_id']), False),
+        ("react_to_post", lambda: react_to_post(t['reactor_id'], t['most_reacted_post_id'], reaction), True),
+        ("graphql allPostsByUser", lambda: post_graphql(USER_POSTS_DOCUMENT, {"userId": t['poster_id']}), False),
+        ("graphql allPosts page", lambda: post_graphql(POSTS_PAGE_DOCUMENT), False),
+        ("graphql allCommentsByPost",
+         lambda: post_graphql(POST_COMMENTS_DOCUMENT, {"postId": t['busiest_post_id']}), False),
+        ("graphql reactToPosts", lambda: post_graphql(REACT_TO_POSTS_DOCUMENT, {"reactions": [
+            {"userId": t['reactor_id'], "postId": t['most_reacted_post_id'], "reaction": reaction}]}), True),
+    ]
+
+
+class RollbackBenchmarkData(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """
+    Runs the block in a transaction rolled back at the end, so that the rows a benchmark seeds or writes
+    never reach the database
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise RollbackBenchmarkData
+    except RollbackBenchmarkData:
+        pass
+
+
+class QueryCounter:
+    """
+    Execute wrapper counting the SQL statements run, without the query log CaptureQueriesContext keeps
+    """
+
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+def run_once(case, writes):
+    """
+    :returns: (seconds, queries)
+    """
+    if writes:
+        with rolled_back():
+            result = run_once(case, False)
+        return result
+
+    counter = QueryCounter()
+    # as timeit does, so that a collection started by earlier runs is not timed
+    gc.collect()
+    gc.disable()
+    try:
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            case()
+            return time.perf_counter() - start, counter.queries
+    finally:
+        gc.enable()
+
+
+def measure(case, writes, repeat):
+    """
+    :returns: {"queries", "best_ms", "median_ms", "peak_kib"}
+    """
+    for _ in range(WARMUP_RUNS):
+        run_once(case, writes)
+    runs = [run_once(case, writes) for _ in range(repeat)]
+    tracemalloc.start()
+    try:
+        run_once(case, writes)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    timings = [seconds for seconds, _ in runs]
+    return {"queries": max(queries for _, queries in runs), "best_ms": round(min(timings) * 1000, 3),
+            "median_ms": round(statistics.median(timings) * 1000, 3), "peak_kib": round(peak / 1024, 1)}
+
+
+def get_environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "run_at": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(), "django": django.get_version(), "database": connection.vendor,
+            "machine": platform.machine()}
+
+
+def compare_results(baseline, results, threshold):
+    """
+    :param threshold: largest relative increase of time and peak memory that is not a regression, 0.25 for 25%
+    :returns: [(scale, case, metric, baseline value, value)] of the regressions, cases missing from either
+        side are skipped. A case is slower when both its best and median times are, as noise seldom moves both.
+    """
+    previous = {(row["scale"], row["case"]): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        before = previous.get((row["scale"], row["case"]))
+        if before is None:
+            continue
+        if row["queries"] > before["queries"]:
+            regressions.append((row["scale"], row["case"], "queries", before["queries"], row["queries"]))
+        times = ("best_ms", "median_ms")
+        if all(is_increase(before[metric], row[metric], threshold, TIME_NOISE_MS) for metric in times):
+            regressions.append((row["scale"], row["case"], "median_ms", before["median_ms"], row["median_ms"]))
+        if is_increase(before["peak_kib"], row["peak_kib"], threshold):
+            regressions.append((row["scale"], row["case"], "peak_kib", before["peak_kib"], row["peak_kib"]))
+    return regressions
+
+
+def is_increase(before, after, threshold, noise=0):
+    return after > before * (1 + threshold) and after - before > noise
@@ -0,0 +1,130 @@
+"""
+Response cache for read-only GraphQL operations.
+
+Responses are stored in the Django cache alias settings.GRAPHQL_RESPONSE_CACHE_ALIAS, whose TIMEOUT and
+MAX_ENTRIES bound how long and how many responses are kept. A cache key combines the sha256 of the query
+text, the operation name, the variables and a version token for every model the document reads; the models
+are found once per query hash, see fb_post.persisted_queries.get_document_read_models. Writes to a
+model replace its token (see fb_post.signals), which orphans exactly the cached responses that read it.
+"""
+import hashlib
+import json
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from graphql import TypeInfo, TypeInfoVisitor, Visitor, get_named_type, visit
+
+VERSION_KEY_PREFIX = 'graphql:version:'
+RESPONSE_KEY_PREFIX = 'graphql:response:'
+
+# GraphQL type name -> names of the models its fields are read from
+TYPE_MODELS = {
+    'UserType': ['User'],
+    'GroupType': ['Group', 'Membership', 'User'],
+    'PostType': ['Post'],
+    'CommentType': ['Comment'],
+    'ReactType': ['React'],
+    # reactionMetrics are read from the counter columns of Post
+    'ReactionCountType': ['Post'],
+}
+
+# Denormalized fields that change with writes to other models than their own type's
+FIELD_MODELS = {
+    ('PostType', 'commentsCount'): ['Comment'],
+    ('PostType', 'reactionsCount'): ['React'],
+    ('CommentType', 'repliesCount'): ['Comment'],
+    ('CommentType', 'reactionsCount'): ['React'],
+    # posts are found and ranked by the content of their comments too
+    ('Query', 'searchPosts'): ['Comment'],
+}
+
+
+class CacheStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def increment(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+
+stats = CacheStats()
+
+
+def get_response_cache():
+    return caches[getattr(settings, 'GRAPHQL_RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def get_read_models(schema, document):
+    """
+    :returns: sorted names of the models behind every field type selected in the document
+    """
+    type_info = TypeInfo(schema)
+    model_names = set()
+
+    class FieldTypeCollector(Visitor):
+        def enter_field(self, node, *args):
+            parent_type = type_info.get_parent_type()
+            if parent_type is not None:
+                model_names.update(FIELD_MODELS.get((parent_type.name, node.name.value), []))
+            field_type = type_info.get_type()
+            if field_type is not None:
+                model_names.update(TYPE_MODELS.get(get_named_type(field_type).name, []))
+
+    visit(document, TypeInfoVisitor(type_info, FieldTypeCollector()))
+    return sorted(model_names)
+
+
+def get_model_versions(model_names):
+    cache = get_response_cache()
+    keys = [VERSION_KEY_PREFIX + name for name in model_names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # a fresh token rather than a counter, so an evicted version can never match old responses
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_response_cache_key(query_hash, operation_name, variables, model_names):
+    """
+    :param model_names: the models the document reads, see get_read_models
+    """
+    payload = json.dumps([query_hash, operation_name, variables or {}, get_model_versions(model_names)],
+                         sort_keys=True, default=str)
+    return RESPONSE_KEY_PREFIX + hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_cached_response(key):
+    data = get_response_cache().get(key)
+    stats.increment('hits' if data is not None else 'misses')
+    return data
+
+
+def set_cached_response(key, data):
+    get_response_cache().set(key, data)
+
+
+def invalidate_models(*models):
+    """
+    Orphans cached responses that read any of the given models once the current transaction commits
+    """
+    keys = [VERSION_KEY_PREFIX + model.__name__ for model in models]
+
+    def replace_versions():
+        get_response_cache().set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+        stats.increment('invalidations')
+
+    transaction.on_commit(replace_versions)
@@ -0,0 +1,178 @@
+"""
+Static cost analysis of GraphQL documents, run as a validation rule before anything executes.
+
+The cost of a field is 1 plus the cost of its selections times the number of rows the field is expected
+to return. Connections return at most `first`/`last` nodes, other list fields are estimated from the
+table sizes, e.g. PostType.comments returns rows(Comment) / rows(Post) comments on average. Documents
+deeper than settings.GRAPHQL_MAX_QUERY_DEPTH or costlier than settings.GRAPHQL_MAX_QUERY_COST are rejected.
+"""
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from graphql import GraphQLError, GraphQLList, ValidationRule, get_named_type, get_nullable_type
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode, VariableNode
+from graphql.utilities import value_from_ast_untyped
+
+from fb_post.constants.enum import ReactionType
+from fb_post.models import User, Group, Membership, Post, Comment, React
+from fb_post.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+TABLE_STATS_CACHE_KEY = 'graphql:table-row-counts'
+TABLE_STATS_TIMEOUT = 300
+DEFAULT_LIST_SIZE = 10
+
+# (parent type, field) -> (model whose rows are returned, model whose rows they are spread over)
+LIST_FIELD_FAN_OUT = {
+    ('Query', 'allGroups'): (Group, None),
+    ('Query', 'allPostsByUser'): (Post, User),
+    ('Query', 'allCommentsByPost'): (Comment, Post),
+    ('Query', 'allReactsByPost'): (React, Post),
+    ('Query', 'postsByUserWithCommentsAndReactions'): (Post, User),
+    ('GroupType', 'members'): (Membership, Group),
+    ('PostType', 'comments'): (Comment, Post),
+    ('PostType', 'reactions'): (React, Post),
+    ('CommentType', 'reactions'): (React, Comment),
+    ('CommentType', 'replies'): (Comment, Comment),
+}
+
+FIXED_LIST_SIZES = {
+    ('PostType', 'reactionMetrics'): len(ReactionType),
+}
+
+
+def get_table_row_counts():
+    """
+    :returns: {model name: row count}, from planner statistics where the database keeps them
+    """
+    counts = cache.get(TABLE_STATS_CACHE_KEY)
+    if counts is not None:
+        return counts
+
+    models = [User, Group, Membership, Post, Comment, React]
+    tables = {model._meta.db_table: model.__name__ for model in models}
+    counts = {}
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relname = ANY(%s)", [list(tables)])
+            counts = {tables[table]: max(int(rows), 0) for table, rows in cursor.fetchall()}
+        elif connection.vendor == 'sqlite':
+            cursor.execute("SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                cursor.execute("SELECT tbl, stat FROM sqlite_stat1")
+                for table, stat in cursor.fetchall():
+                    if table in tables:
+                        counts[tables[table]] = int(stat.split()[0])
+        for model in models:
+            if model.__name__ not in counts:
+                counts[model.__name__] = model.objects.count()
+    cache.set(TABLE_STATS_CACHE_KEY, counts, TABLE_STATS_TIMEOUT)
+    return counts
+
+
+def get_argument_value(field_node, name, variables):
+    for argument in field_node.arguments:
+        if argument.name.value == name:
+            if isinstance(argument.value, VariableNode):
+                return (variables or {}).get(argument.value.name.value)
+            return value_from_ast_untyped(argument.value)
+    return None
+
+
+class QueryCostEstimator:
+
+    def __init__(self, context, variables):
+        self.context = context
+        self.variables = variables
+        self._row_counts = None
+
+    @property
+    def row_counts(self):
+        if self._row_counts is None:
+            self._row_counts = get_table_row_counts()
+        return self._row_counts
+
+    def get_list_size(self, parent_type, field_node, field_type):
+        key = (parent_type.name, field_node.name.value)
+        if field_type.name.endswith('Connection'):
+            page_size = get_argument_value(field_node, 'first', self.variables) \
+                or get_argument_value(field_node, 'last', self.variables) or DEFAULT_PAGE_SIZE
+            return min(page_size, MAX_PAGE_SIZE)
+        if parent_type.name.endswith('Connection'):
+            # edges of a connection, already counted by the page size above
+            return 1
+        if key in FIXED_LIST_SIZES:
+            return FIXED_LIST_SIZES[key]
+        if key in LIST_FIELD_FAN_OUT:
+            rows, spread_over = LIST_FIELD_FAN_OUT[key]
+            total = self.row_counts.get(rows.__name__, 0)
+            if spread_over is None:
+                return max(total, 1)
+            return max(math.ceil(total / max(self.row_counts.get(spread_over.__name__, 0), 1)), 1)
+        return DEFAULT_LIST_SIZE
+
+    def get_fields(self, selection_set, visited_fragments):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection
+            elif isinstance(selection, InlineFragmentNode):
+                yield from self.get_fields(selection.selection_set, visited_fragments)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.context.get_fragment(name)
+                if fragment is not None and name not in visited_fragments:
+                    yield from self.get_fields(fragment.selection_set, visited_fragments | {name})
+
+    def estimate(self, parent_type, selection_set, visited_fragments=frozenset()):
+        """
+        :returns: (cost, depth) of the selection set
+        """
+        cost, depth = 0, 0
+        for field_node in self.get_fields(selection_set, visited_fragments):
+            field_def = getattr(parent_type, 'fields', {}).get(field_node.name.value)
+            cost += 1
+            if field_def is None or field_node.selection_set is None:
+                continue
+            field_type = get_named_type(field_def.type)
+            child_cost, child_depth = self.estimate(field_type, field_node.selection_set, visited_fragments)
+            multiplier = 1
+            if isinstance(get_nullable_type(field_def.type), GraphQLList) or field_type.name.endswith('Connection'):
+                multiplier = self.get_list_size(parent_type, field_node, field_type)
+            cost += multiplier * child_cost
+            depth = max(depth, child_depth + 1)
+        return cost, depth
+
+
+def get_query_cost_rule(variables=None, on_estimate=None):
+    """
+    :returns: a validation rule class bound to the request's variables; on_estimate(cost, depth) is called
+        with the estimate of the costliest operation in the document
+    """
+    max_cost = getattr(settings, 'GRAPHQL_MAX_QUERY_COST', 10000)
+    max_depth = getattr(settings, 'GRAPHQL_MAX_QUERY_DEPTH', 10)
+
+    class QueryCostRule(ValidationRule):
+
+        def __init__(self, context):
+            super().__init__(context)
+            self.estimator = QueryCostEstimator(context, variables)
+            self.max_cost, self.max_depth = 0, 0
+
+        def enter_operation_definition(self, node, *args):
+            root_type = self.context.schema.get_root_type(node.operation)
+            if root_type is None:
+                return
+            cost, depth = self.estimator.estimate(root_type, node.selection_set)
+            self.max_cost, self.max_depth = max(self.max_cost, cost), max(self.max_depth, depth)
+            if depth > max_depth:
+                self.report_error(GraphQLError(f"Query depth {depth} exceeds the maximum depth of {max_depth}",
+                                               node))
+            if cost > max_cost:
+                self.report_error(GraphQLError(f"Query cost {cost} exceeds the maximum cost of {max_cost}", node))
+
+        def leave_document(self, *args):
+            if on_estimate is not None:
+                on_estimate(self.max_cost, self.max_depth)
+
+    return QueryCostRule
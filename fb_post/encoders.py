@@ -0,0 +1,131 @@
+"""
+JSON encoding of GraphQL responses.
+
+get_json_encoder() returns an instance of the class named by settings.GRAPHQL_JSON_ENCODER, by default
+OrjsonEncoder when orjson is installed and StdlibJSONEncoder otherwise. Both write date, time and
+datetime values as ISO 8601 without going through str(), and UUID and Decimal values as strings.
+
+Responses holding many list items (settings.GRAPHQL_STREAM_MIN_ROWS) are written by iter_encode() in
+chunks of about settings.GRAPHQL_STREAM_CHUNK_SIZE bytes: long lists are encoded a slice at a time, and
+items of a slice encoding to more than a few chunks one at a time, so the encoded body is never held in
+memory as a whole.
+"""
+import datetime
+import json
+from decimal import Decimal
+from uuid import UUID
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# list items encoded by one dumps() call while streaming
+STREAM_SLICE_ROWS = 100
+
+
+def encode_default(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def count_rows(value):
+    """
+    :returns: number of items of the outermost lists in value
+    """
+    if isinstance(value, dict):
+        return sum(count_rows(item) for item in value.values())
+    if isinstance(value, list):
+        return len(value)
+    return 0
+
+
+class JSONEncoder:
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or getattr(settings, 'GRAPHQL_STREAM_CHUNK_SIZE', 64 * 1024)
+
+    def dumps(self, value, pretty=False):
+        """
+        :returns: bytes, pretty output is indented with sorted keys
+        """
+        raise NotImplementedError
+
+    def iter_encode(self, value):
+        """
+        :returns: iterator of the bytes of dumps(value), in chunks of about chunk_size
+        """
+        buffer = bytearray()
+        for part in self.iter_parts(value):
+            buffer += part
+            if len(buffer) >= self.chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+
+    def iter_parts(self, value):
+        if count_rows(value) < STREAM_SLICE_ROWS:
+            yield self.dumps(value)
+        elif isinstance(value, dict):
+            yield b"{"
+            for index, (key, item) in enumerate(value.items()):
+                yield b',"' if index else b'"'
+                yield self.dumps(str(key))[1:]
+                yield b":"
+                yield from self.iter_parts(item)
+            yield b"}"
+        else:
+            yield b"["
+            for start in range(0, len(value), STREAM_SLICE_ROWS):
+                items = value[start:start + STREAM_SLICE_ROWS]
+                if start:
+                    yield b","
+                # the items of the slice without its brackets, unless a few of them hold most of the response
+                encoded = self.dumps(items)
+                if len(encoded) <= 4 * self.chunk_size:
+                    yield encoded[1:-1]
+                    continue
+                del encoded
+                for index, item in enumerate(items):
+                    if index:
+                        yield b","
+                    yield from self.iter_parts(item)
+            yield b"]"
+
+
+class StdlibJSONEncoder(JSONEncoder):
+
+    def dumps(self, value, pretty=False):
+        if pretty:
+            return json.dumps(value, sort_keys=True, indent=2, separators=(",", ": "), default=encode_default).encode()
+        return json.dumps(value, separators=(",", ":"), default=encode_default).encode()
+
+
+class OrjsonEncoder(JSONEncoder):
+
+    def dumps(self, value, pretty=False):
+        if pretty:
+            return orjson.dumps(value, default=encode_default, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+        return orjson.dumps(value, default=encode_default)
+
+
+_encoder = None
+
+
+def get_json_encoder():
+    global _encoder
+    if _encoder is None:
+        default = 'fb_post.encoders.OrjsonEncoder' if orjson is not None else 'fb_post.encoders.StdlibJSONEncoder'
+        _encoder = import_string(getattr(settings, 'GRAPHQL_JSON_ENCODER', None) or default)()
+    return _encoder
+
+
+def should_stream(value):
+    return count_rows(value) >= getattr(settings, 'GRAPHQL_STREAM_MIN_ROWS', 1000)
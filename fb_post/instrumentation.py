@@ -0,0 +1,354 @@
+"""
+Per request cost accounting for the /graphql endpoint.
+
+GraphQLProfilingMiddleware (Django) wraps every database call made while serving a GraphQL request and
+ResolverProfilingMiddleware (graphene) attributes those calls to the resolver that made them, keyed by
+"ParentType.field". Both are tracked in context variables, so SQL run in worker threads on behalf of the
+async view (see fb_post.async_execution) is attributed the same way. At the end of the request one
+structured log line is written to the "fb_post.graphql" logger, the totals are added to the in-process
+metrics served at /metrics, and SQL statements repeated more than
+settings.GRAPHQL_N_PLUS_ONE_THRESHOLD times are reported as N+1 patterns.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from inspect import isawaitable
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.db import connections
+from graphene.types.resolver import dict_or_attr_resolver
+from graphql import get_named_type, is_leaf_type
+
+from fb_post.cache import stats as response_cache_stats
+
+logger = logging.getLogger('fb_post.graphql')
+
+REPEATED_PLACEHOLDERS = re.compile(r'%s(\s*,\s*%s)+')
+
+OTHER_LABEL_VALUE = 'other'
+
+current_profile = ContextVar('graphql_profile', default=None)
+current_resolver = ContextVar('graphql_resolver', default=None)
+
+
+def get_sql_shape(sql):
+    """
+    Django passes parameters separately, so the statement is already literal free;
+    only IN (...) lists of different lengths need collapsing.
+    """
+    return REPEATED_PLACEHOLDERS.sub('%s, ...', sql)
+
+
+class ResolverStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_time = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+
+
+class RequestProfile:
+
+    def __init__(self):
+        self.operation_name = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.sql_shapes = Counter()
+        self.shape_resolvers = defaultdict(set)
+        self.resolvers = defaultdict(ResolverStats)
+        self._lock = threading.Lock()
+
+    def record_query(self, sql, duration):
+        shape = get_sql_shape(sql)
+        path = current_resolver.get()
+        with self._lock:
+            self.queries += 1
+            self.sql_time += duration
+            self.sql_shapes[shape] += 1
+            if path is not None:
+                self.resolvers[path].queries += 1
+                self.resolvers[path].sql_time += duration
+                self.shape_resolvers[shape].add(path)
+
+    def record_resolver(self, path, wall_time):
+        with self._lock:
+            resolver = self.resolvers[path]
+            resolver.calls += 1
+            resolver.wall_time += wall_time
+
+    def get_n_plus_one_patterns(self, threshold):
+        return [
+            {"sql": shape, "count": count, "resolvers": sorted(self.shape_resolvers[shape])}
+            for shape, count in self.sql_shapes.items() if count > threshold
+        ]
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record_query(sql, time.perf_counter() - start)
+
+
+class MetricsRegistry:
+    """
+    Counters rendered in the Prometheus text exposition format. Label values may come from clients, e.g.
+    operation names, so every label of a counter takes at most settings.GRAPHQL_METRICS_MAX_LABEL_VALUES
+    distinct values; later ones are counted under "other".
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._help = {}
+        # (counter name, label name): label values seen
+        self._label_values = defaultdict(set)
+
+    def inc(self, name, help_text, value=1, **labels):
+        max_values = getattr(settings, 'GRAPHQL_METRICS_MAX_LABEL_VALUES', 200)
+        with self._lock:
+            for label, label_value in labels.items():
+                seen = self._label_values[(name, label)]
+                if label_value not in seen:
+                    if len(seen) >= max_values:
+                        labels[label] = OTHER_LABEL_VALUE
+                    else:
+                        seen.add(label_value)
+            self._help[name] = help_text
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            help_texts = dict(self._help)
+        lines = []
+        for name in sorted(help_texts):
+            lines.append(f"# HELP {name} {help_texts[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for (counter_name, labels), value in counters:
+                if counter_name != name:
+                    continue
+                label_text = ",".join(f'{key}="{escape_label(label)}"' for key, label in labels)
+                lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def profiled_connections(profile):
+    """
+    Records the SQL run on this thread's connections, to every database alias, in profile
+    """
+    if profile is None:
+        yield
+        return
+    wrapped = [connections[alias] for alias in connections]
+    for connection in wrapped:
+        connection.execute_wrappers.append(profile)
+    try:
+        yield
+    finally:
+        # removed by identity rather than popped: a connection opened inside the block may have had
+        # wrappers appended after this one by connection_created receivers
+        for connection in wrapped:
+            connection.execute_wrappers.remove(profile)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = MetricsRegistry()
+
+
+def record_request_metrics(profile, wall_time, response_size, n_plus_one_patterns):
+    operation = profile.operation_name or 'anonymous'
+    metrics.inc('graphql_requests_total', "GraphQL requests served", operation=operation)
+    metrics.inc('graphql_request_seconds_total', "Wall time spent serving GraphQL requests", wall_time,
+                operation=operation)
+    metrics.inc('graphql_sql_queries_total', "SQL queries run by GraphQL requests", profile.queries,
+                operation=operation)
+    metrics.inc('graphql_sql_seconds_total', "Time spent in SQL by GraphQL requests", profile.sql_time,
+                operation=operation)
+    metrics.inc('graphql_response_bytes_total', "Bytes of GraphQL responses", response_size, operation=operation)
+    if n_plus_one_patterns:
+        metrics.inc('graphql_n_plus_one_requests_total', "GraphQL requests that repeated one SQL statement",
+                    operation=operation)
+    for path, resolver in profile.resolvers.items():
+        metrics.inc('graphql_resolver_calls_total', "Resolver calls", resolver.calls, path=path)
+        metrics.inc('graphql_resolver_seconds_total', "Wall time spent in resolvers", resolver.wall_time, path=path)
+        if resolver.queries:
+            metrics.inc('graphql_resolver_sql_queries_total', "SQL queries run by resolvers", resolver.queries,
+                        path=path)
+            metrics.inc('graphql_resolver_sql_seconds_total', "Time spent in SQL by resolvers", resolver.sql_time,
+                        path=path)
+
+
+class GraphQLProfilingMiddleware:
+    """
+    Django middleware, only requests to the GraphQL endpoints are profiled
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.paths = getattr(settings, 'GRAPHQL_PROFILING_PATHS', ['/graphql', '/graphql/async'])
+        self.n_plus_one_threshold = getattr(settings, 'GRAPHQL_N_PLUS_ONE_THRESHOLD', 10)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path not in self.paths:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        request.graphql_profile = profile
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            with profiled_connections(profile):
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.report_response(profile, response, start)
+
+    async def __acall__(self, request):
+        if request.path not in self.paths:
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        request.graphql_profile = profile
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.report_response(profile, response, start)
+
+    def report_response(self, profile, response, start):
+        if not response.streaming:
+            self.report(profile, response, time.perf_counter() - start, len(response.content))
+            return response
+        # streamed responses are reported once their last chunk is sent
+        content = response.streaming_content
+        if response.is_async:
+            async def counted_content():
+                response_size = 0
+                try:
+                    async for chunk in content:
+                        response_size += len(chunk)
+                        yield chunk
+                finally:
+                    self.report(profile, response, time.perf_counter() - start, response_size)
+        else:
+            def counted_content():
+                response_size = 0
+                try:
+                    for chunk in content:
+                        response_size += len(chunk)
+                        yield chunk
+                finally:
+                    self.report(profile, response, time.perf_counter() - start, response_size)
+        response.streaming_content = counted_content()
+        return response
+
+    def report(self, profile, response, wall_time, response_size):
+        n_plus_one_patterns = profile.get_n_plus_one_patterns(self.n_plus_one_threshold)
+        record_request_metrics(profile, wall_time, response_size, n_plus_one_patterns)
+        logger.info(json.dumps({
+            "operation": profile.operation_name,
+            "status": response.status_code,
+            "wall_ms": round(wall_time * 1000, 3),
+            "sql_queries": profile.queries,
+            "sql_ms": round(profile.sql_time * 1000, 3),
+            "response_bytes": response_size,
+            "resolvers": {
+                path: {"calls": resolver.calls, "wall_ms": round(resolver.wall_time * 1000, 3),
+                       "sql_queries": resolver.queries, "sql_ms": round(resolver.sql_time * 1000, 3)}
+                for path, resolver in profile.resolvers.items() if resolver.queries
+            },
+        }))
+        for pattern in n_plus_one_patterns:
+            logger.warning(json.dumps({"operation": profile.operation_name, "n_plus_one": pattern}))
+
+
+class ResolverProfilingMiddleware:
+    """
+    Graphene middleware, times resolvers and makes them the owners of the SQL they run. Scalar fields read by
+    graphene's default resolver are most of the fields of a large response and run no SQL, so they are
+    resolved untimed; object fields are timed even then, as a lazy foreign key load runs SQL.
+    """
+    # (parent type name, field name): whether the field is timed
+    profiled_fields = {}
+
+    def resolve(self, next, root, info, **args):
+        profile = getattr(info.context, 'graphql_profile', None)
+        if profile is None or not self.is_profiled(info):
+            return next(root, info, **args)
+
+        if profile.operation_name is None and info.operation.name is not None:
+            profile.operation_name = info.operation.name.value
+        path = f"{info.parent_type.name}.{info.field_name}"
+        token = current_resolver.set(path)
+        start = time.perf_counter()
+        try:
+            result = next(root, info, **args)
+        except Exception:
+            profile.record_resolver(path, time.perf_counter() - start)
+            raise
+        finally:
+            current_resolver.reset(token)
+        if isawaitable(result):
+            return self.await_result(profile, path, start, result)
+        profile.record_resolver(path, time.perf_counter() - start)
+        return result
+
+    def is_profiled(self, info):
+        key = (info.parent_type.name, info.field_name)
+        profiled = self.profiled_fields.get(key)
+        if profiled is None:
+            field = info.parent_type.fields[info.field_name]
+            default_resolver = getattr(field.resolve, 'func', None) is dict_or_attr_resolver
+            profiled = not (default_resolver and is_leaf_type(get_named_type(field.type)))
+            self.profiled_fields[key] = profiled
+        return profiled
+
+    @staticmethod
+    async def await_result(profile, path, start, result):
+        token = current_resolver.set(path)
+        try:
+            return await result
+        finally:
+            current_resolver.reset(token)
+            profile.record_resolver(path, time.perf_counter() - start)
+
+
+RESPONSE_CACHE_METRICS = (
+    ('hits', "GraphQL responses served from the cache"),
+    ('misses', "GraphQL response cache lookups that missed"),
+    ('invalidations', "GraphQL response cache invalidations"),
+)
+
+
+def render_metrics():
+    """
+    :returns: the request and response cache counters in Prometheus text format
+    """
+    lines = [metrics.render()]
+    cache_stats = response_cache_stats.as_dict()
+    for name, help_text in RESPONSE_CACHE_METRICS:
+        lines.append(f"# HELP graphql_response_cache_{name}_total {help_text}\n"
+                     f"# TYPE graphql_response_cache_{name}_total counter\n"
+                     f"graphql_response_cache_{name}_total {cache_stats[name]}\n")
+    return "".join(lines)
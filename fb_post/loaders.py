@@ -0,0 +1,227 @@
+import asyncio
+from collections import defaultdict
+from inspect import isawaitable
+
+from fb_post.async_execution import database_sync_to_async
+from fb_post.models import Membership, Comment, React
+from fb_post.utils.post_tree import chunked
+from fb_post.utils.tasks import get_reaction_metrics_bulk
+
+
+class BatchLoader:
+    """
+    Request scoped loader that resolves every pending key with one IN (...) query.
+
+    graphql-core executes sync resolvers depth first, so keys cannot be collected by
+    deferring the load. Instead the parent level announces its keys with expect()
+    and the first load() fetches the children of all expected siblings at once.
+    """
+
+    def __init__(self, loaders):
+        self.loaders = loaders
+        self._cache = {}
+        self._pending = set()
+
+    def batch_load(self, keys):
+        """
+        :returns: {key: value}, keys without a value get get_default()
+        """
+        raise NotImplementedError
+
+    def get_default(self):
+        return []
+
+    def expect(self, keys):
+        self._pending.update(key for key in keys if key not in self._cache)
+
+    def load(self, key):
+        if key not in self._cache:
+            self._pending.add(key)
+            keys = list(self._pending)
+            self._pending.clear()
+            results = {}
+            for batch in chunked(keys):
+                results.update(self.batch_load(batch))
+            for batch_key in keys:
+                self._cache[batch_key] = results.get(batch_key, self.get_default())
+        return self._cache[key]
+
+
+class CommentsByPostLoader(BatchLoader):
+
+    def batch_load(self, keys):
+        comments = Comment.objects.filter(post_id__in=keys).select_related('commented_by').order_by('comment_id')
+        grouped = defaultdict(list)
+        for comment in comments:
+            grouped[comment.post_id].append(comment)
+        self.loaders.expect_comments(comment for group in grouped.values() for comment in group)
+        return grouped
+
+
+class RepliesByCommentLoader(BatchLoader):
+
+    def batch_load(self, keys):
+        replies = Comment.objects.filter(reply_id__in=keys).select_related('commented_by').order_by('comment_id')
+        grouped = defaultdict(list)
+        for reply in replies:
+            grouped[reply.reply_id].append(reply)
+        self.loaders.expect_comments(reply for group in grouped.values() for reply in group)
+        return grouped
+
+
+class ReactionsByPostLoader(BatchLoader):
+
+    def batch_load(self, keys):
+        reactions = React.objects.filter(post_id__in=keys).select_related('reacted_by').order_by('id')
+        grouped = defaultdict(list)
+        for react in reactions:
+            grouped[react.post_id].append(react)
+        return grouped
+
+
+class ReactionsByCommentLoader(BatchLoader):
+
+    def batch_load(self, keys):
+        reactions = React.objects.filter(comment_id__in=keys).select_related('reacted_by').order_by('id')
+        grouped = defaultdict(list)
+        for react in reactions:
+            grouped[react.comment_id].append(react)
+        return grouped
+
+
+class MembersByGroupLoader(BatchLoader):
+
+    def batch_load(self, keys):
+        memberships = Membership.objects.filter(group_id__in=keys).select_related('member').order_by('id')
+        grouped = defaultdict(list)
+        for membership in memberships:
+            grouped[membership.group_id].append(membership.member)
+        return grouped
+
+
+class ReactionMetricsByPostLoader(BatchLoader):
+
+    def batch_load(self, keys):
+        return get_reaction_metrics_bulk(keys)
+
+    def get_default(self):
+        return {}
+
+
+class Loaders:
+    """
+    One instance per GraphQL request, see fb_post.views.BatchedGraphQLView
+    """
+
+    def __init__(self):
+        self.comments_by_post = CommentsByPostLoader(self)
+        self.reactions_by_post = ReactionsByPostLoader(self)
+        self.replies_by_comment = RepliesByCommentLoader(self)
+        self.reactions_by_comment = ReactionsByCommentLoader(self)
+        self.reaction_metrics_by_post = ReactionMetricsByPostLoader(self)
+        self.members_by_group = MembersByGroupLoader(self)
+
+    def expect_groups(self, groups):
+        self.members_by_group.expect([group.pk for group in groups])
+
+    def expect_posts(self, posts):
+        post_ids = [post.pk for post in posts]
+        self.comments_by_post.expect(post_ids)
+        self.reactions_by_post.expect(post_ids)
+        self.reaction_metrics_by_post.expect(post_ids)
+
+    def expect_comments(self, comments):
+        comment_ids = [comment.pk for comment in comments]
+        self.replies_by_comment.expect(comment_ids)
+        self.reactions_by_comment.expect(comment_ids)
+
+
+class AsyncBatchLoader:
+    """
+    DataLoader of the async view: load() returns a future, and the keys requested during one turn of
+    the event loop are fetched together by the wrapped loader's batch_load, in a worker thread.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._futures = {}
+        self._results = {}
+        self._queue = []
+
+    def load(self, key):
+        if key in self._results:
+            # graphql-core completes a plain value in place instead of awaiting it
+            return self._results[key]
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[key] = loop.create_future()
+            if not self._queue:
+                loop.call_soon(self.dispatch)
+            self._queue.append(key)
+        return future
+
+    def dispatch(self):
+        keys, self._queue = self._queue, []
+        asyncio.ensure_future(self.resolve(keys))
+
+    async def resolve(self, keys):
+        try:
+            results = await database_sync_to_async(self.batch_load)(keys)
+        except Exception as error:
+            for key in keys:
+                self._futures.pop(key).set_exception(error)
+            return
+        for key in keys:
+            self._results[key] = results.get(key, self.loader.get_default())
+            self._futures.pop(key).set_result(self._results[key])
+
+    def batch_load(self, keys):
+        results = {}
+        for batch in chunked(keys):
+            results.update(self.loader.batch_load(batch))
+        return results
+
+
+class AsyncLoaders(Loaders):
+    """
+    Loaders of the async view, every level is batched as it is reached so nothing needs to be expected
+    """
+
+    def __init__(self):
+        super().__init__()
+        for name, loader in list(vars(self).items()):
+            if isinstance(loader, BatchLoader):
+                setattr(self, name, AsyncBatchLoader(loader))
+
+    def expect_posts(self, posts):
+        pass
+
+    def expect_comments(self, comments):
+        pass
+
+    def expect_groups(self, groups):
+        pass
+
+
+def then(value, callback):
+    """
+    Applies callback to a loaded value, which is a future under the async view
+    """
+    if isawaitable(value):
+        async def resolve():
+            return callback(await value)
+        return resolve()
+    return callback(value)
+
+
+def get_loaders(info):
+    context = info.context
+    loaders = getattr(context, 'loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        try:
+            setattr(context, 'loaders', loaders)
+        except AttributeError:
+            pass
+    return loaders
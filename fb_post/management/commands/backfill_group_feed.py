@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fb_post.utils.feed import FEED_BACKFILL_BATCH_SIZE, backfill_group_feed
+
+
+class Command(BaseCommand):
+    help = "Writes the materialized group feed entries of posts created before GROUP_FEED_FAN_OUT was turned on"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=FEED_BACKFILL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        created = backfill_group_feed(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{created} feed entries written"))
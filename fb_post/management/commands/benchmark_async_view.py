@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from fb_post.benchmarks import UNCACHED, run_once
+
+DOCUMENT = """
+query Dashboard {
+  allUsers(first: 10) { edges { node { userId name } } }
+  allGroups { id name members { name } }
+  allPosts(first: 10) {
+    edges { node { postId content comments { commentId replies { commentId } reactions { reaction } } } }
+  }
+}
+"""
+
+class SlowDatabase:
+    """
+    Execute wrapper sleeping before every statement, as a database across a network would
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.latency)
+        return execute(sql, params, many, context)
+
+    def connection_created(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+
+class Command(BaseCommand):
+    help = "Compares requests/sec of the WSGI (/graphql) and ASGI (/graphql/async) views with a slow database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help="WSGI worker threads, or requests in flight on the ASGI event loop")
+        parser.add_argument('--latency', type=float, default=10, help="milliseconds added to every SQL statement")
+
+    def handle(self, *args, **options):
+        logging.getLogger('fb_post.graphql').setLevel(logging.ERROR)
+        slow_database = SlowDatabase(options['latency'] / 1000)
+        connections.close_all()
+        connection_created.connect(slow_database.connection_created)
+        try:
+            # the test clients send Host: testserver, which only the test runner adds to ALLOWED_HOSTS
+            with override_settings(CACHES=UNCACHED, ALLOWED_HOSTS=['testserver']):
+                self.stdout.write(f"{'view':<6} {'requests':>8} {'concurrency':>11} {'seconds':>8} {'req/s':>8}")
+                for name, run in (("WSGI", self.run_wsgi), ("ASGI", self.run_asgi)):
+                    elapsed, _ = run_once(lambda: run(options['requests'], options['concurrency']), False)
+                    self.stdout.write(f"{name:<6} {options['requests']:>8} {options['concurrency']:>11} "
+                                      f"{elapsed:>8.2f} {options['requests'] / elapsed:>8.1f}")
+        finally:
+            connection_created.disconnect(slow_database.connection_created)
+            connections.close_all()
+
+    @staticmethod
+    def check_response(status_code, content):
+        if status_code != 200 or b'"errors"' in content:
+            raise RuntimeError(content.decode()[:500])
+
+    def run_wsgi(self, requests, concurrency):
+        body = json.dumps({"query": DOCUMENT})
+        remaining = iter(range(requests))
+        lock = threading.Lock()
+        errors = []
+
+        def worker():
+            client = Client()
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    response = client.post("/graphql", body, content_type="application/json")
+                    self.check_response(response.status_code, response.content)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def run_asgi(self, requests, concurrency):
+        body = json.dumps({"query": DOCUMENT})
+
+        async def run():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def request():
+                async with semaphore:
+                    response = await client.post("/graphql/async", body, content_type="application/json")
+                    self.check_response(response.status_code, response.content)
+
+            await asyncio.gather(*(request() for _ in range(requests)))
+
+        asyncio.run(run())
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from fb_post.benchmarks import import_records, measure, rolled_back
+from fb_post.constants.enum import ReactionType
+from fb_post.utils.tasks import get_post
+
+
+def get_records(comments_count, replies_per_comment):
+    """
+    import_fb_post records of one post with comments_count comments of replies_per_comment replies each, a
+    reaction of every type on the post and one reaction on every comment and reply
+    """
+    now = datetime.now().isoformat()
+    reactions = [reaction.value for reaction in ReactionType]
+    yield {"type": "group", "id": "group", "name": "benchmark"}
+    for i in range(len(reactions)):
+        yield {"type": "user", "id": i, "name": f"bench user {i}", "profile_pic": ""}
+        yield {"type": "membership", "group": "group", "member": i, "is_admin": i == 0}
+    yield {"type": "post", "id": "post", "posted_by": 0, "group": "group", "posted_at": now,
+           "content": "benchmark post"}
+    for i, reaction in enumerate(reactions):
+        yield {"type": "reaction", "reacted_by": i, "post": "post", "reaction": reaction, "reacted_at": now}
+    for i in range(comments_count):
+        yield from get_comment_records(f"comment {i}", i % len(reactions), reactions[i % len(reactions)], now,
+                                       post="post")
+        for j in range(replies_per_comment):
+            user = (i + j + 1) % len(reactions)
+            yield from get_comment_records(f"reply {i} {j}", user, reactions[user], now, reply=f"comment {i}")
+
+
+def get_comment_records(comment_id, user, reaction, now, **parent):
+    yield {"type": "comment", "id": comment_id, "commented_by": user, "commented_at": now, "content": comment_id,
+           **parent}
+    yield {"type": "reaction", "reacted_by": 0, "comment": comment_id, "reaction": reaction, "reacted_at": now}
+
+
+class Command(BaseCommand):
+    help = "Measures query count and wall time of get_post against the number of comments on the post"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comments', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--replies', type=int, default=2, help="replies per comment")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'comments':>10} {'queries':>8} {'best ms':>10} {'median ms':>10} {'peak KiB':>9}")
+        for comments_count in options['comments']:
+            with rolled_back():
+                post_id = self.seed(comments_count, options['replies'])
+                result = measure(lambda: get_post(post_id), False, options['repeat'])
+            self.stdout.write(f"{comments_count:>10} {result['queries']:>8} {result['best_ms']:>10.2f} "
+                              f"{result['median_ms']:>10.2f} {result['peak_kib']:>9.0f}")
+
+    @staticmethod
+    def seed(comments_count, replies_per_comment):
+        ids = import_records(get_records(comments_count, replies_per_comment))
+        return ids['post']['post']
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from fb_post.benchmarks import END, SEED, import_records, measure, rolled_back, run_once
+from fb_post.models import Post
+from fb_post.pagination import encode_cursor
+from fb_post.utils.assign_7 import get_group_feed, get_group_feed_summary
+from fb_post.utils.feed import GROUP_FEED_ORDERING, backfill_group_feed
+from fb_post.utils.synthetic_data import SyntheticData
+
+
+class Command(BaseCommand):
+    help = "Compares group feed reads from Post (on the fly) and from the materialized feed table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--groups', type=int, default=10, help="groups the posts are spread over")
+        parser.add_argument('--limit', type=int, default=20, help="page size")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'posts':>8} {'page':>6} {'read path':<28} {'queries':>8} {'best ms':>10} "
+                          f"{'median ms':>10} {'peak KiB':>9}")
+        for posts_count in options['posts']:
+            with rolled_back():
+                user_id, group_id = self.seed(posts_count, options['groups'])
+                seconds, _ = run_once(backfill_group_feed, False)
+                self.stdout.write(f"{posts_count:>8} backfill {seconds * 1000:.2f} ms")
+                self.measure(posts_count, user_id, group_id, options['limit'], options['repeat'])
+
+    @staticmethod
+    def seed(posts_count, groups_count):
+        """
+        50 users who are members of every group; feed entries are left for the timed backfill
+        """
+        with override_settings(GROUP_FEED_FAN_OUT=False):
+            ids = import_records(SyntheticData(END, users=50, groups=groups_count, members_per_group=50,
+                                               posts=posts_count, seed=SEED))
+        return ids['user']['1'], ids['group']['1']
+
+    def measure(self, posts_count, user_id, group_id, limit, repeat):
+        depth = Post.objects.filter(group_id=group_id).count() // 2
+        posted_at, post_id = Post.objects.filter(group_id=group_id).order_by(*GROUP_FEED_ORDERING) \
+            .values_list('posted_at', 'post_id')[depth - 1]
+        deep_cursor = encode_cursor([posted_at, post_id])
+
+        for page, offset, after in (('first', 0, None), ('middle', depth, deep_cursor)):
+            reads = (
+                ("get_group_feed (offset)", False, lambda: get_group_feed(user_id, group_id, offset, limit)),
+                ("summary from posts", False, lambda: get_group_feed_summary(user_id, group_id, limit, after)),
+                ("summary from feed table", True, lambda: get_group_feed_summary(user_id, group_id, limit, after)),
+            )
+            for name, fan_out, read in reads:
+                with override_settings(GROUP_FEED_FAN_OUT=fan_out):
+                    result = measure(read, False, repeat)
+                self.stdout.write(f"{posts_count:>8} {page:>6} {name:<28} {result['queries']:>8} "
+                                  f"{result['best_ms']:>10.2f} {result['median_ms']:>10.2f} "
+                                  f"{result['peak_kib']:>9.0f}")
@@ -0,0 +1,99 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from fb_post.benchmarks import END, SEED, UNCACHED, import_records, measure, rolled_back
+from fb_post.encoders import OrjsonEncoder, StdlibJSONEncoder, orjson
+from fb_post.models import Post
+from fb_post.schema import schema
+from fb_post.utils.synthetic_data import SyntheticData
+from fb_post.views import BatchedGraphQLView
+
+DOCUMENT = """
+query UserPosts($userId: Int!) {
+  allPostsByUser(userId: $userId) {
+    postId content postedAt
+    postedBy { userId name profilePic }
+    group { id name }
+    comments { commentId content commentedAt commentedBy { userId name profilePic } }
+  }
+}
+"""
+
+def render_previous(payload):
+    # json.dumps to str, encoded again by HttpResponse, as graphene-django's GraphQLView does
+    return [HttpResponse(json.dumps(payload, separators=(",", ":")), content_type="application/json").content]
+
+
+def read_chunks(render):
+    """
+    :returns: (bytes, seconds to the first chunk, largest chunk), chunks are dropped as they are read, as a
+        server sending them would
+    """
+    size = largest_chunk = 0
+    first_chunk = None
+    start = time.perf_counter()
+    for chunk in render():
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - start
+        size += len(chunk)
+        largest_chunk = max(largest_chunk, len(chunk))
+    return size, first_chunk, largest_chunk
+
+
+class Command(BaseCommand):
+    help = "Compares time, peak memory and chunk sizes of rendering a large GraphQL response as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--comments', type=float, default=3, help="mean number of comments per post")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back(), override_settings(CACHES=UNCACHED, GRAPHQL_MAX_QUERY_COST=10 ** 9):
+            payload = self.get_payload(self.seed(options['posts'], options['comments']))
+            self.compare(payload, options['posts'], options['repeat'])
+
+    def compare(self, payload, posts_count, repeat):
+        renderers = [("json.dumps, previous", lambda: render_previous(payload)),
+                     ("StdlibJSONEncoder", lambda: [StdlibJSONEncoder().dumps(payload)]),
+                     ("StdlibJSONEncoder, streamed", lambda: StdlibJSONEncoder().iter_encode(payload))]
+        if orjson is not None:
+            renderers += [("OrjsonEncoder", lambda: [OrjsonEncoder().dumps(payload)]),
+                          ("OrjsonEncoder, streamed", lambda: OrjsonEncoder().iter_encode(payload))]
+        else:
+            self.stdout.write("orjson is not installed, only the stdlib encoder is measured")
+
+        self.stdout.write(f"{posts_count} posts rendered:")
+        self.stdout.write(f"{'encoder':<30} {'KiB':>8} {'best ms':>8} {'median ms':>9} {'first chunk ms':>14} "
+                          f"{'largest chunk KiB':>17} {'peak KiB':>9}")
+        for name, render in renderers:
+            chunks = []
+            result = measure(lambda: chunks.append(read_chunks(render)), False, repeat)
+            size, _, largest_chunk = chunks[-1]
+            first_chunk = min(first for _, first, _ in chunks)
+            self.stdout.write(f"{name:<30} {size / 1024:>8.0f} {result['best_ms']:>8.1f} {result['median_ms']:>9.1f} "
+                              f"{first_chunk * 1000:>14.1f} {largest_chunk / 1024:>17.0f} "
+                              f"{result['peak_kib']:>9.0f}")
+
+    @staticmethod
+    def seed(posts_count, comments_per_post):
+        """
+        :returns: id of the user who wrote every post, the only member of the group
+        """
+        ids = import_records(SyntheticData(END, users=100, groups=1, members_per_group=1, posts=posts_count,
+                                           comments_per_post=comments_per_post, seed=SEED))
+        return Post.objects.values_list('posted_by', flat=True).get(pk=ids['post']['1'])
+
+    @staticmethod
+    def get_payload(user_id):
+        request = RequestFactory().post("/graphql", content_type="application/json")
+        payload, status_code = BatchedGraphQLView(schema=schema).get_response_data(
+            request, {"query": DOCUMENT, "variables": {"userId": user_id}})
+        if status_code != 200 or "errors" in payload:
+            raise RuntimeError(json.dumps(payload)[:500])
+        return payload
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+
+from fb_post.benchmarks import END, SEED, import_records, measure, rolled_back
+from fb_post.models import Post, Comment
+from fb_post.utils.serializers import get_comment_rows, get_post_rows, serialize_comment, serialize_post
+from fb_post.utils.synthetic_data import SyntheticData
+
+
+def get_user_dict(user):
+    return {"user_id": user.user_id, "name": user.name, "profile_pic": user.profile_pic}
+
+
+def get_model_dicts(post_ids, select_related):
+    """
+    Post and comment dicts built the way the former Post.get_post_dict and Comment.get_comment_dict did
+    """
+    posts = Post.objects.filter(pk__in=post_ids)
+    comments = Comment.objects.filter(post_id__in=post_ids).order_by('comment_id')
+    if select_related:
+        posts, comments = posts.select_related('posted_by', 'group'), comments.select_related('commented_by')
+    post_dicts = [{
+        "post_id": post.post_id, "group": {"group_id": post.group.id, "name": post.group.name},
+        "posted_by": get_user_dict(post.posted_by), "posted_at": post.posted_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "post_content": post.content,
+        "reactions": {"count": post.reactions_count,
+                      "type": [reaction for reaction, count in post.get_reaction_counts_dict().items() if count]},
+    } for post in posts]
+    comment_dicts = [{
+        "comment_id": comment.comment_id, "commenter": get_user_dict(comment.commented_by),
+        "commented_at": comment.commented_at.strftime("%Y-%m-%d %H:%M:%S"), "comment_content": comment.content,
+    } for comment in comments]
+    return post_dicts, comment_dicts
+
+
+def get_projected_dicts(post_ids):
+    post_dicts = [serialize_post(row) for row in get_post_rows(Post.objects.filter(pk__in=post_ids))]
+    comment_dicts = [serialize_comment(row) for row in
+                     get_comment_rows(Comment.objects.filter(post_id__in=post_ids).order_by('comment_id'))]
+    return post_dicts, comment_dicts
+
+
+class Command(BaseCommand):
+    help = "Compares time and peak memory of serializing posts and their comments from models and from projections"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=float, default=3, help="mean number of comments per post")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            post_ids = self.seed(options['posts'], options['comments'])
+            serializers = (
+                ("model instances, lazy FKs", lambda: get_model_dicts(post_ids, select_related=False)),
+                ("model instances, select_related", lambda: get_model_dicts(post_ids, select_related=True)),
+                ("values_list projections", lambda: get_projected_dicts(post_ids)),
+            )
+            if get_model_dicts(post_ids, True) != get_projected_dicts(post_ids):
+                raise RuntimeError("The serializers returned different dicts")
+            per = 1000 / len(post_ids)
+            self.stdout.write(f"{len(post_ids)} posts, {options['comments']:g} comments each on average; "
+                              f"per 1,000 posts:")
+            self.stdout.write(f"{'serializer':<34} {'queries':>8} {'best ms':>10} {'median ms':>10} {'peak KiB':>10}")
+            for name, serialize in serializers:
+                result = measure(serialize, False, options['repeat'])
+                self.stdout.write(f"{name:<34} {result['queries'] * per:>8.0f} {result['best_ms'] * per:>10.1f} "
+                                  f"{result['median_ms'] * per:>10.1f} {result['peak_kib'] * per:>10.0f}")
+
+    @staticmethod
+    def seed(posts_count, comments_per_post):
+        ids = import_records(SyntheticData(END, users=100, groups=1, members_per_group=100, posts=posts_count,
+                                           comments_per_post=comments_per_post, seed=SEED))
+        return list(ids['post'].values())
@@ -0,0 +1,95 @@
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from fb_post.benchmarks import END, SEED, import_records, measure, rolled_back
+from fb_post.models import Group, Post, Comment, React
+from fb_post.utils.assign_7 import get_posts_with_more_comments_than_reactions, get_silent_group_members
+from fb_post.utils.counters import count_subquery
+from fb_post.utils.synthetic_data import SyntheticData
+
+
+def get_posts_by_row_counts():
+    """
+    Post ids compared on COUNT(*) subqueries over the comment and reaction rows, in one query
+    """
+    return Post.objects.annotate(comments=count_subquery(Comment.objects.all(), 'post'),
+                                reactions=count_subquery(React.objects.all(), 'post')) \
+        .filter(comments__gt=F('reactions')).values_list('post_id', flat=True).iterator()
+
+
+def get_posts_by_count_per_post():
+    """
+    Two count() queries per post, as the task originally did
+    """
+    for post_id in Post.objects.values_list('post_id', flat=True):
+        if Comment.objects.filter(post_id=post_id).count() > React.objects.filter(post_id=post_id).count():
+            yield post_id
+
+
+def get_silent_members_by_count_per_member(group_id):
+    """
+    One count() query per member, as the task originally did
+    """
+    for user in Group.objects.get(id=group_id).members.all():
+        if Post.objects.filter(posted_by=user).count() == 0:
+            yield user.user_id
+
+
+def count_ids(read):
+    """
+    Consumes the ids without keeping them
+    """
+    return sum(1 for _ in read())
+
+
+class Command(BaseCommand):
+    help = "Compares query count, time and peak memory of the set-based id queries with per-row count() loops"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--members', type=int, default=1000, help="members of the group, half never post")
+        parser.add_argument('--loop-limit', type=int, default=10000,
+                            help="largest number of posts the per-row loops are measured at")
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'posts':>8} {'query':<48} {'ids':>7} {'queries':>8} {'best ms':>10} {'median ms':>10} "
+                          f"{'peak KiB':>9}")
+        for posts_count in options['posts']:
+            with rolled_back():
+                group_id = self.seed(posts_count, options['members'])
+                reads = [
+                    ("more comments than reactions, counters", get_posts_with_more_comments_than_reactions),
+                    ("more comments than reactions, COUNT subqueries", get_posts_by_row_counts),
+                    ("silent members, NOT EXISTS", lambda: get_silent_group_members(group_id)),
+                ]
+                if posts_count <= options['loop_limit']:
+                    reads += [
+                        ("more comments than reactions, count() per post", get_posts_by_count_per_post),
+                        ("silent members, count() per member",
+                         lambda: get_silent_members_by_count_per_member(group_id)),
+                    ]
+                if set(get_posts_with_more_comments_than_reactions()) != set(get_posts_by_row_counts()):
+                    raise RuntimeError("The counters disagree with the comment and reaction rows")
+                for name, read in reads:
+                    ids = count_ids(read)
+                    result = measure(lambda: count_ids(read), False, options['repeat'])
+                    self.stdout.write(f"{posts_count:>8} {name:<48} {ids:>7} {result['queries']:>8} "
+                                      f"{result['best_ms']:>10.1f} {result['median_ms']:>10.1f} "
+                                      f"{result['peak_kib']:>9.0f}")
+
+    @staticmethod
+    def seed(posts_count, members_count):
+        """
+        Half of the members post, the other half are added to the group after the posts and never post
+        """
+        posters = members_count - members_count // 2
+        records = chain(
+            SyntheticData(END, users=posters, groups=1, members_per_group=posters, posts=posts_count, seed=SEED),
+            *(({"type": "user", "id": f"silent {i}", "name": f"silent user {i}", "profile_pic": ""},
+               {"type": "membership", "group": 1, "member": f"silent {i}", "is_admin": False})
+              for i in range(members_count // 2)),
+        )
+        return import_records(records)['group']['1']
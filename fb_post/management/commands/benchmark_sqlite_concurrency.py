@@ -0,0 +1,132 @@
+import os
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test.utils import override_settings
+
+from fb_post.constants.enum import ReactionType
+from fb_post.models import User, Group, Membership, Post
+from fb_post.sqlite import immediate_transactions, write_queue
+from fb_post.utils.tasks import get_post, react_to_post, create_comment
+
+# PRAGMAs of a connection left at SQLite's defaults, except for Python's own 5 second busy timeout
+DEFAULT_PRAGMAS = {"journal_mode": "delete", "synchronous": "full", "mmap_size": 0, "cache_size": -2000,
+                   "busy_timeout": 5000}
+
+
+class Command(BaseCommand):
+    help = "Measures read and write throughput of N reader and M writer threads against a temporary SQLite database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark measures SQLite locking, the default database is not SQLite")
+
+        # the runs write rows and persist journal_mode in the database file, so they get a file of their own
+        with tempfile.TemporaryDirectory() as directory:
+            connections.close_all()
+            database_name, test_settings = connection.settings_dict['NAME'], connection.settings_dict['TEST']
+            connection.settings_dict['TEST'] = {**connection.settings_dict['TEST'],
+                                                'NAME': os.path.join(directory, 'concurrency.sqlite3')}
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self.compare(options)
+            finally:
+                connections.close_all()
+                connection.creation.destroy_test_db(database_name, verbosity=0)
+                connection.settings_dict['TEST'] = test_settings
+
+    def compare(self, options):
+        user_ids, post_id, commented_post_id = self.seed(options['writers'])
+        modes = (
+            ("defaults", DEFAULT_PRAGMAS, False, False),
+            ("SQLITE_PRAGMAS", settings.SQLITE_PRAGMAS, True, False),
+            ("SQLITE_PRAGMAS + queue", settings.SQLITE_PRAGMAS, True, True),
+        )
+        self.stdout.write(f"{'mode':<24} {'reads/s':>10} {'writes/s':>10} {'errors':>8}")
+        for name, pragmas, immediate, serialize in modes:
+            reads, writes, errors = self.run(pragmas, immediate, serialize, user_ids, post_id, commented_post_id,
+                                             options)
+            seconds = options['seconds']
+            self.stdout.write(f"{name:<24} {reads / seconds:>10.1f} {writes / seconds:>10.1f} {errors:>8}")
+
+    def seed(self, writers):
+        users = User.objects.bulk_create([User(name=f"bench writer {i}", profile_pic="") for i in range(writers)])
+        group = Group.objects.create(name="concurrency benchmark")
+        Membership.objects.bulk_create([Membership(group=group, member=user) for user in users])
+        # readers fetch the first post, comments go to the second so the read does not grow during the run
+        posts = Post.objects.bulk_create([
+            Post(content=f"benchmark post {i}", posted_at=datetime.now(), posted_by=users[0], group=group)
+            for i in range(2)
+        ])
+        return [user.user_id for user in users], posts[0].post_id, posts[1].post_id
+
+    def run(self, pragmas, immediate, serialize, user_ids, post_id, commented_post_id, options):
+        # journal_mode is stored in the database file, the other PRAGMAs apply to new connections
+        connections.close_all()
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            connection.ensure_connection()
+            connections.close_all()
+
+            deadline = time.perf_counter() + options['seconds']
+            counts = {"reads": 0, "writes": 0, "errors": 0}
+            lock = threading.Lock()
+
+            def count(name):
+                with lock:
+                    counts[name] += 1
+
+            def read():
+                get_post(post_id)
+
+            def write(user_id, i):
+                if i % 2:
+                    create_comment(user_id, commented_post_id, f"comment {i}")
+                else:
+                    reactions = list(ReactionType)
+                    react_to_post(user_id, post_id, reactions[i % len(reactions)].value)
+
+            def reader():
+                try:
+                    while time.perf_counter() < deadline:
+                        try:
+                            read()
+                            count("reads")
+                        except OperationalError:
+                            count("errors")
+                finally:
+                    connection.close()
+
+            def writer(user_id):
+                i = 0
+                try:
+                    while time.perf_counter() < deadline:
+                        i += 1
+                        try:
+                            # as serialized_writes does for GraphQL mutations
+                            with write_queue.turn() if serialize else nullcontext(), \
+                                    immediate_transactions() if immediate else nullcontext():
+                                write(user_id, i)
+                            count("writes")
+                        except OperationalError:
+                            count("errors")
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+            threads += [threading.Thread(target=writer, args=(user_id,)) for user_id in user_ids]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return counts["reads"], counts["writes"], counts["errors"]
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Exists, OuterRef
+
+from fb_post.models import Membership, Post, Comment, React, GroupFeedEntry
+from fb_post.pagination import keyset_filter
+from fb_post.utils.export import EXPORT_ORDERING
+from fb_post.utils.feed import GROUP_FEED_ORDERING
+
+
+def get_hot_queries():
+    """
+    The lookups behind the feed, post detail and reaction write paths, with placeholder ids
+    """
+    return {
+        "react by user on post": React.objects.filter(reacted_by_id=1, post_id=1),
+        "react by user on comment": React.objects.filter(comment_id=1, reacted_by_id=1),
+        "reactions of posts": React.objects.filter(post_id__in=[1, 2]),
+        "reactions of comments": React.objects.filter(comment_id__in=[1, 2]),
+        "comments of post": Comment.objects.filter(post_id=1).order_by('comment_id'),
+        "replies of comment": Comment.objects.filter(reply_id=1).order_by('comment_id'),
+        "group feed": Post.objects.filter(group_id=1).order_by(*GROUP_FEED_ORDERING)[:20],
+        "group feed after cursor": Post.objects.filter(group_id=1).filter(
+            keyset_filter(GROUP_FEED_ORDERING, ['2024-01-01 00:00:00', 1], True)).order_by(*GROUP_FEED_ORDERING)[:20],
+        "materialized group feed": GroupFeedEntry.objects.filter(group_id=1).select_related('post')
+            .order_by('-posted_at', '-post_id')[:20],
+        "posts of user": Post.objects.filter(posted_by_id=1),
+        "silent members of group": Membership.objects.filter(group_id=1)
+            .filter(~Exists(Post.objects.filter(posted_by=OuterRef('member_id')))).values_list('member_id'),
+        "posts after export watermark": Post.objects.filter(
+            keyset_filter(EXPORT_ORDERING, ['2024-01-01 00:00:00', 1], True)).order_by(*EXPORT_ORDERING),
+    }
+
+
+def get_plan_problems(plan):
+    """
+    :returns: the steps of an EXPLAIN QUERY PLAN that read a whole table or index, SCAN ... USING INDEX
+        included, or sort in memory; only SEARCH steps seek into an index
+    """
+    problems = []
+    for line in plan.splitlines():
+        detail = line.split(maxsplit=3)[-1]
+        if detail.startswith('SCAN '):
+            problems.append(detail)
+        if 'USE TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN QUERY PLAN on the hot queries and fails if any of them scans a table or sorts in memory"
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Query plan checks are written against SQLite's EXPLAIN QUERY PLAN output")
+
+        failures = 0
+        for name, queryset in get_hot_queries().items():
+            plan = queryset.explain()
+            problems = get_plan_problems(plan)
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"{name}: {'; '.join(problems)}"))
+            else:
+                self.stdout.write(f"{name}: ok")
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+        if failures:
+            raise CommandError(f"{failures} hot queries do not use an index")
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries
+
+from fb_post.utils.export import CSV_COLUMNS, EXPORT_CHUNK_SIZE, PostExport
+
+
+class Command(BaseCommand):
+    help = "Streams posts with their comments, replies and reactions as NDJSON, or one table of them as CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+        parser.add_argument('--table', choices=list(CSV_COLUMNS), default='posts', help="table exported as CSV")
+        parser.add_argument('--output', default='-', help="file written, - for stdout")
+        parser.add_argument('--after', help="watermark of a previous export, only newer posts are exported")
+        parser.add_argument('--watermark-file',
+                            help="file the watermark is read from, unless --after is given, and written back to "
+                                 "once the export is complete")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        after = options['after']
+        watermark_file = options['watermark_file']
+        if after is None and watermark_file and os.path.exists(watermark_file):
+            with open(watermark_file) as file:
+                after = file.read().strip() or None
+
+        start = time.perf_counter()
+        try:
+            export = PostExport(after, options['chunk_size'])
+        except Exception as error:
+            raise CommandError(f"Invalid watermark: {error}")
+        chunks = export.iter_ndjson() if options['format'] == 'ndjson' else export.iter_csv(options['table'])
+        if options['output'] == '-':
+            self.write_chunks(chunks, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+        else:
+            # written under another name first, so an interrupted export leaves no partial file behind
+            partial = f"{options['output']}.part"
+            with open(partial, 'wb') as file:
+                self.write_chunks(chunks, file)
+            os.replace(partial, options['output'])
+
+        if watermark_file and export.watermark:
+            with open(watermark_file, 'w') as file:
+                file.write(export.watermark + "\n")
+        rows = "posts" if options['format'] == 'ndjson' else f"{options['table']} rows"
+        self.stderr.write(f"{export.exported} {rows} exported in {time.perf_counter() - start:.2f} s, "
+                          f"watermark {export.watermark}", style_func=self.style.SUCCESS)
+
+    @staticmethod
+    def write_chunks(chunks, file):
+        for chunk in chunks:
+            file.write(chunk)
+            # with DEBUG on, every statement is logged, and those of a chunk list the ids of its posts
+            reset_queries()
@@ -0,0 +1,59 @@
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from fb_post.encoders import get_json_encoder
+from fb_post.utils.export import iter_chunks
+from fb_post.utils.synthetic_data import SyntheticData
+
+
+class Command(BaseCommand):
+    help = "Writes synthetic users, groups, posts, comments and reactions as NDJSON records for import_fb_post"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--members-per-group', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments-per-post', type=float, default=3.0, help="mean, geometric distribution")
+        parser.add_argument('--replies-per-comment', type=float, default=0.5, help="mean, geometric distribution")
+        parser.add_argument('--reply-depth', type=int, default=1, help="levels of replies, 0 for none")
+        parser.add_argument('--reaction-alpha', type=float, default=1.2,
+                            help="Pareto shape of the reactions per post, smaller for a heavier tail")
+        parser.add_argument('--comment-reaction-alpha', type=float, default=2.0,
+                            help="Pareto shape of the reactions per comment")
+        parser.add_argument('--days', type=int, default=365, help="days the posts are spread over")
+        parser.add_argument('--end', type=datetime.fromisoformat,
+                            help="time of the newest post, now by default, to generate the same records again")
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--output', default='-', help="file written, - for stdout")
+
+    def handle(self, *args, **options):
+        data = SyntheticData(
+            options['end'] or datetime.now().replace(microsecond=0), users=options['users'],
+            groups=options['groups'], members_per_group=options['members_per_group'], posts=options['posts'],
+            comments_per_post=options['comments_per_post'], replies_per_comment=options['replies_per_comment'],
+            reply_depth=options['reply_depth'], reaction_alpha=options['reaction_alpha'],
+            comment_reaction_alpha=options['comment_reaction_alpha'], days=options['days'], seed=options['seed'])
+        if options['output'] == '-':
+            counts = self.write_records(data, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+        else:
+            with open(options['output'], 'wb') as file:
+                counts = self.write_records(data, file)
+        self.stderr.write(", ".join(f"{count} {record_type}s" for record_type, count in counts.items()),
+                          style_func=self.style.SUCCESS)
+
+    @staticmethod
+    def write_records(records, file):
+        """
+        :returns: {record type: number of records written}
+        """
+        encoder = get_json_encoder()
+        counts = {}
+        for chunk in iter_chunks(iter(records), 1000):
+            for record in chunk:
+                counts[record['type']] = counts.get(record['type'], 0) + 1
+            file.write(b"".join(encoder.dumps(record) + b"\n" for record in chunk))
+        return counts
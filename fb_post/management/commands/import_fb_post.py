@@ -0,0 +1,85 @@
+import csv
+import io
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, reset_queries
+
+from fb_post.models import Post, Comment, React
+from fb_post.utils.importer import (IMPORT_BATCH_SIZE, RECORD_TYPES, BulkImporter, deferred_indexes, finish_import,
+                                    parse_csv, parse_ndjson)
+
+
+class Command(BaseCommand):
+    help = "Bulk imports users, groups, memberships, posts, comments and reactions from NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+',
+                            help="files read in order, - for stdin; records can refer to those of earlier files")
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+        parser.add_argument('--type', nargs='+', choices=list(RECORD_TYPES), default=[],
+                            help="record type of the rows of each CSV file")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--defer-indexes', action='store_true',
+                            help="drop the post, comment and reaction indexes during the import and create them "
+                                 "again after, for imports much larger than the tables already are")
+        parser.add_argument('--skip-counters', action='store_true',
+                            help="leave the counters as imported, when rebuild_counters is run after several imports")
+        parser.add_argument('--progress', type=int, default=100000, help="records between progress reports")
+
+    def handle(self, *args, **options):
+        if options['format'] == 'csv' and len(options['type']) != len(options['paths']):
+            raise CommandError("--format csv needs one --type per file")
+
+        importer = BulkImporter(options['batch_size'])
+        start = time.perf_counter()
+        indexes = deferred_indexes([Post, Comment, React]) if options['defer_indexes'] else nullcontext()
+        try:
+            with indexes:
+                self.add_records(importer, self.read_records(options), options['progress'])
+        finally:
+            # rows of the batches written before a failure stay, with their counters and feed entries
+            finish_import(rebuild=not options['skip_counters'])
+
+        elapsed = time.perf_counter() - start
+        imported = sum(importer.imported.values())
+        for record_type, count in importer.imported.items():
+            self.stdout.write(f"{record_type:<12} {count:>10}")
+        self.stdout.write(self.style.SUCCESS(f"{imported} records imported in {elapsed:.2f} s, "
+                                             f"{imported / elapsed:.0f} records/s"))
+
+    @staticmethod
+    def read_records(options):
+        for index, path in enumerate(options['paths']):
+            if path == '-':
+                file = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+            else:
+                file = open(path, encoding='utf-8', newline='')
+            with file:
+                if options['format'] == 'ndjson':
+                    yield from parse_ndjson(file)
+                else:
+                    yield from parse_csv(csv.DictReader(file), options['type'][index])
+
+    def add_records(self, importer, records, progress):
+        start = time.perf_counter()
+        # number of the record being read or added, counted across files
+        line = 1
+        try:
+            for record_type, record in records:
+                importer.add(record_type, record)
+                if line % importer.batch_size == 0:
+                    # with DEBUG on, every batch insert is logged with all its values
+                    reset_queries()
+                if line % progress == 0:
+                    self.stderr.write(f"{line} records read, {line / (time.perf_counter() - start):.0f} records/s")
+                line += 1
+            importer.flush_all()
+        except (ValueError, TypeError) as error:
+            raise CommandError(f"Record {line}: {error}")
+        except OSError as error:
+            raise CommandError(error)
+        except IntegrityError as error:
+            raise CommandError(f"A batch of records before record {line} was rejected: {error}")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from fb_post.models import Post, Comment, React
+from fb_post.utils.counters import rebuild_counters, get_counter_mismatches
+
+
+class Command(BaseCommand):
+    help = "Recomputes the denormalized comment, reply and reaction counters on Post and Comment"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help="only report rows whose counters differ from the source tables")
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = get_counter_mismatches(Post, Comment, React)
+            for model_name, rows in mismatches.items():
+                for pk, fields in rows.items():
+                    for field, (stored, expected) in fields.items():
+                        self.stdout.write(f"{model_name} {pk} {field}: stored {stored}, expected {expected}")
+            total = sum(len(rows) for rows in mismatches.values())
+            if total:
+                raise CommandError(f"{total} rows have stale counters")
+            self.stdout.write(self.style.SUCCESS("All counters are consistent"))
+            return
+
+        with transaction.atomic():
+            rebuild_counters(Post, Comment, React)
+        self.stdout.write(self.style.SUCCESS("Counters rebuilt"))
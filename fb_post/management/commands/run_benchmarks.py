@@ -0,0 +1,80 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from fb_post.benchmarks import SCALES, UNCACHED, compare_results, get_cases, get_environment, measure, rolled_back, \
+    seed
+from fb_post.routers import REPLICA_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = ("Measures wall time, SQL queries and peak memory of the read and write tasks and GraphQL documents "
+            "on seeded datasets, optionally against the results of an earlier run")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small', 'medium'])
+        parser.add_argument('--cases', nargs='+', help="only the cases whose name contains one of these")
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--output', help="JSON file the results are written to")
+        parser.add_argument('--compare', help="JSON results of an earlier run, a regression fails the command")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="relative increase of time or peak memory reported as a regression")
+
+    def handle(self, *args, **options):
+        if REPLICA_DB_ALIAS in settings.DATABASES:
+            # reads routed to the replica would not see the seeded rows, which are never committed
+            raise CommandError("Run the benchmarks without DATABASE_REPLICA")
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+
+        results = []
+        self.stdout.write(f"{'scale':<8} {'case':<28} {'queries':>8} {'best ms':>9} {'median ms':>10} "
+                          f"{'peak KiB':>9}")
+        # the profile of every GraphQL request is logged at INFO, N+1 warnings are kept
+        graphql_logger = logging.getLogger('fb_post.graphql')
+        level = graphql_logger.level
+        graphql_logger.setLevel(logging.WARNING)
+        try:
+            # the test client sends Host: testserver, which only the test runner adds to ALLOWED_HOSTS
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], CACHES=UNCACHED,
+                                   GRAPHQL_MAX_QUERY_COST=10 ** 9):
+                for scale in options['scales']:
+                    results += self.run_scale(scale, options['cases'], options['repeat'])
+        finally:
+            graphql_logger.setLevel(level)
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({"environment": get_environment(), "results": results}, file, indent=2)
+                file.write("\n")
+        if baseline is not None:
+            self.report_regressions(compare_results(baseline, results, options['threshold']), options['threshold'])
+
+    def run_scale(self, scale, names, repeat):
+        results = []
+        with rolled_back():
+            start = time.perf_counter()
+            targets = seed(scale)
+            self.stdout.write(f"{scale:<8} seeded in {time.perf_counter() - start:.1f} s", self.style.MIGRATE_HEADING)
+            for name, case, writes in get_cases(targets):
+                if names and not any(part in name for part in names):
+                    continue
+                row = {"scale": scale, "case": name, **measure(case, writes, repeat)}
+                results.append(row)
+                self.stdout.write(f"{scale:<8} {name:<28} {row['queries']:>8} {row['best_ms']:>9.2f} "
+                                  f"{row['median_ms']:>10.2f} {row['peak_kib']:>9.0f}")
+        return results
+
+    def report_regressions(self, regressions, threshold):
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f"No regressions over {threshold:.0%}"))
+            return
+        for scale, name, metric, before, after in regressions:
+            self.stdout.write(self.style.ERROR(f"{scale:<8} {name:<28} {metric} {before} -> {after}"))
+        raise CommandError(f"{len(regressions)} regressions over {threshold:.0%}")
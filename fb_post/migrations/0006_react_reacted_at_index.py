@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fb_post', '0005_auto_20220825_1110'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='post',
+            options={'ordering': ['-post_id']},
+        ),
+        migrations.AlterField(
+            model_name='group',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AlterField(
+            model_name='membership',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AlterField(
+            model_name='react',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AddIndex(
+            model_name='react',
+            index=models.Index(fields=['reacted_at', 'id'], name='react_reacted_at_id_idx'),
+        ),
+    ]
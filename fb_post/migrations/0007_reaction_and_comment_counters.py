@@ -0,0 +1,144 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:55
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# The reaction counter of each reaction type as of this migration, copied here so that later changes to
+# the models or to fb_post.utils.counters cannot change what it does
+REACTION_COUNT_FIELDS = {
+    'WOW': 'wow_count', 'LIT': 'lit_count', 'LOVE': 'love_count', 'HAHA': 'haha_count',
+    'THUMBS - UP': 'thumbs_up_count', 'THUMBS - DOWN': 'thumbs_down_count', 'ANGRY': 'angry_count',
+    'SAD': 'sad_count',
+}
+
+
+def count_subquery(queryset, field):
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('*'))
+    return Coalesce(Subquery(counts.values('count')), Value(0))
+
+
+def rebuild_counters(apps):
+    Post, Comment, React = (apps.get_model('fb_post', name) for name in ('Post', 'Comment', 'React'))
+    for model, related_field, children_field, children_counter in (
+            (Post, 'post', 'post', 'comments_count'), (Comment, 'comment', 'reply', 'replies_count')):
+        counters = {'reactions_count': count_subquery(React.objects.all(), related_field),
+                    children_counter: count_subquery(Comment.objects.all(), children_field)}
+        for reaction, field in REACTION_COUNT_FIELDS.items():
+            counters[field] = count_subquery(React.objects.filter(reaction=reaction), related_field)
+        model.objects.update(**counters)
+
+
+def backfill_counters(apps, schema_editor):
+    rebuild_counters(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fb_post', '0006_react_reacted_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='angry_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='haha_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='lit_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='love_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reactions_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='replies_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='sad_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='thumbs_down_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='thumbs_up_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='wow_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='angry_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='haha_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='lit_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='love_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reactions_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='sad_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='thumbs_down_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='thumbs_up_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='wow_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:57
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# same as in 0007_reaction_and_comment_counters, migrations do not import each other
+REACTION_COUNT_FIELDS = {
+    'WOW': 'wow_count', 'LIT': 'lit_count', 'LOVE': 'love_count', 'HAHA': 'haha_count',
+    'THUMBS - UP': 'thumbs_up_count', 'THUMBS - DOWN': 'thumbs_down_count', 'ANGRY': 'angry_count',
+    'SAD': 'sad_count',
+}
+
+
+def count_subquery(queryset, field):
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('*'))
+    return Coalesce(Subquery(counts.values('count')), Value(0))
+
+
+def rebuild_counters(apps):
+    Post, Comment, React = (apps.get_model('fb_post', name) for name in ('Post', 'Comment', 'React'))
+    for model, related_field, children_field, children_counter in (
+            (Post, 'post', 'post', 'comments_count'), (Comment, 'comment', 'reply', 'replies_count')):
+        counters = {'reactions_count': count_subquery(React.objects.all(), related_field),
+                    children_counter: count_subquery(Comment.objects.all(), children_field)}
+        for reaction, field in REACTION_COUNT_FIELDS.items():
+            counters[field] = count_subquery(React.objects.filter(reaction=reaction), related_field)
+        model.objects.update(**counters)
+
+
+def remove_duplicate_reactions(apps, schema_editor):
+    """
+    Keeps the latest reaction of each user on each post or comment so the unique constraints can be created
+    """
+    React = apps.get_model('fb_post', 'React')
+    removed = 0
+    for target in ('post', 'comment'):
+        duplicates = React.objects.filter(**{f'{target}__isnull': False}).values(target, 'reacted_by') \
+            .annotate(reactions=Count('id'), latest_id=Max('id')).filter(reactions__gt=1).order_by()
+        for duplicate in duplicates:
+            removed += React.objects.filter(**{target: duplicate[target], 'reacted_by': duplicate['reacted_by']}) \
+                .exclude(id=duplicate['latest_id']).delete()[0]
+    if removed:
+        rebuild_counters(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fb_post', '0007_reaction_and_comment_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_reactions, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'comment_id'], name='comment_post_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['reply', 'comment_id'], name='comment_reply_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-posted_at', '-post_id'], name='post_group_posted_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['posted_by', '-post_id'], name='post_posted_by_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='react',
+            constraint=models.UniqueConstraint(fields=('post', 'reacted_by'), name='unique_post_reaction_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='react',
+            constraint=models.UniqueConstraint(fields=('comment', 'reacted_by'), name='unique_comment_reaction_per_user'),
+        ),
+    ]
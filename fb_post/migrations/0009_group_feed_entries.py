@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fb_post', '0008_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupFeedEntry',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed_entry', serialize=False, to='fb_post.post')),
+                ('posted_at', models.DateTimeField()),
+                ('author_name', models.CharField(max_length=100)),
+                ('author_profile_pic', models.TextField()),
+                ('content', models.CharField(max_length=1000)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='fb_post.group')),
+                ('posted_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='fb_post.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['group', '-posted_at', '-post'], name='feed_group_posted_at_idx')],
+            },
+        ),
+    ]
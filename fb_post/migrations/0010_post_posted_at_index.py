@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fb_post', '0009_group_feed_entries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['posted_at', 'post_id'], name='post_posted_at_idx'),
+        ),
+    ]
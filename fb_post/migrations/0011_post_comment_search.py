@@ -0,0 +1,66 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:20
+
+from django.db import migrations
+
+# The search indexes and triggers as of this migration, copied here from fb_post.search so that later
+# changes to it cannot change what this migration does
+SEARCHED_TABLES = [('fb_post_post', 'post_id'), ('fb_post_comment', 'comment_id')]
+SQLITE_TOKENIZER = "porter unicode61 remove_diacritics 2"
+POSTGRES_SEARCH_CONFIG = "english"
+
+
+def get_sqlite_trigger_statements(table, pk):
+    index = f"{table}_search"
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {index}(rowid, content) VALUES (new.{pk}, new.content);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {index}({index}, rowid, content) VALUES ('delete', old.{pk}, old.content);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF content ON {table}
+        WHEN old.content IS NOT new.content BEGIN
+            INSERT INTO {index}({index}, rowid, content) VALUES ('delete', old.{pk}, old.content);
+            INSERT INTO {index}(rowid, content) VALUES (new.{pk}, new.content);
+        END""",
+    ]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, pk in SEARCHED_TABLES:
+        index = f"{table}_search"
+        if vendor == 'sqlite':
+            schema_editor.execute(f"CREATE VIRTUAL TABLE {index} USING fts5(content, content='{table}', "
+                                  f"content_rowid='{pk}', tokenize='{SQLITE_TOKENIZER}')")
+            schema_editor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+            for statement in get_sqlite_trigger_statements(table, pk):
+                schema_editor.execute(statement)
+        elif vendor == 'postgresql':
+            schema_editor.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+                                  f"(to_tsvector('{POSTGRES_SEARCH_CONFIG}', content)) STORED")
+            schema_editor.execute(f"CREATE INDEX {index}_idx ON {table} USING GIN (search_vector)")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, _ in SEARCHED_TABLES:
+        index = f"{table}_search"
+        if vendor == 'sqlite':
+            for trigger in ('insert', 'delete', 'update'):
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS {index}_{trigger}")
+            schema_editor.execute(f"DROP TABLE IF EXISTS {index}")
+        elif vendor == 'postgresql':
+            schema_editor.execute(f"DROP INDEX IF EXISTS {index}_idx")
+            schema_editor.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fb_post', '0010_post_posted_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
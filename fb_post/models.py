@@ -4,6 +4,38 @@ from fb_post.constants.enum import ReactionType
 
 # Create your models here.
 
+REACTION_COUNT_FIELDS = {
+    ReactionType.WOW.value: 'wow_count',
+    ReactionType.LIT.value: 'lit_count',
+    ReactionType.LOVE.value: 'love_count',
+    ReactionType.HA.value: 'haha_count',
+    ReactionType.UP.value: 'thumbs_up_count',
+    ReactionType.DOWN.value: 'thumbs_down_count',
+    ReactionType.ANGRY.value: 'angry_count',
+    ReactionType.SAD.value: 'sad_count',
+}
+
+
+class ReactionCounts(models.Model):
+    """
+    Counters maintained by the write tasks with F() updates, see fb_post.utils.counters
+    """
+    reactions_count = models.PositiveIntegerField(default=0)
+    wow_count = models.PositiveIntegerField(default=0)
+    lit_count = models.PositiveIntegerField(default=0)
+    love_count = models.PositiveIntegerField(default=0)
+    haha_count = models.PositiveIntegerField(default=0)
+    thumbs_up_count = models.PositiveIntegerField(default=0)
+    thumbs_down_count = models.PositiveIntegerField(default=0)
+    angry_count = models.PositiveIntegerField(default=0)
+    sad_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def get_reaction_counts_dict(self):
+        return {reaction: getattr(self, field) for reaction, field in REACTION_COUNT_FIELDS.items()}
+
 class User(models.Model):
     user_id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100)
@@ -12,9 +44,6 @@ class User(models.Model):
     def __str__(self):
         return self.name
 
-    def get_user_dict(self):
-        return {"user_id":self.user_id,"name":self.name,"profile_pic":self.profile_pic}
-
 
 class Group(models.Model):
     name = models.CharField(max_length=100)
@@ -23,9 +52,6 @@ class Group(models.Model):
     def __str__(self):
         return f'{self.name}'
 
-    def get_group_dict(self):
-        return {"group_id":self.id,"name":self.name}
-
 class Membership(models.Model):
     group = models.ForeignKey(Group, on_delete=models.CASCADE)
     member = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_membership')
@@ -36,29 +62,33 @@ class Membership(models.Model):
 
 
 
-class Post(models.Model):
+class Post(ReactionCounts):
     post_id = models.AutoField(primary_key=True)
     content = models.CharField(max_length=1000)
     posted_at = models.DateTimeField(auto_now=False, auto_now_add=False)
     posted_by = models.ForeignKey(User, on_delete=models.CASCADE)
     group = models.ForeignKey(Group, on_delete=models.CASCADE)
+    comments_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return "{} Posted {}".format(self.posted_by.name, self.content)
 
-    def get_post_dict(self):
-        return {"post_id":self.post_id,"group":self.group.get_group_dict(), "posted_by":self.posted_by.get_user_dict(), "posted_at":self.posted_at.strftime("%Y-%m-%d %H:%M:%S"), "post_content":self.content}
-
     class Meta:
         ordering = ['-post_id']
+        indexes = [
+            models.Index(fields=['group', '-posted_at', '-post_id'], name='post_group_posted_at_idx'),
+            models.Index(fields=['posted_by', '-post_id'], name='post_posted_by_idx'),
+            models.Index(fields=['posted_at', 'post_id'], name='post_posted_at_idx'),
+        ]
 
-class Comment(models.Model):
+class Comment(ReactionCounts):
     comment_id = models.AutoField(primary_key=True)
     content = models.CharField(max_length=1000)
     commented_at = models.DateTimeField(auto_now=False, auto_now_add=False)
     commented_by = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True)
     post = models.ForeignKey(Post, related_name="commenter", on_delete=models.CASCADE, blank=True, null=True)
     reply = models.ForeignKey('self', related_name="reply_to_comment", on_delete=models.CASCADE, blank=True, null=True)
+    replies_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         if self.reply:
@@ -66,8 +96,11 @@ class Comment(models.Model):
         else:
             return "{} commented on {}".format(self.commented_by.name, self.post.content)
 
-    def get_comment_dict(self):
-        return {"comment_id":self.comment_id,"commenter":self.commented_by.get_user_dict(),"commented_at":self.commented_at.strftime("%Y-%m-%d %H:%M:%S"),"comment_content":self.content}
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'comment_id'], name='comment_post_idx'),
+            models.Index(fields=['reply', 'comment_id'], name='comment_reply_idx'),
+        ]
 
 class React(models.Model):
     reaction = models.CharField(choices=[(tag.value,tag) for tag in ReactionType], max_length=100)
@@ -79,3 +112,30 @@ class React(models.Model):
 
     def __str__(self):
         return "Feeling {} by {}".format(self.reaction, self.reacted_by.name)
+
+    class Meta:
+        indexes = [models.Index(fields=['reacted_at', 'id'], name='react_reacted_at_id_idx')]
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'reacted_by'], name='unique_post_reaction_per_user'),
+            models.UniqueConstraint(fields=['comment', 'reacted_by'], name='unique_comment_reaction_per_user'),
+        ]
+
+
+class GroupFeedEntry(models.Model):
+    """
+    A post as it appears in its group's feed, written alongside the post when settings.GROUP_FEED_FAN_OUT
+    is on, see fb_post.utils.feed. The author is copied in; the counters are read from the post.
+    """
+    post = models.OneToOneField(Post, primary_key=True, related_name='feed_entry', on_delete=models.CASCADE)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE)
+    posted_at = models.DateTimeField(auto_now=False, auto_now_add=False)
+    posted_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    author_name = models.CharField(max_length=100)
+    author_profile_pic = models.TextField()
+    content = models.CharField(max_length=1000)
+
+    def __str__(self):
+        return "{} in {}".format(self.post_id, self.group_id)
+
+    class Meta:
+        indexes = [models.Index(fields=['group', '-posted_at', '-post'], name='feed_group_posted_at_idx')]
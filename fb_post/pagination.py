@@ -0,0 +1,100 @@
+import base64
+import json
+
+from django.db.models import Q
+from graphene.relay import PageInfo
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise Exception("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise Exception("Invalid cursor")
+    return values
+
+
+def keyset_filter(fields, values, forward):
+    """
+    Builds the row-value comparison (a, b) > (x, y) as
+    a >= x AND (a > x OR (a = x AND b > y)). The redundant a >= x is what lets the
+    database seek into an index on the ordering fields instead of scanning all of it,
+    as no index range can be taken from the OR alone.
+
+    fields are order_by() style names, "-" marks a descending field.
+    """
+    condition = Q()
+    for position, field in enumerate(fields):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        lookup = 'gt' if descending != forward else 'lt'
+        term = Q(**{f'{name}__{lookup}': values[position]})
+        for previous_position, previous_field in enumerate(fields[:position]):
+            term &= Q(**{previous_field.lstrip('-'): values[previous_position]})
+        condition |= term
+    if len(fields) > 1:
+        name = fields[0].lstrip('-')
+        lookup = 'gte' if fields[0].startswith('-') != forward else 'lte'
+        condition = Q(**{f'{name}__{lookup}': values[0]}) & condition
+    return condition
+
+
+def reverse_ordering(fields):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in fields]
+
+
+def keyset_connection(queryset, connection_type, ordering, first=None, last=None, after=None, before=None):
+    """
+    Relay connection over queryset paginated by keyset (seek) instead of OFFSET.
+
+    ordering must end with a unique field so that every row has a distinct cursor.
+    :returns: (connection, nodes)
+    """
+    for name, value in (('first', first), ('last', last)):
+        if value is not None and value < 0:
+            raise Exception(f"Argument '{name}' must be a non-negative integer")
+    if first is None and last is None:
+        first = DEFAULT_PAGE_SIZE
+    if first is not None:
+        first = min(first, MAX_PAGE_SIZE)
+    if last is not None:
+        last = min(last, MAX_PAGE_SIZE)
+
+    def cursor_for(node):
+        return encode_cursor([getattr(node, field.lstrip('-')) for field in ordering])
+
+    if after is not None:
+        queryset = queryset.filter(keyset_filter(ordering, decode_cursor(after, len(ordering)), forward=True))
+    if before is not None:
+        queryset = queryset.filter(keyset_filter(ordering, decode_cursor(before, len(ordering)), forward=False))
+
+    if first is not None:
+        nodes = list(queryset.order_by(*ordering)[:first + 1])
+        has_next_page = len(nodes) > first
+        nodes = nodes[:first]
+        has_previous_page = after is not None
+        if last is not None and len(nodes) > last:
+            nodes = nodes[len(nodes) - last:]
+            has_previous_page = True
+    else:
+        nodes = list(queryset.order_by(*reverse_ordering(ordering))[:last + 1])
+        has_previous_page = len(nodes) > last
+        nodes = nodes[:last][::-1]
+        has_next_page = before is not None
+
+    edges = [connection_type.Edge(node=node, cursor=cursor_for(node)) for node in nodes]
+    page_info = PageInfo(
+        start_cursor=edges[0].cursor if edges else None,
+        end_cursor=edges[-1].cursor if edges else None,
+        has_previous_page=has_previous_page,
+        has_next_page=has_next_page,
+    )
+    return connection_type(edges=edges, page_info=page_info), nodes
@@ -0,0 +1,162 @@
+"""
+Automatic Persisted Queries and a cache of parsed, validated documents.
+
+Clients send {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": "..."}}} instead of the query
+text. Unknown hashes answer PersistedQueryNotFound, after which the client resends the hash together with
+the query, and the server remembers the pair in the Django cache alias
+settings.GRAPHQL_PERSISTED_QUERY_CACHE_ALIAS. Hashes can also be registered ahead of time in the JSON file
+{sha256: query} named by settings.GRAPHQL_PERSISTED_QUERIES_FILE.
+
+Whichever way the text arrives, it is parsed and validated against the schema once and the resulting
+DocumentNode is kept in an LRU of settings.GRAPHQL_DOCUMENT_CACHE_SIZE entries, as are the models a query
+reads, which key its cached responses.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql import GraphQLError, parse, validate
+
+from fb_post.cache import get_read_models
+
+PERSISTED_QUERY_KEY_PREFIX = 'graphql:persisted:'
+
+
+class PersistedQueryNotFound(GraphQLError):
+
+    def __init__(self):
+        super().__init__("PersistedQueryNotFound", extensions={"code": "PERSISTED_QUERY_NOT_FOUND"})
+
+
+class PersistedQueryHashMismatch(GraphQLError):
+
+    def __init__(self):
+        super().__init__("provided sha does not match query", extensions={"code": "PERSISTED_QUERY_HASH_MISMATCH"})
+
+
+class DocumentCache:
+    """
+    LRU of query hash -> (document, validation errors)
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._documents.get(key)
+            if entry is not None:
+                self._documents.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._documents[key] = entry
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.max_size:
+                self._documents.popitem(last=False)
+
+    def __len__(self):
+        return len(self._documents)
+
+
+document_cache = DocumentCache(getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', 500))
+# query hash -> models the document reads
+read_models_cache = DocumentCache(getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', 500))
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def get_persisted_query_cache():
+    return caches[getattr(settings, 'GRAPHQL_PERSISTED_QUERY_CACHE_ALIAS', 'default')]
+
+
+def get_registry():
+    """
+    :returns: {sha256: query} loaded once from settings.GRAPHQL_PERSISTED_QUERIES_FILE
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                path = getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_FILE', None)
+                registry = {}
+                if path:
+                    with open(path) as registry_file:
+                        registry = json.load(registry_file)
+                _registry = registry
+    return _registry
+
+
+def get_persisted_query_hash(extensions):
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            return None
+    persisted_query = (extensions or {}).get('persistedQuery') or {}
+    return persisted_query.get('sha256Hash')
+
+
+def resolve_query(query, extensions):
+    """
+    :returns: (query text, its sha256)
+    :raises PersistedQueryNotFound: when only an unknown hash was sent
+    """
+    query_hash = get_persisted_query_hash(extensions)
+    if query_hash is None:
+        return query, get_query_hash(query) if query else None
+
+    if query:
+        if get_query_hash(query) != query_hash:
+            raise PersistedQueryHashMismatch()
+        if query_hash not in get_registry():
+            get_persisted_query_cache().set(PERSISTED_QUERY_KEY_PREFIX + query_hash, query)
+        return query, query_hash
+
+    query = get_registry().get(query_hash) or \
+        get_persisted_query_cache().get(PERSISTED_QUERY_KEY_PREFIX + query_hash)
+    if query is None:
+        raise PersistedQueryNotFound()
+    return query, query_hash
+
+
+def get_validated_document(schema, query, query_hash, rules=None):
+    """
+    :returns: (document, errors), parse and validation errors alike are cached with the document
+    """
+    entry = document_cache.get(query_hash)
+    if entry is None:
+        try:
+            document = parse(query)
+            errors = validate(schema, document, rules)
+        except GraphQLError as error:
+            document, errors = None, [error]
+        entry = (document, errors)
+        document_cache.set(query_hash, entry)
+    return entry
+
+
+def get_document_read_models(schema, document, query_hash):
+    """
+    :returns: the models the document reads, see fb_post.cache.get_read_models, found once per query hash
+    """
+    model_names = read_models_cache.get(query_hash)
+    if model_names is None:
+        model_names = get_read_models(schema, document)
+        read_models_cache.set(query_hash, model_names)
+    return model_names
+
+
+def warm_document_cache(schema):
+    for query_hash, query in get_registry().items():
+        get_validated_document(schema, query, query_hash)
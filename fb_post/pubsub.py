@@ -0,0 +1,187 @@
+"""
+Publish/subscribe of the events served by GraphQL subscriptions, see fb_post.subscriptions.
+
+The write tasks publish once their transaction commits:
+    comments:post:<post_id>     {"comment_id": 12}               a comment was added to the post
+    feed:group:<group_id>       {"post_id": 7}                   a post was added to the group
+    reactions:post:<post_id>    {"post_id": 7, "reactions_count": 3, "reaction_metrics": {"WOW": 1, ...}}
+
+Reactions are not published one by one: posts whose reactions changed are collected for
+settings.GRAPHQL_SUBSCRIPTION_COALESCE_SECONDS and then published with their counters read in one query,
+so a post tapped a hundred times in that window sends one message.
+
+The backend is the class named by settings.GRAPHQL_PUBSUB_BACKEND. InProcessPubSub only reaches
+subscribers of the same process; a broker backend (Redis, PostgreSQL LISTEN/NOTIFY) implements the same
+three methods, with messages that are plain JSON data.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+
+from fb_post.constants.enum import ReactionType
+from fb_post.models import Post, REACTION_COUNT_FIELDS
+
+logger = logging.getLogger('fb_post.pubsub')
+
+
+def get_comments_channel(post_id):
+    return f"comments:post:{post_id}"
+
+
+def get_group_feed_channel(group_id):
+    return f"feed:group:{group_id}"
+
+
+def get_reactions_channel(post_id):
+    return f"reactions:post:{post_id}"
+
+
+class InProcessPubSub:
+    """
+    Delivers messages to the subscribers' event loops; publish() may be called from any thread
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def has_subscribers(self, channel):
+        return bool(self._subscribers.get(channel))
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:
+                # the subscriber's loop is closed, its generator is unsubscribed when it is collected
+                pass
+
+    @staticmethod
+    def _deliver(queue, message):
+        if queue.full():
+            # a subscriber that does not keep up loses its oldest messages, not the newest
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    async def subscribe(self, channel):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.queue_size))
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            while True:
+                yield await subscriber[1].get()
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+_pubsub = None
+_pubsub_lock = threading.Lock()
+
+
+def get_pubsub():
+    global _pubsub
+    if _pubsub is None:
+        with _pubsub_lock:
+            if _pubsub is None:
+                backend = getattr(settings, 'GRAPHQL_PUBSUB_BACKEND', 'fb_post.pubsub.InProcessPubSub')
+                _pubsub = import_string(backend)()
+    return _pubsub
+
+
+def publish_on_commit(channel, message):
+    pubsub = get_pubsub()
+    if pubsub.has_subscribers(channel):
+        transaction.on_commit(lambda: pubsub.publish(channel, message))
+
+
+def get_reaction_counts(post_ids):
+    """
+    :returns: {post_id: reactions message}, read from the counters of the posts
+    """
+    posts = Post.objects.filter(pk__in=post_ids).only('pk', 'reactions_count', *REACTION_COUNT_FIELDS.values())
+    return {
+        post.pk: {
+            "post_id": post.pk,
+            "reactions_count": post.reactions_count,
+            "reaction_metrics": {ReactionType(reaction).name: count
+                                 for reaction, count in post.get_reaction_counts_dict().items()},
+        }
+        for post in posts
+    }
+
+
+class ReactionCountCoalescer:
+    """
+    Collects the posts whose reactions changed and publishes their counters, at most once per post per
+    interval, from one background thread
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._condition = threading.Condition()
+        self._post_ids = set()
+        self._thread = None
+
+    def add(self, post_ids):
+        with self._condition:
+            self._post_ids.update(post_ids)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='reaction-counts', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._post_ids:
+                    self._condition.wait()
+            # let the reactions of the next interval pile up on the same posts
+            time.sleep(self.interval)
+            with self._condition:
+                post_ids, self._post_ids = self._post_ids, set()
+            try:
+                self.flush(post_ids)
+            except Exception:
+                logger.exception("Could not publish the reaction counts of posts %s", sorted(post_ids))
+
+    @staticmethod
+    def flush(post_ids):
+        close_old_connections()
+        try:
+            pubsub = get_pubsub()
+            for post_id, message in get_reaction_counts(post_ids).items():
+                pubsub.publish(get_reactions_channel(post_id), message)
+        finally:
+            close_old_connections()
+
+
+reaction_counts = ReactionCountCoalescer(getattr(settings, 'GRAPHQL_SUBSCRIPTION_COALESCE_SECONDS', 0.25))
+
+
+def publish_reactions_changed(post_ids):
+    pubsub = get_pubsub()
+    post_ids = {post_id for post_id in post_ids if pubsub.has_subscribers(get_reactions_channel(post_id))}
+    if post_ids:
+        transaction.on_commit(lambda: reaction_counts.add(post_ids))
+
+
+def publish_comment_added(comment):
+    if comment.post_id is not None:
+        publish_on_commit(get_comments_channel(comment.post_id), {"comment_id": comment.pk})
+
+
+def publish_post_added(post):
+    if post.group_id is not None:
+        publish_on_commit(get_group_feed_channel(post.group_id), {"post_id": post.pk})
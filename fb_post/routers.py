@@ -0,0 +1,55 @@
+"""
+Primary/replica routing.
+
+Reads go to the primary ("default") unless they run inside read_replica(), which the GraphQL view enters
+for query operations and which wraps the read tasks decorated with @reads_from_replica. Everything inside
+a mutation, including the reads it does to validate its input, stays on the primary. Without a "replica"
+alias in settings.DATABASES every read goes to the primary.
+
+The replica may lag behind the primary, so code that must read its own writes should not use it.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+@contextmanager
+def read_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def reads_from_replica(task):
+    @wraps(task)
+    def wrapper(*args, **kwargs):
+        with read_replica():
+            return task(*args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and REPLICA_DB_ALIAS in settings.DATABASES:
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
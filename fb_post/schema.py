@@ -1,6 +1,13 @@
 import graphene
-from graphene import ObjectType, Schema, Mutation
+from graphene import ObjectType, Schema, Mutation, relay
+from graphene.relay import PageInfo
+from fb_post.async_execution import database_sync_to_async
 from fb_post.models import User, Group, Post, Comment, React
+from fb_post.loaders import get_loaders, then
+from fb_post.pagination import keyset_connection
+from fb_post.pubsub import get_pubsub, get_comments_channel, get_group_feed_channel, get_reactions_channel
+from fb_post.search import search_posts
+from fb_post.utils.bulk import react_to_posts, create_comments, add_members_to_group
 
 
 class UserType(ObjectType):
@@ -14,6 +21,9 @@ class GroupType(ObjectType):
     name = graphene.String()
     members = graphene.List(UserType)
 
+    def resolve_members(self, info):
+        return get_loaders(info).members_by_group.load(self.pk)
+
 
 class ReactType(ObjectType):
     reaction = graphene.String()
@@ -23,6 +33,11 @@ class ReactType(ObjectType):
     comment = graphene.Field('fb_post.schema.CommentType')
 
 
+class ReactionCountType(ObjectType):
+    reaction = graphene.String()
+    count = graphene.Int()
+
+
 class CommentType(ObjectType):
     comment_id = graphene.ID()
     content = graphene.String()
@@ -32,12 +47,14 @@ class CommentType(ObjectType):
     reply = graphene.Field('fb_post.schema.CommentType')
     reactions = graphene.List(ReactType)
     replies = graphene.List('fb_post.schema.CommentType')
+    replies_count = graphene.Int()
+    reactions_count = graphene.Int()
 
     def resolve_reactions(self, info):
-        return React.objects.filter(comment=self)
+        return get_loaders(info).reactions_by_comment.load(self.pk)
 
     def resolve_replies(self, info):
-        return Comment.objects.filter(reply=self)
+        return get_loaders(info).replies_by_comment.load(self.pk)
 
 
 class PostType(ObjectType):
@@ -48,19 +65,64 @@ class PostType(ObjectType):
     group = graphene.Field(GroupType)
     comments = graphene.List(CommentType)
     reactions = graphene.List(ReactType)
+    comments_count = graphene.Int()
+    reactions_count = graphene.Int()
+    reaction_metrics = graphene.List(ReactionCountType)
 
     def resolve_comments(self, info):
-        return Comment.objects.filter(post=self)
+        return get_loaders(info).comments_by_post.load(self.pk)
 
     def resolve_reactions(self, info):
-        return React.objects.filter(post=self)
+        return get_loaders(info).reactions_by_post.load(self.pk)
+
+    def resolve_reaction_metrics(self, info):
+        return then(get_loaders(info).reaction_metrics_by_post.load(self.pk),
+                    lambda metrics: [{"reaction": reaction, "count": count} for reaction, count in metrics.items()])
+
+
+class ReactionCountsType(ObjectType):
+    post_id = graphene.ID()
+    reactions_count = graphene.Int()
+    reaction_metrics = graphene.List(ReactionCountType)
+
+    def resolve_reaction_metrics(self, info):
+        return [{"reaction": reaction, "count": count} for reaction, count in self["reaction_metrics"].items()]
+
+
+class UserConnection(relay.Connection):
+    class Meta:
+        node = UserType
+
+
+class PostConnection(relay.Connection):
+    class Meta:
+        node = PostType
+
+
+class CommentConnection(relay.Connection):
+    class Meta:
+        node = CommentType
+
+
+class ReactConnection(relay.Connection):
+    class Meta:
+        node = ReactType
+
+
+class PostSearchConnection(relay.Connection):
+    class Meta:
+        node = PostType
+
+    class Edge:
+        score = graphene.Float(description="Relevance of the post, higher first, comparable within one search")
+        snippet = graphene.String(description="HTML-escaped text around the matched words, which are in <mark> tags")
 
 
 class Query(ObjectType):
-    all_users = graphene.List(UserType)
-    all_posts = graphene.List(PostType)
-    all_comments = graphene.List(CommentType)
-    all_reacts = graphene.List(ReactType)
+    all_users = relay.ConnectionField(UserConnection)
+    all_posts = relay.ConnectionField(PostConnection)
+    all_comments = relay.ConnectionField(CommentConnection)
+    all_reacts = relay.ConnectionField(ReactConnection)
     all_groups = graphene.List(GroupType)
     all_posts_by_user = graphene.List(PostType, user_id=graphene.Int(required=True))
     all_comments_by_post = graphene.List(CommentType, post_id=graphene.Int(required=True))
@@ -69,32 +131,72 @@ class Query(ObjectType):
 
     user = graphene.Field(UserType, user_id=graphene.Int(required=True))
 
-    def resolve_all_users(self, info):
-        return User.objects.all()
+    search_posts = graphene.Field(PostSearchConnection, query=graphene.String(required=True), group_id=graphene.Int(),
+                                  first=graphene.Int(), after=graphene.String())
+
+    def resolve_all_users(self, info, **kwargs):
+        connection, _ = keyset_connection(User.objects.all(), UserConnection, ['user_id'], **kwargs)
+        return connection
 
     def resolve_user(self, info, user_id):
         return User.objects.get(user_id=user_id)
 
-    def resolve_all_posts(self, info):
-        return Post.objects.all()
+    def resolve_all_groups(self, info):
+        groups = list(Group.objects.order_by('id'))
+        get_loaders(info).expect_groups(groups)
+        return groups
+
+    def resolve_all_posts(self, info, **kwargs):
+        connection, posts = keyset_connection(Post.objects.select_related('posted_by', 'group'), PostConnection,
+                                              Post._meta.ordering, **kwargs)
+        get_loaders(info).expect_posts(posts)
+        return connection
 
-    def resolve_all_comments(self, info):
-        return Comment.objects.all()
+    def resolve_all_comments(self, info, **kwargs):
+        connection, comments = keyset_connection(Comment.objects.select_related('commented_by'), CommentConnection,
+                                                 ['comment_id'], **kwargs)
+        get_loaders(info).expect_comments(comments)
+        return connection
 
-    def resolve_all_reacts(self, info):
-        return React.objects.all()
+    def resolve_all_reacts(self, info, **kwargs):
+        connection, _ = keyset_connection(React.objects.select_related('reacted_by'), ReactConnection,
+                                          ['reacted_at', 'id'], **kwargs)
+        return connection
 
     def resolve_all_posts_by_user(self, info, user_id):
-        return Post.objects.filter(posted_by=user_id)
+        posts = list(Post.objects.filter(posted_by=user_id).select_related('posted_by', 'group'))
+        get_loaders(info).expect_posts(posts)
+        return posts
 
     def resolve_all_comments_by_post(self, info, post_id):
-        return Comment.objects.filter(post=post_id)
+        comments = list(Comment.objects.filter(post=post_id).select_related('commented_by'))
+        get_loaders(info).expect_comments(comments)
+        return comments
 
     def resolve_all_reacts_by_post(self, info, post_id):
-        return React.objects.filter(post=post_id)
+        return React.objects.filter(post=post_id).select_related('reacted_by')
 
     def resolve_posts_by_user_with_comments_and_reactions(self, info, user_id):
-        return Post.objects.filter(posted_by=user_id).prefetch_related('commenter', 'reacted_to_post')
+        posts = list(Post.objects.filter(posted_by=user_id).select_related('posted_by', 'group'))
+        get_loaders(info).expect_posts(posts)
+        return posts
+
+    def resolve_search_posts(self, info, query, group_id=None, first=None, after=None):
+        results, has_next_page = search_posts(query, group_id, first, after)
+        posts = Post.objects.select_related('posted_by', 'group').in_bulk([result["post_id"] for result in results])
+        edges = [
+            PostSearchConnection.Edge(node=posts[result["post_id"]], cursor=result["cursor"], score=result["score"],
+                                      snippet=result["snippet"])
+            for result in results if result["post_id"] in posts
+        ]
+        get_loaders(info).expect_posts([edge.node for edge in edges])
+        page_info = PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=after is not None,
+            has_next_page=has_next_page,
+        )
+        return PostSearchConnection(edges=edges, page_info=page_info)
 
 
 # User Mutations
@@ -157,8 +259,107 @@ class UserMutations(ObjectType):
     delete_user = DeleteUser.Field()
 
 
-class Mutation(UserMutations, ObjectType):
+# Bulk Mutations
+class BulkItemResultType(ObjectType):
+    index = graphene.Int()
+    success = graphene.Boolean()
+    error = graphene.String()
+
+
+class CreateCommentResultType(BulkItemResultType):
+    comment_id = graphene.ID()
+
+
+class ReactionInput(graphene.InputObjectType):
+    user_id = graphene.Int(required=True)
+    post_id = graphene.Int(required=True)
+    reaction = graphene.String(required=True)
+
+
+class CommentInput(graphene.InputObjectType):
+    user_id = graphene.Int(required=True)
+    post_id = graphene.Int(required=True)
+    content = graphene.String(required=True)
+
+
+class ReactToPosts(Mutation):
+    class Arguments:
+        reactions = graphene.List(graphene.NonNull(ReactionInput), required=True)
+
+    results = graphene.List(BulkItemResultType)
+
+    @classmethod
+    def mutate(cls, root, info, reactions):
+        results = react_to_posts([
+            {"user_id": item.user_id, "post_id": item.post_id, "reaction_type": item.reaction}
+            for item in reactions
+        ])
+        return ReactToPosts(results=results)
+
+
+class CreateComments(Mutation):
+    class Arguments:
+        comments = graphene.List(graphene.NonNull(CommentInput), required=True)
+
+    results = graphene.List(CreateCommentResultType)
+
+    @classmethod
+    def mutate(cls, root, info, comments):
+        results = create_comments([
+            {"user_id": item.user_id, "post_id": item.post_id, "comment_content": item.content}
+            for item in comments
+        ])
+        return CreateComments(results=results)
+
+
+class AddMembersToGroup(Mutation):
+    class Arguments:
+        user_id = graphene.Int(required=True)
+        group_id = graphene.Int(required=True)
+        member_ids = graphene.List(graphene.NonNull(graphene.Int), required=True)
+
+    results = graphene.List(BulkItemResultType)
+
+    @classmethod
+    def mutate(cls, root, info, user_id, group_id, member_ids):
+        return AddMembersToGroup(results=add_members_to_group(user_id, member_ids, group_id))
+
+
+class BulkMutations(ObjectType):
+    react_to_posts = ReactToPosts.Field()
+    create_comments = CreateComments.Field()
+    add_members_to_group = AddMembersToGroup.Field()
+
+
+class Mutation(UserMutations, BulkMutations, ObjectType):
     pass
 
 
-schema = Schema(query=Query, mutation=Mutation)
+class Subscription(ObjectType):
+    """
+    Served over WebSocket, see fb_post.subscriptions. Events are published by the write tasks, see fb_post.pubsub
+    """
+    reaction_added = graphene.Field(ReactionCountsType, post_id=graphene.Int(required=True))
+    comment_added = graphene.Field(CommentType, post_id=graphene.Int(required=True))
+    group_feed_updated = graphene.Field(PostType, group_id=graphene.Int(required=True))
+
+    async def subscribe_reaction_added(root, info, post_id):
+        async for counts in get_pubsub().subscribe(get_reactions_channel(post_id)):
+            yield counts
+
+    async def subscribe_comment_added(root, info, post_id):
+        comments = Comment.objects.select_related('commented_by')
+        async for message in get_pubsub().subscribe(get_comments_channel(post_id)):
+            comment = await database_sync_to_async(comments.filter(pk=message["comment_id"]).first)()
+            if comment is not None:
+                yield comment
+
+    async def subscribe_group_feed_updated(root, info, group_id):
+        posts = Post.objects.select_related('posted_by', 'group')
+        async for message in get_pubsub().subscribe(get_group_feed_channel(group_id)):
+            post = await database_sync_to_async(posts.filter(pk=message["post_id"]).first)()
+            if post is not None:
+                yield post
+
+
+schema = Schema(query=Query, mutation=Mutation, subscription=Subscription)
@@ -0,0 +1,191 @@
+"""
+Full-text search over post and comment content, for the searchPosts GraphQL field.
+
+On SQLite, each of fb_post_post and fb_post_comment gets an FTS5 index, fb_post_post_search and
+fb_post_comment_search. These are external content tables, so the text stays in the original table only,
+and triggers keep them up to date on every INSERT, DELETE and UPDATE of content: create_post,
+create_comment, reply_to_comment, the bulk mutations, the importer and cascading deletes alike. On
+PostgreSQL, both tables get a search_vector column generated from content, with a GIN index. Both are
+created by migration 0011, which keeps its own copy of the statements. Django rebuilds a SQLite table to
+alter it, which drops its triggers, so they are created again after every migrate.
+
+A post matches when its content or the content of one of its comments or their direct replies contains
+every word and "quoted phrase" of the query; PostgreSQL also understands OR and -word. Posts are ranked by
+their best match, BM25 on SQLite and ts_rank on PostgreSQL, a comment match counting COMMENT_RANK_WEIGHT as
+much as a match on the post itself. Only the page of posts returned is given a snippet, the text around the
+matched words of its best match, HTML-escaped with the matches in <mark> tags.
+
+PostgreSQL cannot change the type of a column a generated column is computed from, so altering
+Post.content or Comment.content there means dropping search_vector first.
+"""
+import html
+import re
+
+from django.db import connections, router
+
+from fb_post.models import Post, Comment
+from fb_post.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor
+
+SEARCHED_MODELS = [Post, Comment]
+POSTGRES_SEARCH_CONFIG = "english"
+COMMENT_RANK_WEIGHT = 0.5
+SNIPPET_WORDS = 16
+
+# wrapped around matched words by the database, and replaced by <mark> tags once the snippet is escaped
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+
+def get_search_table(model):
+    return f"{model._meta.db_table}_search"
+
+
+def get_sqlite_trigger_statements(model):
+    table, pk, index = model._meta.db_table, model._meta.pk.column, get_search_table(model)
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {index}(rowid, content) VALUES (new.{pk}, new.content);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {index}({index}, rowid, content) VALUES ('delete', old.{pk}, old.content);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF content ON {table}
+        WHEN old.content IS NOT new.content BEGIN
+            INSERT INTO {index}({index}, rowid, content) VALUES ('delete', old.{pk}, old.content);
+            INSERT INTO {index}(rowid, content) VALUES (new.{pk}, new.content);
+        END""",
+    ]
+
+
+def restore_search_triggers(sender, using, **kwargs):
+    """
+    post_migrate receiver creating again the triggers of a SQLite table that a migration rebuilt
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        indexes = set(connection.introspection.table_names(cursor))
+        for model in SEARCHED_MODELS:
+            if get_search_table(model) in indexes:
+                for statement in get_sqlite_trigger_statements(model):
+                    cursor.execute(statement)
+
+
+def get_fts5_query(query):
+    """
+    :returns: FTS5 expression matching every word and "quoted phrase" of query, each quoted so that no
+        input is a syntax error, or "" when query has no word
+    """
+    terms = [phrase or word for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query)]
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in terms if re.search(r'\w', term))
+
+
+# CROSS JOIN keeps the index as the outer loop, otherwise a group filter makes SQLite scan the posts of the
+# group and run the MATCH again for each of them
+SQLITE_MATCHES = """
+    SELECT s.rowid AS post_id, bm25({post_index}) AS rank, 'post' AS kind, s.rowid AS row_id
+    FROM {post_index} s CROSS JOIN {post_table} p ON p.post_id = s.rowid
+    WHERE {post_index} MATCH %s {group_filter}
+    UNION ALL
+    SELECT p.post_id, bm25({comment_index}) * %s, 'comment', s.rowid
+    FROM {comment_index} s
+    CROSS JOIN {comment_table} c ON c.comment_id = s.rowid
+    LEFT JOIN {comment_table} parent ON parent.comment_id = c.reply_id
+    CROSS JOIN {post_table} p ON p.post_id = COALESCE(c.post_id, parent.post_id)
+    WHERE {comment_index} MATCH %s {group_filter}
+"""
+
+# SQLite takes the other columns of a MIN() aggregate from the row holding the minimum
+SQLITE_BEST_MATCHES = "SELECT post_id, MIN(rank) AS rank, kind, row_id FROM ({matches}) GROUP BY post_id"
+
+POSTGRES_MATCHES = """
+    SELECT p.post_id, -ts_rank(p.search_vector, query) AS rank, 'post' AS kind, p.post_id AS row_id
+    FROM {post_table} p, websearch_to_tsquery('{config}', %s) query
+    WHERE p.search_vector @@ query {group_filter}
+    UNION ALL
+    SELECT p.post_id, -ts_rank(c.search_vector, query) * %s, 'comment', c.comment_id
+    FROM {comment_table} c
+    CROSS JOIN websearch_to_tsquery('{config}', %s) query
+    LEFT JOIN {comment_table} parent ON parent.comment_id = c.reply_id
+    JOIN {post_table} p ON p.post_id = COALESCE(c.post_id, parent.post_id)
+    WHERE c.search_vector @@ query {group_filter}
+"""
+
+POSTGRES_BEST_MATCHES = """
+    SELECT DISTINCT ON (post_id) post_id, rank, kind, row_id FROM ({matches}) matches
+    ORDER BY post_id, rank, kind, row_id
+"""
+
+
+def search_posts(query, group_id=None, first=None, after=None):
+    """
+    :param after: cursor of the last result of the previous page
+    :returns: ([{"post_id": 1, "score": 4.2, "snippet": "... <mark>cricket</mark> match ...", "cursor": "..."}],
+        whether there is a next page), best match first
+    """
+    if first is not None and first < 0:
+        raise Exception("Argument 'first' must be a non-negative integer")
+    first = min(first if first is not None else DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    connection = connections[router.db_for_read(Post)]
+    if connection.vendor == 'sqlite':
+        query = get_fts5_query(query)
+        matches_sql, best_sql = SQLITE_MATCHES, SQLITE_BEST_MATCHES
+    elif connection.vendor == 'postgresql':
+        matches_sql, best_sql = POSTGRES_MATCHES, POSTGRES_BEST_MATCHES
+    else:
+        raise Exception(f"Full-text search is not supported on {connection.vendor}")
+    if not re.search(r'\w', query):
+        return [], False
+
+    group_filter = "AND p.group_id = %s" if group_id is not None else ""
+    matches = matches_sql.format(
+        post_table=Post._meta.db_table, comment_table=Comment._meta.db_table, post_index=get_search_table(Post),
+        comment_index=get_search_table(Comment), config=POSTGRES_SEARCH_CONFIG, group_filter=group_filter)
+    group_params = [group_id] if group_id is not None else []
+    params = [query, *group_params, COMMENT_RANK_WEIGHT, query, *group_params]
+    sql = f"SELECT post_id, rank, kind, row_id FROM ({best_sql.format(matches=matches)}) best"
+    if after is not None:
+        rank, post_id = decode_cursor(after, 2)
+        sql += " WHERE rank > %s OR (rank = %s AND post_id > %s)"
+        params += [rank, rank, post_id]
+    sql += " ORDER BY rank, post_id LIMIT %s"
+    params.append(first + 1)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        has_next_page = len(rows) > first
+        rows = rows[:first]
+        snippets = get_snippets(cursor, query, rows)
+    return [
+        {"post_id": post_id, "score": -rank, "snippet": snippets.get((kind, row_id)),
+         "cursor": encode_cursor([rank, post_id])}
+        for post_id, rank, kind, row_id in rows
+    ], has_next_page
+
+
+def get_snippets(cursor, query, rows):
+    """
+    :returns: {(kind, row id): snippet} of the best match of every post
+    """
+    snippets = {}
+    for kind, model in (('post', Post), ('comment', Comment)):
+        row_ids = [row_id for _, _, row_kind, row_id in rows if row_kind == kind]
+        if not row_ids:
+            continue
+        if cursor.db.vendor == 'sqlite':
+            index = get_search_table(model)
+            cursor.execute(f"SELECT rowid, snippet({index}, 0, %s, %s, '…', %s) FROM {index} "
+                           f"WHERE {index} MATCH %s AND rowid IN ({', '.join(['%s'] * len(row_ids))})",
+                           [MATCH_START, MATCH_END, SNIPPET_WORDS, query, *row_ids])
+        else:
+            options = f"StartSel={MATCH_START}, StopSel={MATCH_END}, MaxWords={SNIPPET_WORDS}, MinWords=5"
+            cursor.execute(f"SELECT {model._meta.pk.column}, ts_headline('{POSTGRES_SEARCH_CONFIG}', content, "
+                           f"websearch_to_tsquery('{POSTGRES_SEARCH_CONFIG}', %s), %s) "
+                           f"FROM {model._meta.db_table} WHERE {model._meta.pk.column} = ANY(%s)",
+                           [query, options, row_ids])
+        for row_id, snippet in cursor.fetchall():
+            snippets[(kind, row_id)] = html.escape(snippet).replace(MATCH_START, "<mark>") \
+                .replace(MATCH_END, "</mark>")
+    return snippets
@@ -0,0 +1,83 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from fb_post.cache import invalidate_models
+from fb_post.models import User, Group, Membership, Post, Comment, React
+from fb_post.utils.counters import comment_removed, reaction_removed, refresh_counters
+from fb_post.utils.feed import refresh_feed_author
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Group)
+@receiver([post_save, post_delete], sender=Membership)
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=React)
+def invalidate_cached_responses(sender, **kwargs):
+    invalidate_models(sender)
+
+
+@receiver(m2m_changed, sender=Group.members.through)
+def invalidate_cached_memberships(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_models(Membership)
+
+
+@receiver(post_save, sender=User)
+def refresh_group_feed_author(sender, instance, created, **kwargs):
+    if not created:
+        refresh_feed_author(instance)
+
+
+def is_deleted_with(origin, *models):
+    """
+    :param origin: the instance or queryset whose delete() removed the row, as post_delete sends it
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, models)
+
+
+@receiver(post_delete, sender=React)
+def uncount_deleted_reaction(sender, instance, origin=None, **kwargs):
+    """
+    Keeps the counters right whichever way a reaction is deleted, e.g. from the admin, by a queryset's delete()
+    or with the comment it was on. The counters of a deleted user's rows are refreshed at once by
+    refresh_counters_of_deleted_user, and those of a deleted post's rows go with the post.
+    """
+    if is_deleted_with(origin, User, Post):
+        return
+    if instance.post_id is not None:
+        reaction_removed(Post, instance.post_id, instance.reaction)
+    elif instance.comment_id is not None:
+        reaction_removed(Comment, instance.comment_id, instance.reaction)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_deleted_comment(sender, instance, origin=None, **kwargs):
+    """
+    As uncount_deleted_reaction, for comments_count and replies_count
+    """
+    if is_deleted_with(origin, User, Post):
+        return
+    comment_removed(Post, Comment, instance.post_id, instance.reply_id)
+
+
+@receiver(pre_delete, sender=User)
+def collect_counted_rows(sender, instance, **kwargs):
+    """
+    Notes the posts and comments whose counters include the reactions, comments and replies that cascade
+    with the user
+    """
+    reactions = React.objects.filter(reacted_by=instance)
+    comments = Comment.objects.filter(commented_by=instance)
+    instance.counted_post_ids = {*reactions.values_list('post_id', flat=True),
+                                 *comments.values_list('post_id', flat=True)} - {None}
+    instance.counted_comment_ids = {*reactions.values_list('comment_id', flat=True),
+                                    *comments.values_list('reply_id', flat=True)} - {None}
+
+
+@receiver(post_delete, sender=User)
+def refresh_counters_of_deleted_user(sender, instance, **kwargs):
+    refresh_counters(Post, Comment, React, getattr(instance, 'counted_post_ids', ()),
+                     getattr(instance, 'counted_comment_ids', ()))
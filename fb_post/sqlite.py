@@ -0,0 +1,105 @@
+"""
+SQLite tuning for single node deployments.
+
+Every new SQLite connection runs the PRAGMAs in settings.SQLITE_PRAGMAS: WAL lets readers carry on while
+a write is in progress, busy_timeout makes a blocked writer wait instead of failing with "database is
+locked", and mmap_size/cache_size keep hot pages in memory.
+
+SQLite still allows one writer at a time, so with settings.SQLITE_SERIALIZE_WRITES the GraphQL view runs
+mutations through write_queue, one at a time per process and in arrival order, rather than letting them
+race for the database lock. Transactions started by mutations take the write lock at BEGIN IMMEDIATE, other
+transactions stay deferred so that reads never wait for it.
+"""
+import threading
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.db import connection as default_connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+class WriteQueue:
+    """
+    Lock handed out in the order it was asked for
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._abandoned = set()
+
+    def _advance(self):
+        self._serving += 1
+        while self._serving in self._abandoned:
+            self._abandoned.remove(self._serving)
+            self._serving += 1
+        self._condition.notify_all()
+
+    @contextmanager
+    def turn(self):
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            try:
+                while ticket != self._serving:
+                    self._condition.wait()
+            except BaseException:
+                # give up the place in the queue, whoever is behind must not wait for it
+                if ticket == self._serving:
+                    self._advance()
+                else:
+                    self._abandoned.add(ticket)
+                raise
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._advance()
+
+    def __len__(self):
+        with self._condition:
+            return self._next_ticket - self._serving - len(self._abandoned)
+
+
+write_queue = WriteQueue()
+
+
+@contextmanager
+def immediate_transactions(connection=default_connection):
+    """
+    Starts the transactions opened inside the block with BEGIN IMMEDIATE, so that a writer waits for the lock,
+    up to busy_timeout, when its transaction starts. A deferred transaction that reads and then writes fails at
+    once with "database is locked" if another writer got in between.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    # transaction_mode is read from OPTIONS when the connection opens
+    connection.ensure_connection()
+    previous = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        yield
+    finally:
+        connection.transaction_mode = previous
+
+
+@contextmanager
+def serialized_writes():
+    if default_connection.vendor != 'sqlite':
+        yield
+        return
+    serialize = getattr(settings, 'SQLITE_SERIALIZE_WRITES', False)
+    with write_queue.turn() if serialize else nullcontext(), immediate_transactions():
+        yield
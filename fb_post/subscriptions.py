@@ -0,0 +1,203 @@
+"""
+GraphQL subscriptions over WebSocket, speaking the graphql-transport-ws protocol of the graphql-ws client.
+
+facebook_clone_backend.asgi hands WebSocket connections to this module and everything else to Django.
+The client opens with connection_init, which is acknowledged, then starts operations with
+{"id": ..., "type": "subscribe", "payload": {"query": ...}}. Every event of an operation is sent as a
+"next" message until the client sends "complete" for its id. Protocol violations close the socket with the
+4xxx codes of the protocol.
+
+Documents go through the same persisted query resolution, document cache and cost limits as /graphql, and
+only subscription operations are accepted; queries and mutations are sent to /graphql. Each event is
+executed like a query of the async view, with fresh AsyncLoaders and AsyncDatabaseMiddleware, against the
+primary database since a replica may not have the row that was just written.
+"""
+import asyncio
+import json
+import time
+from inspect import isawaitable
+from types import SimpleNamespace
+
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphene_django.views import instantiate_middleware
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, validate
+from graphql.execution import create_source_event_stream
+
+from fb_post.async_execution import AsyncDatabaseMiddleware, database_sync_to_async
+from fb_post.complexity import get_query_cost_rule
+from fb_post.encoders import get_json_encoder
+from fb_post.loaders import AsyncLoaders
+from fb_post.persisted_queries import resolve_query, get_validated_document
+
+PROTOCOL = 'graphql-transport-ws'
+
+INVALID_MESSAGE = 4400
+UNAUTHORIZED = 4401
+SUBPROTOCOL_NOT_ACCEPTABLE = 4406
+CONNECTION_INITIALISATION_TIMEOUT = 4408
+SUBSCRIBER_ALREADY_EXISTS = 4409
+TOO_MANY_INITIALISATION_REQUESTS = 4429
+
+
+class GraphQLWebSocketApplication:
+    """
+    ASGI application serving one GraphQLWebSocketConnection per WebSocket
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+
+    async def __call__(self, scope, receive, send):
+        await GraphQLWebSocketConnection(self.schema.graphql_schema, scope, receive, send).run()
+
+
+class GraphQLWebSocketConnection:
+
+    def __init__(self, schema, scope, receive, send):
+        self.schema = schema
+        self.scope = scope
+        self.receive = receive
+        self._send = send
+        self._send_lock = asyncio.Lock()
+        self.middleware = [*instantiate_middleware(graphene_settings.MIDDLEWARE), AsyncDatabaseMiddleware()]
+        self.operations = {}
+        self.initialised = False
+        self.closed = False
+
+    async def run(self):
+        if (await self.receive())["type"] != "websocket.connect":
+            return
+        if self.scope["path"] != getattr(settings, 'GRAPHQL_WEBSOCKET_PATH', '/graphql'):
+            # a close before the accept rejects the handshake
+            await self._send({"type": "websocket.close"})
+            return
+        if PROTOCOL not in self.scope.get("subprotocols", []):
+            await self._send({"type": "websocket.close", "code": SUBPROTOCOL_NOT_ACCEPTABLE})
+            return
+        await self._send({"type": "websocket.accept", "subprotocol": PROTOCOL})
+
+        deadline = time.monotonic() + getattr(settings, 'GRAPHQL_WEBSOCKET_INIT_TIMEOUT', 3)
+        try:
+            while not self.closed:
+                try:
+                    if self.initialised:
+                        message = await self.receive()
+                    else:
+                        message = await asyncio.wait_for(self.receive(), max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    await self.close(CONNECTION_INITIALISATION_TIMEOUT, "Connection initialisation timeout")
+                    break
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message["type"] == "websocket.receive":
+                    await self.handle(message.get("text") or message.get("bytes"))
+        finally:
+            for task in self.operations.values():
+                task.cancel()
+            await asyncio.gather(*self.operations.values(), return_exceptions=True)
+
+    async def handle(self, text):
+        try:
+            message = json.loads(text)
+            message_type = message["type"]
+        except (TypeError, ValueError, KeyError):
+            await self.close(INVALID_MESSAGE, "Invalid message received")
+            return
+
+        if message_type == "connection_init":
+            if self.initialised:
+                await self.close(TOO_MANY_INITIALISATION_REQUESTS, "Too many initialisation requests")
+                return
+            self.initialised = True
+            await self.send_json({"type": "connection_ack"})
+        elif message_type == "ping":
+            await self.send_json({"type": "pong"})
+        elif message_type == "pong":
+            pass
+        elif message_type == "subscribe":
+            operation_id, payload = message.get("id"), message.get("payload")
+            if not self.initialised:
+                await self.close(UNAUTHORIZED, "Unauthorized")
+            elif not isinstance(operation_id, str) or not isinstance(payload, dict):
+                await self.close(INVALID_MESSAGE, "Invalid message received")
+            elif operation_id in self.operations:
+                await self.close(SUBSCRIBER_ALREADY_EXISTS, f"Subscriber for {operation_id} already exists")
+            else:
+                self.operations[operation_id] = asyncio.ensure_future(self.run_operation(operation_id, payload))
+        elif message_type == "complete":
+            task = self.operations.pop(message.get("id"), None)
+            if task is not None:
+                task.cancel()
+        else:
+            await self.close(INVALID_MESSAGE, f"Unexpected message type {message_type}")
+
+    async def run_operation(self, operation_id, payload):
+        try:
+            variables = payload.get("variables")
+            operation_name = payload.get("operationName")
+            document, errors = await self.get_document(payload, variables, operation_name)
+            stream = None
+            if document is not None:
+                stream = await create_source_event_stream(self.schema, document, None, self.get_context(),
+                                                          variables, operation_name)
+                if isinstance(stream, ExecutionResult):
+                    document, errors = None, stream.errors
+            if document is None:
+                await self.send_json({"id": operation_id, "type": "error",
+                                      "payload": [error.formatted for error in errors]})
+                return
+
+            try:
+                async for event in stream:
+                    result = execute(self.schema, document, root_value=event, context_value=self.get_context(),
+                                     variable_values=variables, operation_name=operation_name,
+                                     middleware=self.middleware)
+                    if isawaitable(result):
+                        result = await result
+                    await self.send_json({"id": operation_id, "type": "next", "payload": result.formatted})
+            finally:
+                await stream.aclose()
+            await self.send_json({"id": operation_id, "type": "complete"})
+        finally:
+            if self.operations.get(operation_id) is asyncio.current_task():
+                del self.operations[operation_id]
+
+    async def get_document(self, payload, variables, operation_name):
+        """
+        :returns: (document, None) or (None, errors)
+        """
+        try:
+            query, query_hash = resolve_query(payload.get("query"), payload.get("extensions"))
+        except GraphQLError as error:
+            return None, [error]
+        if not query:
+            return None, [GraphQLError("Must provide query string.")]
+
+        document, errors = get_validated_document(self.schema, query, query_hash)
+        if errors:
+            return None, errors
+        operation_ast = get_operation_ast(document, operation_name)
+        if operation_ast is None or operation_ast.operation != OperationType.SUBSCRIPTION:
+            return None, [GraphQLError("Only subscriptions are served over WebSocket, send queries and mutations "
+                                       "to /graphql")]
+
+        # the cost estimate may read table statistics
+        errors = await database_sync_to_async(validate)(self.schema, document, [get_query_cost_rule(variables)])
+        if errors:
+            return None, errors
+        return document, None
+
+    def get_context(self):
+        return SimpleNamespace(scope=self.scope, loaders=AsyncLoaders())
+
+    async def send_json(self, data):
+        async with self._send_lock:
+            if not self.closed:
+                await self._send({"type": "websocket.send", "text": get_json_encoder().dumps(data).decode()})
+
+    async def close(self, code, reason):
+        async with self._send_lock:
+            if not self.closed:
+                self.closed = True
+                await self._send({"type": "websocket.close", "code": code, "reason": reason})
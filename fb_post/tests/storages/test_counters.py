@@ -0,0 +1,63 @@
+from django.test import TestCase
+
+from fb_post.models import User, Group, Post, Comment, React
+from fb_post.utils.counters import get_counter_mismatches
+from fb_post.utils.tasks import create_comment, react_to_comment, react_to_post, reply_to_comment
+
+
+class DeleteCounterTests(TestCase):
+    """
+    Rows deleted outside the write tasks, as the admin or a queryset's delete() would, leave the counters
+    matching the Comment and React tables
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(name="iB Cricket", profile_pic="")
+        self.other_user = User.objects.create(name="Yuri", profile_pic="")
+        group = Group.objects.create(name="Cricket")
+        self.post = Post.objects.create(content="Nice game", posted_at="2019-05-21 20:21:46", posted_by=self.user,
+                                        group=group)
+        self.comment = create_comment(self.user.pk, self.post.pk, "Well played")
+        self.reply_id = reply_to_comment(self.other_user.pk, self.comment.pk, "Agreed")
+        react_to_post(self.user.pk, self.post.pk, "WOW")
+        react_to_post(self.other_user.pk, self.post.pk, "LOVE")
+        react_to_comment(self.other_user.pk, self.comment.pk, "LIT")
+
+    def assertCountersMatch(self):
+        self.assertEqual(get_counter_mismatches(Post, Comment, React), {"Post": {}, "Comment": {}})
+
+    def test_deleting_a_reaction(self):
+        React.objects.get(post=self.post, reacted_by=self.user).delete()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.reactions_count, self.post.wow_count), (1, 0))
+        self.assertCountersMatch()
+
+    def test_deleting_reactions_with_a_queryset(self):
+        React.objects.all().delete()
+        self.assertCountersMatch()
+
+    def test_deleting_a_reply(self):
+        Comment.objects.get(pk=self.reply_id).delete()
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.replies_count, 0)
+        self.assertCountersMatch()
+
+    def test_deleting_a_comment_with_its_replies_and_reactions(self):
+        Comment.objects.filter(pk=self.comment.pk).delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertCountersMatch()
+
+    def test_toggling_a_comment_reaction_off(self):
+        react_to_comment(self.other_user.pk, self.comment.pk, "LIT")
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.reactions_count, 0)
+        self.assertCountersMatch()
+
+    def test_deleting_a_user(self):
+        self.other_user.delete()
+        self.assertCountersMatch()
+
+    def test_deleting_a_post(self):
+        self.post.delete()
+        self.assertCountersMatch()
@@ -0,0 +1,28 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from fb_post.management.commands.check_query_plans import get_hot_queries, get_plan_problems
+
+
+@skipUnless(connection.vendor == 'sqlite', "written against SQLite's EXPLAIN QUERY PLAN output")
+class HotQueryPlanTests(TestCase):
+
+    def test_hot_queries_search_an_index(self):
+        for name, queryset in get_hot_queries().items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertEqual(get_plan_problems(plan), [], plan)
+
+    def test_full_index_scan_is_a_problem(self):
+        plan = "4 0 0 SCAN fb_post_post USING INDEX post_posted_at_idx"
+        self.assertEqual(get_plan_problems(plan), ["SCAN fb_post_post USING INDEX post_posted_at_idx"])
+
+    def test_table_scan_and_temp_sort_are_problems(self):
+        plan = "2 0 0 SCAN fb_post_react\n12 0 0 USE TEMP B-TREE FOR ORDER BY"
+        self.assertEqual(get_plan_problems(plan), ["SCAN fb_post_react", "USE TEMP B-TREE FOR ORDER BY"])
+
+    def test_index_search_is_not_a_problem(self):
+        plan = "4 0 0 SEARCH fb_post_post USING INDEX post_posted_at_idx (posted_at>?)"
+        self.assertEqual(get_plan_problems(plan), [])
@@ -0,0 +1,111 @@
+import json
+import warnings
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from fb_post.cache import get_response_cache
+from fb_post.models import User, Group, Post
+from fb_post.routers import REPLICA_DB_ALIAS, read_replica
+from fb_post.utils.tasks import create_post, get_post
+
+
+class PrimaryReplicaRouterTests(TransactionTestCase):
+    """
+    Runs with a "replica" alias reading the primary's test database, as TEST MIRROR sets it up when
+    DATABASE_REPLICA is set, so the connection that ran a statement tells where it was routed. The replica
+    is a separate connection, which only sees committed rows, hence TransactionTestCase.
+    """
+    replica_configured = REPLICA_DB_ALIAS in settings.DATABASES
+    databases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS} if replica_configured else {DEFAULT_DB_ALIAS}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if not cls.replica_configured:
+            # added once the test database exists, as the test runner creates none for a mirror
+            primary = connections.settings[DEFAULT_DB_ALIAS]
+            replica = {**primary, 'TEST': {**primary['TEST'], 'MIRROR': DEFAULT_DB_ALIAS}}
+            connections.settings[REPLICA_DB_ALIAS] = replica
+            cls.databases = cls.databases | {REPLICA_DB_ALIAS}
+            with warnings.catch_warnings():
+                warnings.filterwarnings('ignore', "Overriding setting DATABASES")
+                cls.enterClassContext(override_settings(DATABASES={**settings.DATABASES, REPLICA_DB_ALIAS: replica}))
+
+    @classmethod
+    def tearDownClass(cls):
+        if not cls.replica_configured:
+            connections[REPLICA_DB_ALIAS].close()
+            del connections[REPLICA_DB_ALIAS]
+            del connections.settings[REPLICA_DB_ALIAS]
+        super().tearDownClass()
+
+    def setUp(self):
+        get_response_cache().clear()
+        self.user = User.objects.create(name="iB Cricket", profile_pic="")
+        self.group = Group.objects.create(name="Cricket")
+        self.post = Post.objects.create(content="Nice game", posted_at="2019-05-21 20:21:46", posted_by=self.user,
+                                        group=self.group)
+
+    def capture(self):
+        return CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]), \
+            CaptureQueriesContext(connections[REPLICA_DB_ALIAS])
+
+    def post_graphql(self, query):
+        return self.client.post("/graphql", json.dumps({"query": query}), content_type="application/json")
+
+    def test_reads_go_to_the_primary_by_default(self):
+        primary, replica = self.capture()
+        with primary, replica:
+            self.assertEqual(list(Post.objects.values_list('pk', flat=True)), [self.post.pk])
+        self.assertEqual(len(primary), 1)
+        self.assertEqual(len(replica), 0)
+
+    def test_read_replica_routes_reads_to_the_replica(self):
+        primary, replica = self.capture()
+        with primary, replica, read_replica():
+            self.assertEqual(list(Post.objects.values_list('pk', flat=True)), [self.post.pk])
+        self.assertEqual(len(primary), 0)
+        self.assertEqual(len(replica), 1)
+
+    def test_reads_from_replica_task_reads_the_replica(self):
+        primary, replica = self.capture()
+        with primary, replica:
+            self.assertEqual(get_post(self.post.pk)["post_id"], self.post.pk)
+        self.assertEqual(len(primary), 0)
+        self.assertGreater(len(replica), 0)
+
+    def test_writes_go_to_the_primary_inside_read_replica(self):
+        primary, replica = self.capture()
+        with primary, replica, read_replica():
+            User.objects.create(name="Yuri", profile_pic="")
+        self.assertEqual(len(replica), 0)
+        self.assertTrue(any(query['sql'].startswith('INSERT') for query in primary.captured_queries))
+
+    def test_read_after_write_stays_on_the_primary(self):
+        primary, replica = self.capture()
+        with primary, replica:
+            post = create_post(self.user.pk, "Well played", self.group.pk)
+            self.assertEqual(Post.objects.get(pk=post.pk).content, "Well played")
+        self.assertEqual(len(replica), 0)
+
+    def test_graphql_query_reads_the_replica(self):
+        primary, replica = self.capture()
+        with primary, replica:
+            response = self.post_graphql("{ allPosts(first: 5) { edges { node { postId content } } } }")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["allPosts"]["edges"][0]["node"]["content"], "Nice game")
+        self.assertEqual(len(primary), 0)
+        self.assertGreater(len(replica), 0)
+
+    def test_graphql_mutation_reads_and_writes_the_primary(self):
+        primary, replica = self.capture()
+        with primary, replica:
+            response = self.post_graphql(
+                "mutation { reactToPosts(reactions: [{userId: %d, postId: %d, reaction: \"WOW\"}]) "
+                "{ results { success error } } }" % (self.user.pk, self.post.pk))
+        self.assertEqual(response.json()["data"]["reactToPosts"]["results"], [{"success": True, "error": None}])
+        self.assertEqual(len(replica), 0)
+        self.assertGreater(len(primary), 0)
@@ -0,0 +1,23 @@
+from django.test import SimpleTestCase, override_settings
+
+from fb_post.instrumentation import MetricsRegistry
+
+
+class MetricsRegistryTests(SimpleTestCase):
+
+    @override_settings(GRAPHQL_METRICS_MAX_LABEL_VALUES=2)
+    def test_label_values_past_the_limit_are_counted_as_other(self):
+        registry = MetricsRegistry()
+        for operation in ("Feed", "Post", "Random1", "Random2", "Feed"):
+            registry.inc('graphql_requests_total', "GraphQL requests served", operation=operation)
+        lines = [line for line in registry.render().splitlines() if not line.startswith('#')]
+        self.assertEqual(lines, ['graphql_requests_total{operation="Feed"} 2',
+                                 'graphql_requests_total{operation="Post"} 1',
+                                 'graphql_requests_total{operation="other"} 2'])
+
+    @override_settings(GRAPHQL_METRICS_MAX_LABEL_VALUES=1)
+    def test_limit_applies_per_counter(self):
+        registry = MetricsRegistry()
+        registry.inc('graphql_requests_total', "GraphQL requests served", operation="Feed")
+        registry.inc('graphql_sql_queries_total', "SQL queries run by GraphQL requests", 3, operation="Post")
+        self.assertIn('graphql_sql_queries_total{operation="Post"} 3', registry.render())
@@ -1,7 +1,10 @@
 from django.urls import path, include
-from graphene_django.views import GraphQLView
 from .schema import schema
+from .views import BatchedGraphQLView, AsyncBatchedGraphQLView, export_posts_view, metrics_view
 
 urlpatterns = [
-    path("graphql", GraphQLView.as_view(graphiql=True,schema=schema))
-]
\ No newline at end of file
+    path("graphql", BatchedGraphQLView.as_view(graphiql=True,schema=schema)),
+    path("graphql/async", AsyncBatchedGraphQLView.as_view(schema=schema)),
+    path("metrics", metrics_view),
+    path("export/posts", export_posts_view),
+]
@@ -1,4 +1,12 @@
+from django.db.models import Exists, F, OuterRef
 from fb_post.models import User, Post, Comment, React, Group, Membership
+from fb_post.pagination import encode_cursor, decode_cursor, keyset_filter
+from fb_post.pubsub import publish_post_added
+from fb_post.routers import reads_from_replica
+from fb_post.utils.post_tree import build_post_trees
+from fb_post.utils.serializers import POST_COLUMNS, get_post_rows
+from fb_post.utils.feed import GROUP_FEED_ORDERING, append_to_group_feed, get_group_feed_rows, get_feed_item
+from django.db import transaction
 from datetime import datetime
 
 from fb_post.utils.exceptions import InvalidUserException, UserNotInGroupException, UserIsNotAdminException, \
@@ -6,6 +14,9 @@ from fb_post.utils.exceptions import InvalidUserException, UserNotInGroupExcepti
     InvalidMemberException, \
     InvalidGroupException
 
+# ids fetched per round trip by the functions returning iterators of ids
+ID_CHUNK_SIZE = 2000
+
 
 def create_group(user_id, name, member_ids):
     if len(name)==0:
@@ -126,8 +137,11 @@ def create_post(user_id, post_content, group_id=None):
         user = User.objects.get(user_id=user_id)
         group = Group.objects.get(pk=group_id)
         m = Membership.objects.get(group=group, member__user_id=user_id)
-        post = Post.objects.create(content=post_content, posted_at=datetime.now().strftime("%Y-%m-%d"), posted_by=user,
-                                   group=group)
+        with transaction.atomic():
+            post = Post.objects.create(content=post_content, posted_at=datetime.now().strftime("%Y-%m-%d"),
+                                       posted_by=user, group=group)
+            append_to_group_feed(post, user)
+            publish_post_added(post)
 
         group.save()
         return post.post_id
@@ -144,6 +158,7 @@ def create_post(user_id, post_content, group_id=None):
         print("User is not an admin")
 
 
+@reads_from_replica
 def get_group_feed(user_id, group_id, offset, limit):
     """
     :return: [
@@ -196,86 +211,106 @@ def get_group_feed(user_id, group_id, offset, limit):
     }
     ]
     """
-    all_posts = []
-    user = User.objects.get(user_id=user_id)
-    group = Group.objects.get(pk=group_id)
-    if user in group.members.all():
-        posts = Post.objects.filter(posted_by=user)
-
-        for post in posts:
-            post_obj = {}
-            post_obj.update(post.get_post_dict())
-            del post_obj['group']
-            react_obj = {}
-
-            reactions = React.objects.filter(post=post)
-
-            all_types = []
-            for react in reactions:
-                if react.reaction not in all_types:
-                    all_types.append(react.reaction)
-
-            react_obj.update({"reactions": {"count": reactions.count(), "type": all_types}})
-            comments = Comment.objects.filter(post=post)
-            comments_count = Comment.objects.filter(post=post).count()
-            all_comments = []
-
-            for comment in comments:
-                comment_obj = {}
-                comment_obj.update(comment.get_comment_dict())
-                comment_react = React.objects.filter(comment = comment)
-                react_comment = []
-                reply_comments = []
-                reply_reaction_type = []
-                replies = Comment.objects.filter(reply=comment)
-                reaction_to_reply = React.objects.filter(comment__in=replies)
-                for y in replies:
-                    y = y.get_comment_dict()
-                    y.update({"reactions": {"count": reaction_to_reply.count(), "type": reply_reaction_type}})
-                    reply_comments.append(y)
-                comment_obj.update({"replies": reply_comments})
-                for react in comment_react:
-                    if react.reaction not in react_comment:
-                        react_comment.append(react.reaction)
-                comment_obj.update({"reactions": {
-                    "count": comment_react.count(),
-                    "type": react_comment
-                }})
-                all_comments.append(comment_obj)
-
-            react_obj.update({"comments": all_comments})
-            react_obj.update({"comments_count": comments_count})
-            post_obj.update(react_obj)
-            all_posts.append(post_obj)
-    return all_posts[offset:offset + limit]
-
-
-def get_posts_with_more_comments_than_reactions():
+    if not is_group_member(user_id, group_id):
+        return []
+    posts = get_group_posts(group_id)[offset:offset + limit]
+    return build_post_trees(get_post_rows(posts, include_group=False))
+
+
+@reads_from_replica
+def get_group_feed_after(user_id, group_id, limit, after=None):
+    """
+    Cursor based variant of get_group_feed, every page costs the same however deep the reader has scrolled.
+
+    :return: {
+        "posts": [...same items as get_group_feed...],
+        "next_cursor": "WyIyMDE5LTA1LTIxIDIwOjIxOjQ2IiwgMV0="  # None on the last page
+    }
+    """
+    if not is_group_member(user_id, group_id):
+        return {"posts": [], "next_cursor": None}
+    posts = get_group_posts(group_id)
+    if after is not None:
+        posts = posts.filter(keyset_filter(GROUP_FEED_ORDERING, decode_cursor(after, len(GROUP_FEED_ORDERING)),
+                                           forward=True))
+    rows = get_post_rows(posts[:limit + 1], include_group=False)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][POST_COLUMNS.index(field.lstrip('-'))] for field in GROUP_FEED_ORDERING])
+    return {"posts": build_post_trees(rows), "next_cursor": next_cursor}
+
+
+@reads_from_replica
+def get_group_feed_summary(user_id, group_id, limit, after=None):
     """
-    :returns: list of post_ids
+    Feed items without their comments, one query per page. Served from the materialized feed
+    when settings.GROUP_FEED_FAN_OUT is on, see fb_post.utils.feed.
+
+    :return: {
+        "posts": [
+            {
+                "post_id": 1,
+                "posted_by": {
+                    "name": "iB Cricket",
+                    "user_id": 1,
+                    "profile_pic": "https://dummy.url.com/pic.png"
+                },
+                "posted_at": "2019-05-21 20:21:46",
+                "post_content": "Write Something here...",
+                "reactions": {
+                    "count": 10,
+                    "type": ["WOW", "HAHA"]
+                },
+                "comments_count": 3,
+            },
+            ...
+        ],
+        "next_cursor": "WyIyMDE5LTA1LTIxIDIwOjIxOjQ2IiwgMV0="  # None on the last page
+    }
     """
-    all_posts = []
-    posts = Post.objects.all()
-    for post in posts:
-        comment_count = (Comment.objects.filter(post=post).count())
-        react_count = React.objects.filter(post=post).count()
-        if comment_count > react_count:
-            all_posts.append(post.post_id)
+    if not is_group_member(user_id, group_id):
+        return {"posts": [], "next_cursor": None}
+    rows = get_group_feed_rows(group_id, limit + 1, after)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]['posted_at'], rows[-1]['post_id']])
+    return {"posts": [get_feed_item(row) for row in rows], "next_cursor": next_cursor}
+
+
+def is_group_member(user_id, group_id):
+    try:
+        User.objects.get(user_id=user_id)
+        Group.objects.get(pk=group_id)
+    except User.DoesNotExist:
+        raise InvalidUserException("User id is not defined")
+    except Group.DoesNotExist:
+        raise InvalidGroupException("Group doesn't exists")
+    return Membership.objects.filter(group_id=group_id, member_id=user_id).exists()
+
 
-    return all_posts
+def get_group_posts(group_id):
+    return Post.objects.filter(group_id=group_id).order_by(*GROUP_FEED_ORDERING)
 
 
-def get_silent_group_members(group_id):
+def get_posts_with_more_comments_than_reactions(chunk_size=ID_CHUNK_SIZE):
     """
+    :returns: iterator of post_ids, compared on the counters kept by fb_post.utils.counters in one query
     """
-    group = Group.objects.get(id=group_id)
-    users = group.members.all()
-    silent_users = []
-    for user in users:
-        if Post.objects.filter(posted_by=user).count() == 0:
-            silent_users.append(user)
+    posts = Post.objects.filter(comments_count__gt=F('reactions_count')).values_list('post_id', flat=True)
+    return posts.iterator(chunk_size=chunk_size)
 
-    return silent_users
+
+def get_silent_group_members(group_id, chunk_size=ID_CHUNK_SIZE):
+    """
+    :returns: iterator of user_ids of the members of the group who never posted, in one NOT EXISTS query
+    """
+    Group.objects.get(id=group_id)
+    members = Membership.objects.filter(group_id=group_id) \
+        .filter(~Exists(Post.objects.filter(posted_by=OuterRef('member_id')))) \
+        .values_list('member_id', flat=True)
+    return members.iterator(chunk_size=chunk_size)
 
 
 def get_user_posts(user_id):
@@ -283,44 +318,7 @@ def get_user_posts(user_id):
 
     try:
         user = User.objects.get(user_id=user_id)
-        posts = Post.objects.filter(posted_by=user)
-        all_posts = []
-        for post in posts:
-            post_obj = {}
-            post_obj.update(post.get_post_dict())
-            reactions = React.objects.filter(post=post)
-            all_types = []
-            for react in reactions:
-                if react.reaction not in all_types:
-                    all_types.append(react.reaction)
-
-            post_obj.update({"reactions": {"count": reactions.count(), "type": all_types}})
-            comments = Comment.objects.filter(post=post)
-            comments_count = Comment.objects.filter(post=post).count()
-            all_comments = []
-            for comment in comments:
-                comment_obj = {}
-                all_replies = []
-                replies = Comment.objects.filter(reply__comment_id=comment.comment_id)
-                replies_count = Comment.objects.filter(reply__comment_id=comment.comment_id).count()
-                for reply in replies:
-                    reply_obj = {}
-                    reply_obj.update(reply.get_comment_dict())
-                    reply_reactions = React.objects.filter(comment=reply)
-                    all_reply_types = []
-                    for react in reply_reactions:
-                        all_reply_types.append(react.reaction)
-                    reply_obj.update({"reactions": {"count": reactions.count(), "type": all_types}})
-                    all_replies.append(reply_obj)
-                comment_obj.update(comment.get_comment_dict())
-                comment_obj.update({"replies_count": replies_count, "replies": all_replies})
-
-                all_comments.append(comment_obj)
-
-            post_obj.update({"comments": all_comments})
-            post_obj.update({"comments_count": comments_count})
-            all_posts.append(post_obj)
-        return all_posts
+        return build_post_trees(get_post_rows(Post.objects.filter(posted_by=user)))
     except:
         print("Invalid")
     """
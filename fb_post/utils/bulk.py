@@ -0,0 +1,177 @@
+"""
+Set based variants of the one-row tasks in tasks.py and assign_7.py.
+
+Every function validates the whole batch with one query per referenced table and writes with
+bulk_create/bulk_update, both in a single transaction, and returns one result per input item, in order:
+    [{"index": 0, "success": True, "error": None}, {"index": 1, "success": False, "error": "InvalidPostException"}]
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import transaction
+from fb_post.models import User, Post, Comment, React, Group, Membership, REACTION_COUNT_FIELDS
+from fb_post.utils.counters import apply_counter_deltas
+from fb_post.cache import invalidate_models
+from fb_post.pubsub import publish_comment_added, publish_reactions_changed
+from fb_post.utils.exceptions import InvalidUserException, InvalidPostException, InvalidCommentContent, \
+    InvalidReactionTypeException, InvalidGroupException, UserIsNotAdminException
+
+MAX_BULK_ITEMS = 1000
+BULK_BATCH_SIZE = 500
+
+
+def get_item_result(index, error=None, **extra):
+    result = {"index": index, "success": error is None, "error": error.__name__ if error else None}
+    result.update(extra)
+    return result
+
+
+def check_batch_size(items):
+    if len(items) > MAX_BULK_ITEMS:
+        raise ValueError(f"At most {MAX_BULK_ITEMS} items can be sent at once")
+
+
+def get_existing_ids(model, ids):
+    return set(model.objects.filter(pk__in=set(ids)).values_list('pk', flat=True))
+
+
+def get_locked_ids(model, ids):
+    """
+    Locks the rows with SELECT ... FOR UPDATE, in one order to avoid deadlocks, so that none of them is deleted
+    before the transaction ends
+
+    :returns: the ids of the rows that exist
+    """
+    return set(model.objects.select_for_update().filter(pk__in=set(ids)).order_by('pk')
+               .values_list('pk', flat=True))
+
+
+def react_to_posts(reactions):
+    """
+    :param reactions: [{"user_id": 1, "post_id": 2, "reaction_type": "WOW"}, ...]
+
+    Same semantics as react_to_post for every item; when a batch holds several reactions
+    of one user on one post, the last one wins.
+    """
+    check_batch_size(reactions)
+    reacted_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    with transaction.atomic():
+        # a first reaction has no React row to lock, so the posts are locked, and checked only once they are,
+        # so that a post deleted meanwhile fails its items rather than the whole batch
+        post_ids = get_locked_ids(Post, [item["post_id"] for item in reactions])
+        user_ids = get_existing_ids(User, [item["user_id"] for item in reactions])
+
+        results = []
+        latest = {}
+        for index, item in enumerate(reactions):
+            if item["reaction_type"] not in REACTION_COUNT_FIELDS:
+                results.append(get_item_result(index, InvalidReactionTypeException))
+            elif item["user_id"] not in user_ids:
+                results.append(get_item_result(index, InvalidUserException))
+            elif item["post_id"] not in post_ids:
+                results.append(get_item_result(index, InvalidPostException))
+            else:
+                latest[(item["post_id"], item["user_id"])] = item["reaction_type"]
+                results.append(get_item_result(index))
+        if not latest:
+            return results
+
+        previous = {
+            (post_id, user_id): reaction
+            for post_id, user_id, reaction in React.objects
+            .filter(post_id__in={post_id for post_id, _ in latest},
+                    reacted_by_id__in={user_id for _, user_id in latest})
+            .values_list('post_id', 'reacted_by_id', 'reaction')
+        }
+        deltas = defaultdict(lambda: defaultdict(int))
+        for (post_id, user_id), reaction in latest.items():
+            old_reaction = previous.get((post_id, user_id))
+            if old_reaction == reaction:
+                continue
+            if old_reaction is None:
+                deltas[post_id]['reactions_count'] += 1
+            else:
+                deltas[post_id][REACTION_COUNT_FIELDS[old_reaction]] -= 1
+            deltas[post_id][REACTION_COUNT_FIELDS[reaction]] += 1
+
+        React.objects.bulk_create(
+            [React(post_id=post_id, reacted_by_id=user_id, reaction=reaction, reacted_at=reacted_at)
+             for (post_id, user_id), reaction in latest.items()],
+            batch_size=BULK_BATCH_SIZE, update_conflicts=True, unique_fields=['post', 'reacted_by'],
+            update_fields=['reaction', 'reacted_at'])
+        apply_counter_deltas(Post, deltas)
+        invalidate_models(React)
+        publish_reactions_changed(deltas)
+    return results
+
+
+def create_comments(comments):
+    """
+    :param comments: [{"user_id": 1, "post_id": 2, "comment_content": "Nice game..."}, ...]
+    :returns: item results as above, successful ones carry "comment_id"
+    """
+    check_batch_size(comments)
+    commented_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    with transaction.atomic():
+        # as in react_to_posts, the posts whose comments_count is updated are checked once they are locked
+        post_ids = get_locked_ids(Post, [item["post_id"] for item in comments])
+        user_ids = get_existing_ids(User, [item["user_id"] for item in comments])
+
+        results = []
+        new_comments = {}
+        for index, item in enumerate(comments):
+            if len(item["comment_content"]) == 0:
+                results.append(get_item_result(index, InvalidCommentContent))
+            elif item["user_id"] not in user_ids:
+                results.append(get_item_result(index, InvalidUserException))
+            elif item["post_id"] not in post_ids:
+                results.append(get_item_result(index, InvalidPostException))
+            else:
+                new_comments[index] = Comment(content=item["comment_content"], commented_at=commented_at,
+                                              commented_by_id=item["user_id"], post_id=item["post_id"])
+                results.append(get_item_result(index, comment_id=None))
+        if not new_comments:
+            return results
+
+        Comment.objects.bulk_create(new_comments.values(), batch_size=BULK_BATCH_SIZE)
+        invalidate_models(Comment)
+        for comment in new_comments.values():
+            publish_comment_added(comment)
+        deltas = defaultdict(lambda: defaultdict(int))
+        for comment in new_comments.values():
+            deltas[comment.post_id]['comments_count'] += 1
+        apply_counter_deltas(Post, deltas)
+    for index, comment in new_comments.items():
+        results[index]["comment_id"] = comment.comment_id
+    return results
+
+
+def add_members_to_group(user_id, new_member_ids, group_id):
+    """
+    Adds every user in new_member_ids to the group on behalf of the admin user_id.
+    Users that are already members succeed without being added twice.
+    """
+    check_batch_size(new_member_ids)
+    if not Group.objects.filter(pk=group_id).exists():
+        raise InvalidGroupException("Group doesn't exists")
+    if not Membership.objects.filter(group_id=group_id, member_id=user_id, is_admin=True).exists():
+        raise UserIsNotAdminException("User is not an admin")
+
+    user_ids = get_existing_ids(User, new_member_ids)
+    with transaction.atomic():
+        current_members = set(Membership.objects.select_for_update().filter(group_id=group_id)
+                              .values_list('member_id', flat=True))
+        results = []
+        new_memberships = {}
+        for index, member_id in enumerate(new_member_ids):
+            if member_id not in user_ids:
+                results.append(get_item_result(index, InvalidUserException))
+                continue
+            if member_id not in current_members:
+                new_memberships[member_id] = Membership(group_id=group_id, member_id=member_id)
+            results.append(get_item_result(index))
+        Membership.objects.bulk_create(new_memberships.values(), batch_size=BULK_BATCH_SIZE)
+        invalidate_models(Membership)
+    return results
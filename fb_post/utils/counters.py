@@ -0,0 +1,124 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from fb_post.cache import invalidate_models
+from fb_post.models import REACTION_COUNT_FIELDS
+from fb_post.utils.post_tree import chunked
+
+
+# Counter updates bypass the save signals, so each one orphans the cached responses that read its model itself
+
+def reaction_removed(model, pk, reaction):
+    model.objects.filter(pk=pk).update(**{
+        'reactions_count': F('reactions_count') - 1,
+        REACTION_COUNT_FIELDS[reaction]: F(REACTION_COUNT_FIELDS[reaction]) - 1,
+    })
+    invalidate_models(model)
+
+
+def comment_removed(post_model, comment_model, post_id, reply_id):
+    """
+    Takes a deleted comment out of the comments_count of its post, or a deleted reply out of the replies_count
+    of its comment
+    """
+    if post_id is not None:
+        post_model.objects.filter(pk=post_id).update(comments_count=F('comments_count') - 1)
+        invalidate_models(post_model)
+    if reply_id is not None:
+        comment_model.objects.filter(pk=reply_id).update(replies_count=F('replies_count') - 1)
+        invalidate_models(comment_model)
+
+
+def reaction_changed(model, pk, previous, reaction):
+    """
+    Moves the counters of one post or comment for a user's reaction going from previous, None when the user
+    had not reacted, to reaction
+    """
+    if previous == reaction:
+        return
+    updates = {REACTION_COUNT_FIELDS[reaction]: F(REACTION_COUNT_FIELDS[reaction]) + 1}
+    if previous is None:
+        updates['reactions_count'] = F('reactions_count') + 1
+    else:
+        updates[REACTION_COUNT_FIELDS[previous]] = F(REACTION_COUNT_FIELDS[previous]) - 1
+    model.objects.filter(pk=pk).update(**updates)
+    invalidate_models(model)
+
+
+def apply_counter_deltas(model, deltas):
+    """
+    Adds {pk: {field: delta}} to the counters of many rows with one UPDATE ... CASE statement.
+    """
+    fields = sorted({field for row_deltas in deltas.values() for field in row_deltas})
+    if not fields:
+        return
+    rows = []
+    for pk, row_deltas in deltas.items():
+        row = model(pk=pk)
+        for field in fields:
+            setattr(row, field, F(field) + row_deltas.get(field, 0))
+        rows.append(row)
+    model.objects.bulk_update(rows, fields)
+    invalidate_models(model)
+
+
+def count_subquery(queryset, field):
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('*'))
+    return Coalesce(Subquery(counts.values('count')), Value(0))
+
+
+def get_expected_counters(model, related_field, comment_model, react_model):
+    """
+    :returns: {counter field: expression recomputing it from the Comment and React tables}
+    """
+    reactions = react_model.objects.all()
+    expected = {'reactions_count': count_subquery(reactions, related_field)}
+    for reaction, field in REACTION_COUNT_FIELDS.items():
+        expected[field] = count_subquery(reactions.filter(reaction=reaction), related_field)
+    if related_field == 'post':
+        expected['comments_count'] = count_subquery(comment_model.objects.all(), 'post')
+    else:
+        expected['replies_count'] = count_subquery(comment_model.objects.all(), 'reply')
+    return expected
+
+
+def rebuild_counters(post_model, comment_model, react_model):
+    """
+    Recomputes every counter column with one UPDATE per table.
+    """
+    post_model.objects.update(**get_expected_counters(post_model, 'post', comment_model, react_model))
+    comment_model.objects.update(**get_expected_counters(comment_model, 'comment', comment_model, react_model))
+    invalidate_models(post_model, comment_model)
+
+
+def refresh_counters(post_model, comment_model, react_model, post_ids, comment_ids):
+    """
+    Recomputes the counters of the given posts and comments only, e.g. after a cascading delete removed
+    reactions or comments counted by them
+    """
+    for batch in chunked(post_ids):
+        post_model.objects.filter(pk__in=batch) \
+            .update(**get_expected_counters(post_model, 'post', comment_model, react_model))
+    for batch in chunked(comment_ids):
+        comment_model.objects.filter(pk__in=batch) \
+            .update(**get_expected_counters(comment_model, 'comment', comment_model, react_model))
+    invalidate_models(post_model, comment_model)
+
+
+def get_counter_mismatches(post_model, comment_model, react_model):
+    """
+    :returns: {"Post": {post_id: {"comments_count": (stored, expected), ...}}, "Comment": {...}}
+    """
+    mismatches = {}
+    for model, related_field in ((post_model, 'post'), (comment_model, 'comment')):
+        expected = get_expected_counters(model, related_field, comment_model, react_model)
+        annotations = {f'expected_{field}': expression for field, expression in expected.items()}
+        rows = model.objects.order_by().annotate(**annotations).values('pk', *expected, *annotations)
+        model_mismatches = {}
+        for row in rows.iterator():
+            wrong = {field: (row[field], row[f'expected_{field}']) for field in expected
+                     if row[field] != row[f'expected_{field}']}
+            if wrong:
+                model_mismatches[row['pk']] = wrong
+        mismatches[model.__name__] = model_mismatches
+    return mismatches
@@ -0,0 +1,111 @@
+"""
+Streaming export of posts with their comments, replies and reactions, for the export_posts command and the
+/export/posts endpoint.
+
+A PostExport covers the posts after an optional watermark, up to the newest post when it is created, in
+(posted_at, post_id) order. Rows are read with iterator(chunk_size=...), a server-side cursor where the
+database has one, and every chunk of posts is written out before the next one is read, so memory stays
+constant however many posts there are. After an export, PostExport.watermark is the cursor to pass as
+`after` to export only the posts created since. Comments, replies and reactions added later to posts that
+were already exported are not exported again, and neither is a post committed after a newer one.
+
+NDJSON lines are the post dicts documented on get_post, with a "group" key. CSV exports one flat table,
+posts, comments (with their replies) or reactions (on those posts, comments and replies).
+"""
+import csv
+from itertools import islice
+
+from django.db.models import Q
+
+from fb_post.encoders import get_json_encoder
+from fb_post.models import Post, Comment, React
+from fb_post.pagination import encode_cursor, decode_cursor, keyset_filter
+from fb_post.utils.post_tree import build_post_trees
+from fb_post.utils.serializers import POST_GROUP_COLUMNS, get_post_columns
+
+EXPORT_CHUNK_SIZE = 500
+EXPORT_ORDERING = ['posted_at', 'post_id']
+
+CSV_COLUMNS = {
+    'posts': POST_GROUP_COLUMNS + ('comments_count', 'reactions_count'),
+    'comments': ('comment_id', 'post_id', 'reply_id', 'commented_by_id', 'commented_at', 'content'),
+    'reactions': ('id', 'post_id', 'comment_id', 'reacted_by_id', 'reaction', 'reacted_at'),
+}
+
+
+class CSVBuffer:
+    """
+    File-like object handing back what csv.writer writes to it
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_chunks(rows, size):
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class PostExport:
+
+    def __init__(self, after=None, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        :param after: watermark of a previous export, an opaque cursor
+        """
+        posts = Post.objects.order_by(*EXPORT_ORDERING)
+        if after:
+            posts = posts.filter(keyset_filter(EXPORT_ORDERING, decode_cursor(after, len(EXPORT_ORDERING)), True))
+        newest = posts.values_list(*EXPORT_ORDERING).last()
+        if newest is not None:
+            # posts created while the export runs are left to the next one
+            posts = posts.exclude(keyset_filter(EXPORT_ORDERING, newest, True))
+        self.posts = posts
+        self.watermark = encode_cursor(list(newest)) if newest is not None else after
+        self.chunk_size = chunk_size
+        self.exported = 0
+
+    def __iter__(self):
+        """
+        :returns: iterator of the post dicts documented on get_post, with a "group" key
+        """
+        rows = self.posts.values_list(*get_post_columns()).iterator(chunk_size=self.chunk_size)
+        for chunk in iter_chunks(rows, self.chunk_size):
+            yield from build_post_trees(chunk)
+            self.exported += len(chunk)
+
+    def iter_ndjson(self):
+        """
+        :returns: iterator of bytes, one chunk of posts at a time, one post per line
+        """
+        encoder = get_json_encoder()
+        posts = iter(self)
+        for chunk in iter_chunks(posts, self.chunk_size):
+            yield b"".join(encoder.dumps(post) + b"\n" for post in chunk)
+
+    def iter_csv(self, table='posts'):
+        """
+        :returns: iterator of bytes, the header and then one chunk of rows at a time
+        """
+        columns = CSV_COLUMNS[table]
+        writer = csv.writer(CSVBuffer())
+        yield writer.writerow(columns).encode()
+        rows = self.get_table(table).values_list(*columns).iterator(chunk_size=self.chunk_size)
+        for chunk in iter_chunks(rows, self.chunk_size):
+            yield "".join(writer.writerow(row) for row in chunk).encode()
+            self.exported += len(chunk)
+
+    def get_table(self, table):
+        post_ids = self.posts.values('post_id')
+        if table == 'posts':
+            return self.posts
+        comments = Comment.objects.filter(Q(post_id__in=post_ids) | Q(reply__post_id__in=post_ids))
+        if table == 'comments':
+            return comments.order_by('comment_id')
+        if table == 'reactions':
+            return React.objects.filter(Q(post_id__in=post_ids) | Q(comment_id__in=comments.values('comment_id'))) \
+                .order_by('id')
+        raise ValueError(f"Unknown table {table}, expected one of {', '.join(CSV_COLUMNS)}")
@@ -0,0 +1,111 @@
+"""
+Materialized group feed.
+
+With settings.GROUP_FEED_FAN_OUT on, creating a post also writes a GroupFeedEntry holding everything a
+feed item shows of the post and its author, so a page of a group's feed is one range scan of
+feed_group_posted_at_idx joined to Post by primary key for the live counters. With it off, the same
+items are read from Post and User. After turning it on for an existing database, run
+`manage.py backfill_group_feed`.
+"""
+from django.conf import settings
+
+from fb_post.models import REACTION_COUNT_FIELDS, Post, GroupFeedEntry
+from fb_post.pagination import decode_cursor, keyset_filter
+from fb_post.utils.serializers import REACTION_SUMMARY_COLUMNS, format_datetime, serialize_reaction_summary, \
+    serialize_user
+
+GROUP_FEED_ORDERING = ['-posted_at', '-post_id']
+FEED_BACKFILL_BATCH_SIZE = 1000
+
+COUNTER_FIELDS = ['comments_count', 'reactions_count', *REACTION_COUNT_FIELDS.values()]
+
+# feed item column -> lookup on GroupFeedEntry / on Post
+ENTRY_LOOKUPS = {
+    'post_id': 'post_id', 'posted_at': 'posted_at', 'content': 'content',
+    'user_id': 'posted_by_id', 'name': 'author_name', 'profile_pic': 'author_profile_pic',
+    **{field: f'post__{field}' for field in COUNTER_FIELDS},
+}
+POST_LOOKUPS = {
+    'post_id': 'post_id', 'posted_at': 'posted_at', 'content': 'content',
+    'user_id': 'posted_by_id', 'name': 'posted_by__name', 'profile_pic': 'posted_by__profile_pic',
+    **{field: field for field in COUNTER_FIELDS},
+}
+
+
+def is_fan_out_enabled():
+    return getattr(settings, 'GROUP_FEED_FAN_OUT', False)
+
+
+def get_feed_entry(post, author):
+    return GroupFeedEntry(post=post, group_id=post.group_id, posted_at=post.posted_at, posted_by=author,
+                          author_name=author.name, author_profile_pic=author.profile_pic, content=post.content)
+
+
+def append_to_group_feed(post, author):
+    if is_fan_out_enabled():
+        get_feed_entry(post, author).save(force_insert=True)
+
+
+def refresh_feed_author(user):
+    """
+    Copies a user's new name and picture into the feed entries of their posts
+    """
+    if is_fan_out_enabled():
+        GroupFeedEntry.objects.filter(posted_by_id=user.user_id) \
+            .update(author_name=user.name, author_profile_pic=user.profile_pic)
+
+
+def backfill_group_feed(batch_size=FEED_BACKFILL_BATCH_SIZE):
+    """
+    :returns: number of feed entries written for posts that had none
+    """
+    posts = Post.objects.filter(feed_entry__isnull=True).order_by('post_id').values_list(
+        'post_id', 'group_id', 'posted_at', 'posted_by_id', 'posted_by__name', 'posted_by__profile_pic', 'content')
+    created = 0
+    batch = []
+    for post_id, group_id, posted_at, user_id, name, profile_pic, content in posts.iterator(chunk_size=batch_size):
+        batch.append(GroupFeedEntry(post_id=post_id, group_id=group_id, posted_at=posted_at, posted_by_id=user_id,
+                                    author_name=name, author_profile_pic=profile_pic, content=content))
+        if len(batch) == batch_size:
+            created += len(GroupFeedEntry.objects.bulk_create(batch, ignore_conflicts=True))
+            batch = []
+    if batch:
+        created += len(GroupFeedEntry.objects.bulk_create(batch, ignore_conflicts=True))
+    return created
+
+
+def get_group_feed_rows(group_id, limit, after=None):
+    """
+    :returns: up to limit rows of {column: value} in feed order, from the feed table when fan-out is on
+    """
+    if is_fan_out_enabled():
+        queryset, lookups = GroupFeedEntry.objects.filter(group_id=group_id), ENTRY_LOOKUPS
+    else:
+        queryset, lookups = Post.objects.filter(group_id=group_id), POST_LOOKUPS
+    queryset = queryset.order_by(*GROUP_FEED_ORDERING)
+    if after is not None:
+        queryset = queryset.filter(keyset_filter(GROUP_FEED_ORDERING,
+                                                 decode_cursor(after, len(GROUP_FEED_ORDERING)), forward=True))
+    columns = list(lookups)
+    return [dict(zip(columns, row)) for row in queryset.values_list(*lookups.values())[:limit]]
+
+
+def get_feed_item(row):
+    """
+    :returns: {
+        "post_id": 1,
+        "posted_by": {"user_id": 1, "name": "iB Cricket", "profile_pic": "https://dummy.url.com/pic.png"},
+        "posted_at": "2019-05-21 20:21:46",
+        "post_content": "Write Something here...",
+        "reactions": {"count": 10, "type": ["WOW", "HAHA"]},
+        "comments_count": 3
+    }
+    """
+    return {
+        "post_id": row['post_id'],
+        "posted_by": serialize_user(row['user_id'], row['name'], row['profile_pic']),
+        "posted_at": format_datetime(row['posted_at']),
+        "post_content": row['content'],
+        "reactions": serialize_reaction_summary([row[column] for column in REACTION_SUMMARY_COLUMNS]),
+        "comments_count": row['comments_count'],
+    }
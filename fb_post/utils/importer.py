@@ -0,0 +1,174 @@
+"""
+Bulk import of users, groups, memberships, posts, comments and reactions, for the import_fb_post command.
+
+Records carry their own ids, which may be any string or number, and refer to each other by those ids:
+    {"type": "user", "id": "u1", "name": "Ana", "profile_pic": "https://..."}
+    {"type": "group", "id": "g1", "name": "Cricket"}
+    {"type": "membership", "group": "g1", "member": "u1", "is_admin": true}
+    {"type": "post", "id": "p1", "posted_by": "u1", "group": "g1", "posted_at": "2024-01-01T09:00:00",
+     "content": "..."}
+    {"type": "comment", "id": "c1", "commented_by": "u1", "post": "p1", "reply": null, "commented_at": "...",
+     "content": "..."}
+    {"type": "reaction", "reacted_by": "u1", "post": "p1", "comment": null, "reaction": "WOW", "reacted_at": "..."}
+A record may only refer to records that come before it. Replies set "reply" instead of "post".
+
+Records are buffered per type and written with bulk_create, batch_size at a time, one transaction per batch,
+after the buffered rows of the types they refer to. Primary keys are assigned here, counting up from the
+largest one in each table, so nothing else may write to these tables during an import; the pks given to
+record ids are kept in memory, one {record id: pk} dict per type, to fill in the foreign keys of later
+records without waiting for their batch to be written. bulk_create sends no post_save signal, so the work
+the signal receivers and write tasks do per row is done once by finish_import(): sequences are moved past
+the imported pks, counters recomputed, group feed entries backfilled and cached responses invalidated.
+"""
+import json
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from fb_post.cache import invalidate_models
+from fb_post.encoders import orjson
+from fb_post.models import User, Group, Membership, Post, Comment, React
+from fb_post.utils.counters import rebuild_counters
+from fb_post.utils.feed import backfill_group_feed, is_fan_out_enabled
+
+IMPORT_BATCH_SIZE = 5000
+
+# record type: (model, value fields, {foreign key: record type referred to}), in the order they depend on each other
+RECORD_TYPES = {
+    'user': (User, ('name', 'profile_pic'), {}),
+    'group': (Group, ('name',), {}),
+    'membership': (Membership, ('is_admin',), {'group': 'group', 'member': 'user'}),
+    'post': (Post, ('posted_at', 'content'), {'posted_by': 'user', 'group': 'group'}),
+    'comment': (Comment, ('commented_at', 'content'), {'commented_by': 'user', 'post': 'post', 'reply': 'comment'}),
+    'reaction': (React, ('reaction', 'reacted_at'), {'reacted_by': 'user', 'post': 'post', 'comment': 'comment'}),
+}
+DATETIME_FIELDS = {'posted_at', 'commented_at', 'reacted_at'}
+
+loads = orjson.loads if orjson is not None else json.loads
+
+
+class ImportRecordError(ValueError):
+    pass
+
+
+def parse_ndjson(lines):
+    """
+    :returns: iterator of (record type, record) of the non-blank lines
+    """
+    for line in lines:
+        if line.strip():
+            record = loads(line)
+            if not isinstance(record, dict):
+                raise ImportRecordError(f"Expected a JSON object, got {line.strip()[:100]}")
+            yield record.pop('type', None), record
+
+
+def parse_csv(rows, record_type):
+    """
+    :param rows: csv.DictReader rows, a blank reference cell is null
+    """
+    for row in rows:
+        yield record_type, row
+
+
+def parse_value(field, value):
+    if value is None:
+        return None
+    if field in DATETIME_FIELDS and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if field == 'is_admin' and isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return value
+
+
+class BulkImporter:
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.ids = {record_type: {} for record_type in RECORD_TYPES}
+        self.pending = {record_type: [] for record_type in RECORD_TYPES}
+        self.imported = dict.fromkeys(RECORD_TYPES, 0)
+        self.next_pks = {
+            record_type: (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+            for record_type, (model, _, _) in RECORD_TYPES.items()
+        }
+
+    def add(self, record_type, record):
+        if record_type not in RECORD_TYPES:
+            raise ImportRecordError(f"Unknown record type {record_type}, expected one of {', '.join(RECORD_TYPES)}")
+        model, fields, references = RECORD_TYPES[record_type]
+        values = {field: parse_value(field, record.get(field)) for field in fields}
+        for field, referenced_type in references.items():
+            source_id = record.get(field)
+            if source_id is None or source_id == '':
+                values[f'{field}_id'] = None
+                continue
+            try:
+                values[f'{field}_id'] = self.ids[referenced_type][str(source_id)]
+            except KeyError:
+                raise ImportRecordError(f"{record_type} refers to {referenced_type} {source_id}, which has not been "
+                                        f"imported before it")
+
+        pk = self.next_pks[record_type]
+        self.next_pks[record_type] += 1
+        if record.get('id') is not None:
+            self.ids[record_type][str(record['id'])] = pk
+        self.pending[record_type].append(model(pk=pk, **values))
+        if len(self.pending[record_type]) >= self.batch_size:
+            self.flush(record_type)
+
+    def flush(self, record_type):
+        """
+        Writes the buffered rows of the type, after those of the types they refer to
+        """
+        pending = self.pending[record_type]
+        if not pending:
+            return
+        model, _, references = RECORD_TYPES[record_type]
+        for referenced_type in set(references.values()) - {record_type}:
+            self.flush(referenced_type)
+        with transaction.atomic():
+            model.objects.bulk_create(pending)
+        self.imported[record_type] += len(pending)
+        self.pending[record_type] = []
+
+    def flush_all(self):
+        for record_type in RECORD_TYPES:
+            self.flush(record_type)
+
+
+@contextmanager
+def deferred_indexes(models):
+    """
+    Drops the Meta.indexes of the models and creates them again on exit, so rows are inserted without
+    maintaining them. Foreign key indexes and unique constraints are kept.
+    """
+    indexes = [(model, index) for model in models for index in model._meta.indexes]
+    with connection.schema_editor() as editor:
+        for model, index in indexes:
+            editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.add_index(model, index)
+
+
+def finish_import(rebuild=True):
+    """
+    Does once for the imported rows what the write tasks and signal receivers do for every row they write
+    """
+    models = [model for model, _, _ in RECORD_TYPES.values()]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+    if rebuild:
+        with transaction.atomic():
+            rebuild_counters(Post, Comment, React)
+    if is_fan_out_enabled():
+        backfill_group_feed()
+    invalidate_models(*models)
@@ -0,0 +1,56 @@
+from collections import defaultdict
+
+from fb_post.models import Comment
+from fb_post.utils.serializers import COMMENT_COLUMNS, REACTION_SUMMARY_COLUMNS, get_comment_rows, \
+    serialize_comment, serialize_post, serialize_reaction_summary
+
+# SQLite refuses statements with more than 999 bound parameters on older builds
+IN_QUERY_BATCH_SIZE = 500
+
+
+def chunked(keys, size=IN_QUERY_BATCH_SIZE):
+    keys = list(keys)
+    for start in range(0, len(keys), size):
+        yield keys[start:start + size]
+
+
+def build_post_trees(post_rows):
+    """
+    Returns the nested post dicts documented on get_post for every row of get_post_rows.
+
+    Comments and replies of all the given posts are loaded with two queries per
+    IN_QUERY_BATCH_SIZE posts or comments, however many comments there are, each a
+    values_list() projection with the commenter and the reaction counters, so no model
+    instance is built and no React row is read.
+    """
+    post_ids = [row[0] for row in post_rows]
+
+    comments = [row for batch in chunked(post_ids) for row in get_comment_rows(
+        Comment.objects.filter(post_id__in=batch).order_by('comment_id'), 'post_id', *REACTION_SUMMARY_COLUMNS)]
+    comment_ids = [row[0] for row in comments]
+    replies = [row for batch in chunked(comment_ids) for row in get_comment_rows(
+        Comment.objects.filter(reply_id__in=batch).order_by('comment_id'), 'reply_id', *REACTION_SUMMARY_COLUMNS)]
+
+    parent = len(COMMENT_COLUMNS)
+    counts = parent + 1
+    replies_by_comment = defaultdict(list)
+    for row in replies:
+        reply_obj = serialize_comment(row)
+        reply_obj["reactions"] = serialize_reaction_summary(row[counts:])
+        replies_by_comment[row[parent]].append(reply_obj)
+
+    comments_by_post = defaultdict(list)
+    for row in comments:
+        comment_obj = serialize_comment(row)
+        comment_obj["reactions"] = serialize_reaction_summary(row[counts:])
+        comment_obj["replies_count"] = len(replies_by_comment[row[0]])
+        comment_obj["replies"] = replies_by_comment[row[0]]
+        comments_by_post[row[parent]].append(comment_obj)
+
+    all_posts = []
+    for row in post_rows:
+        post_obj = serialize_post(row)
+        post_obj["comments"] = comments_by_post[row[0]]
+        post_obj["comments_count"] = len(comments_by_post[row[0]])
+        all_posts.append(post_obj)
+    return all_posts
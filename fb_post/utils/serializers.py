@@ -0,0 +1,86 @@
+"""
+Dicts returned by the read tasks, built from values_list() rows instead of model instances.
+
+Every function here takes the columns it needs as a tuple, with the author (and group) joined in by the
+same SQL statement, so serializing a page of posts instantiates no model and triggers no lazy foreign key
+load. Rows are selected with the *_COLUMNS tuples below, in that order. Reaction summaries are read from the
+counter columns kept by fb_post.utils.counters, not from the React table.
+"""
+from functools import lru_cache
+
+from fb_post.models import REACTION_COUNT_FIELDS
+
+USER_COLUMNS = ('user_id', 'name', 'profile_pic')
+POST_COLUMNS = ('post_id', 'posted_by_id', 'posted_by__name', 'posted_by__profile_pic', 'posted_at', 'content')
+POST_GROUP_COLUMNS = POST_COLUMNS + ('group_id', 'group__name')
+COMMENT_COLUMNS = ('comment_id', 'commented_by_id', 'commented_by__name', 'commented_by__profile_pic',
+                   'commented_at', 'content')
+REACTION_COLUMNS = ('reacted_by_id', 'reacted_by__name', 'reacted_by__profile_pic', 'reaction')
+REACTION_SUMMARY_COLUMNS = ('reactions_count', *REACTION_COUNT_FIELDS.values())
+
+
+@lru_cache(maxsize=4096)
+def format_datetime(value):
+    """
+    :returns: "2019-05-21 20:21:46", as strftime("%Y-%m-%d %H:%M:%S") would; rows of one page often share a
+        timestamp, and isoformat() is a third of strftime's cost when they do not
+    """
+    return value.isoformat(' ', 'seconds')[:19]
+
+
+def serialize_user(user_id, name, profile_pic):
+    return {"user_id": user_id, "name": name, "profile_pic": profile_pic}
+
+
+def get_post_columns(include_group=True):
+    return (POST_GROUP_COLUMNS if include_group else POST_COLUMNS) + REACTION_SUMMARY_COLUMNS
+
+
+def get_post_rows(posts, include_group=True):
+    """
+    :returns: POST_GROUP_COLUMNS (or POST_COLUMNS) followed by REACTION_SUMMARY_COLUMNS, for every post in the
+        queryset
+    """
+    return list(posts.values_list(*get_post_columns(include_group)))
+
+
+def serialize_post(row):
+    post = {"post_id": row[0]}
+    if len(row) == len(get_post_columns()):
+        post["group"] = {"group_id": row[6], "name": row[7]}
+    post["posted_by"] = serialize_user(row[1], row[2], row[3])
+    post["posted_at"] = format_datetime(row[4])
+    post["post_content"] = row[5]
+    post["reactions"] = serialize_reaction_summary(row[-len(REACTION_SUMMARY_COLUMNS):])
+    return post
+
+
+def serialize_reaction_summary(counts):
+    """
+    :param counts: values of REACTION_SUMMARY_COLUMNS
+    :returns: {"count": 3, "type": ["WOW", "HAHA"]}, types in REACTION_COUNT_FIELDS order
+    """
+    return {"count": counts[0],
+            "type": [reaction for reaction, count in zip(REACTION_COUNT_FIELDS, counts[1:]) if count]}
+
+
+def get_comment_rows(comments, *extra_columns):
+    """
+    :returns: COMMENT_COLUMNS tuples followed by extra_columns, e.g. the post_id or reply_id to group them by
+    """
+    return list(comments.values_list(*COMMENT_COLUMNS, *extra_columns))
+
+
+def serialize_comment(row):
+    return {
+        "comment_id": row[0],
+        "commenter": serialize_user(row[1], row[2], row[3]),
+        "commented_at": format_datetime(row[4]),
+        "comment_content": row[5],
+    }
+
+
+def serialize_reaction(row):
+    reaction = serialize_user(row[0], row[1], row[2])
+    reaction["reaction"] = row[3]
+    return reaction
@@ -0,0 +1,101 @@
+"""
+Synthetic users, groups, memberships, posts, comments and reactions, as import_fb_post records.
+
+Every group gets members_per_group random members, and every post a random poster among the members of
+its group. Comments per post and replies per comment follow geometric distributions with the given means,
+replies nesting up to reply_depth levels. Reactions per post and per comment follow power laws: a Pareto
+distribution of shape reaction_alpha (comment_reaction_alpha for comments), less one, so most posts get a
+few reactions and a few posts get thousands; the smaller the shape, the heavier the tail. Reactors are
+distinct users, so there are never more reactions on a post or comment than users.
+
+Records are generated in the order import_fb_post needs them, users, groups and memberships first and then
+every post followed by its comments, replies and reactions, and the same seed generates the same records.
+"""
+import math
+import random
+from datetime import timedelta
+
+from fb_post.constants.enum import ReactionType
+
+WORDS = ("cricket match today lorem ipsum dolor sit amet great photo weekend trip coffee code review release "
+         "party birthday congrats thanks everyone meeting tomorrow news update question answer").split()
+REACTIONS = [reaction.value for reaction in ReactionType]
+
+
+class SyntheticData:
+
+    def __init__(self, end, users=1000, groups=10, members_per_group=200, posts=10000, comments_per_post=3.0,
+                 replies_per_comment=0.5, reply_depth=1, reaction_alpha=1.2, comment_reaction_alpha=2.0,
+                 days=365, seed=None):
+        """
+        :param end: datetime of the newest post, posts are spread over the days before it
+        :param comments_per_post: mean number of comments per post
+        :param replies_per_comment: mean number of replies per comment or reply less than reply_depth deep
+        :param reaction_alpha: Pareto shape of the reactions per post, above 1 for a finite mean
+        """
+        self.end = end
+        self.users = users
+        self.groups = groups
+        self.members_per_group = min(members_per_group, users)
+        self.posts = posts
+        self.comments_per_post = comments_per_post
+        self.replies_per_comment = replies_per_comment
+        self.reply_depth = reply_depth
+        self.reaction_alpha = reaction_alpha
+        self.comment_reaction_alpha = comment_reaction_alpha
+        self.span = timedelta(days=days)
+        self.random = random.Random(seed)
+        self.next_comment_id = 1
+
+    def __iter__(self):
+        """
+        :returns: iterator of record dicts, each with its "type"
+        """
+        rng = self.random
+        for user_id in range(1, self.users + 1):
+            yield {"type": "user", "id": user_id, "name": f"user {user_id}",
+                   "profile_pic": f"https://pics.example/{user_id}.png"}
+
+        group_members = {}
+        for group_id in range(1, self.groups + 1):
+            yield {"type": "group", "id": group_id, "name": f"group {group_id}"}
+        for group_id in range(1, self.groups + 1):
+            group_members[group_id] = rng.sample(range(1, self.users + 1), self.members_per_group)
+            for index, member_id in enumerate(group_members[group_id]):
+                yield {"type": "membership", "group": group_id, "member": member_id, "is_admin": index == 0}
+
+        for post_id in range(1, self.posts + 1):
+            # oldest first, so that post ids and posting times increase together
+            posted_at = self.end - self.span * (1 - post_id / self.posts)
+            group_id = rng.randint(1, self.groups)
+            yield {"type": "post", "id": post_id, "posted_by": rng.choice(group_members[group_id]),
+                   "group": group_id, "posted_at": posted_at.isoformat(), "content": self.get_content()}
+            yield from self.get_reactions(self.reaction_alpha, posted_at, post=post_id)
+            for _ in range(self.get_count(self.comments_per_post)):
+                yield from self.get_comment(posted_at, 1, post=post_id)
+
+    def get_comment(self, after, depth, post=None, reply=None):
+        comment_id = self.next_comment_id
+        self.next_comment_id += 1
+        commented_at = after + timedelta(seconds=self.random.randint(1, 86400))
+        yield {"type": "comment", "id": comment_id, "commented_by": self.random.randint(1, self.users),
+               "post": post, "reply": reply, "commented_at": commented_at.isoformat(),
+               "content": self.get_content()}
+        yield from self.get_reactions(self.comment_reaction_alpha, commented_at, comment=comment_id)
+        if depth <= self.reply_depth:
+            for _ in range(self.get_count(self.replies_per_comment)):
+                yield from self.get_comment(commented_at, depth + 1, reply=comment_id)
+
+    def get_reactions(self, alpha, after, post=None, comment=None):
+        count = min(int(self.random.paretovariate(alpha)) - 1, self.users)
+        for reacted_by in self.random.sample(range(1, self.users + 1), count):
+            reacted_at = after + timedelta(seconds=self.random.randint(1, 86400))
+            yield {"type": "reaction", "reacted_by": reacted_by, "post": post, "comment": comment,
+                   "reaction": self.random.choice(REACTIONS), "reacted_at": reacted_at.isoformat()}
+
+    def get_count(self, mean):
+        # an exponential variate with this rate rounded down is geometric with the given mean
+        return int(self.random.expovariate(math.log1p(1 / mean))) if mean > 0 else 0
+
+    def get_content(self):
+        return " ".join(self.random.choices(WORDS, k=self.random.randint(3, 30)))
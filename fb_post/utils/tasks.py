@@ -1,9 +1,18 @@
-from django.db.models import Q, Count, F
-from fb_post.models import User, Post, Comment, React
+from django.db.models import Q, Count, Exists, F
+from django.db import transaction
+from fb_post.models import User, Post, Comment, React, REACTION_COUNT_FIELDS
 from fb_post.utils.exceptions import InvalidUserException, InvalidCommentException, \
     InvalidPostException, InvalidCommentContent, InvalidReplyContent, InvalidReactionTypeException, \
     UserCannotDeletePostException
 from fb_post.constants.enum import ReactionType
+from fb_post.utils.post_tree import build_post_trees
+from fb_post.utils.serializers import get_comment_rows, get_post_rows, serialize_comment, serialize_reaction, \
+    REACTION_COLUMNS
+from fb_post.utils.counters import reaction_changed
+from fb_post.utils.feed import append_to_group_feed
+from fb_post.cache import invalidate_models
+from fb_post.pubsub import publish_comment_added, publish_post_added, publish_reactions_changed
+from fb_post.routers import reads_from_replica
 from datetime import datetime
 
 
@@ -15,10 +24,12 @@ def create_post(user_id, post_content,group_id):
         raise InvalidPostException("Post is empty")
     try:
         user = User.objects.get(user_id=user_id)
-        post = Post.objects.create(posted_by=user, content=post_content,
-                                   posted_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                   ,group_id=group_id)
-        post.save()
+        with transaction.atomic():
+            post = Post.objects.create(posted_by=user, content=post_content,
+                                       posted_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                                       ,group_id=group_id)
+            append_to_group_feed(post, user)
+            publish_post_added(post)
 
         return post
 
@@ -38,13 +49,13 @@ def create_comment(user_id, post_id, comment_content):
     try:
         user = User.objects.get(user_id=user_id)
         post = Post.objects.get(post_id=post_id)
-        post.save()
-        comment = Comment.objects.create(content=comment_content,
-                                         commented_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                         commented_by=user,
-                                         post=post)
-
-        comment.save()
+        with transaction.atomic():
+            comment = Comment.objects.create(content=comment_content,
+                                             commented_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                             commented_by=user,
+                                             post=post)
+            Post.objects.filter(pk=post.pk).update(comments_count=F('comments_count') + 1)
+            publish_comment_added(comment)
 
         return comment
 
@@ -65,9 +76,10 @@ def reply_to_comment(user_id, comment_id, reply_content):
     try:
         user = User.objects.get(user_id=user_id)
         comment = Comment.objects.get(comment_id=comment_id)
-        reply = Comment.objects.create(commented_by=user, content=reply_content, reply=comment,
-                                       commented_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        reply.save()
+        with transaction.atomic():
+            reply = Comment.objects.create(commented_by=user, content=reply_content, reply=comment,
+                                           commented_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            Comment.objects.filter(pk=comment.pk).update(replies_count=F('replies_count') + 1)
 
         return reply.comment_id
 
@@ -82,35 +94,25 @@ def reply_to_comment(user_id, comment_id, reply_content):
 
 def react_to_post(user_id, post_id, reaction_type):
     """
+    Sets the user's reaction on the post, replacing any earlier one.
     """
     if reaction_type not in [ReactionType.WOW.value, ReactionType.HA.value, ReactionType.UP.value,
                              ReactionType.ANGRY.value,
                              ReactionType.LIT.value, ReactionType.DOWN.value, ReactionType.SAD.value,
                              ReactionType.LOVE.value]:
         raise InvalidReactionTypeException("Reaction Type is not defined")
-    try:
-        user = User.objects.get(user_id=user_id)
-        if not user:
-            raise InvalidUserException
-        post = Post.objects.get(post_id=post_id)
-        if not post:
-            raise InvalidPostException
-        reacted_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        already_reacted = React.objects.filter(reacted_by=user_id, post=post)
-        if already_reacted:
-            already_reacted.delete()
-        react = React.objects.create(reacted_at=reacted_time, reacted_by=user, post=post, reaction=reaction_type)
-        react.save()
-
-    except Post.DoesNotExist:
-        raise InvalidPostException("Post id is not defined")
-
-    except User.DoesNotExist:
-        raise InvalidUserException("User id is not defined")
+    with transaction.atomic():
+        previous = get_locked_reaction(Post, 'post', post_id, user_id, InvalidPostException("Post id is not defined"))
+        upsert_reaction(React(post_id=post_id, reacted_by_id=user_id, reaction=reaction_type,
+                              reacted_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")), 'post')
+        reaction_changed(Post, post_id, previous, reaction_type)
+        publish_reactions_changed([post_id])
 
 
 def react_to_comment(user_id, comment_id, reaction_type):
     """
+    Toggles the user's reaction on the comment: reacting again with the same type removes it,
+    any other type replaces the earlier one.
     """
     if reaction_type not in [ReactionType.WOW.value, ReactionType.HA.value, ReactionType.UP.value,
                              ReactionType.ANGRY.value,
@@ -118,23 +120,43 @@ def react_to_comment(user_id, comment_id, reaction_type):
                              ReactionType.LOVE.value]:
         raise InvalidReactionTypeException("Reaction Type is not defined")
 
-    try:
-        user = User.objects.get(user_id=user_id)
-        comment = Comment.objects.get(comment_id=comment_id)
+    with transaction.atomic():
+        previous = get_locked_reaction(Comment, 'comment', comment_id, user_id,
+                                       InvalidCommentException("Comment id is not defined"))
+        if previous == reaction_type:
+            # uncount_deleted_reaction takes it out of the comment's counters
+            React.objects.filter(comment_id=comment_id, reacted_by_id=user_id).delete()
+            return
+        upsert_reaction(React(comment_id=comment_id, reacted_by_id=user_id, reaction=reaction_type,
+                              reacted_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")), 'comment')
+        reaction_changed(Comment, comment_id, previous, reaction_type)
 
-        reaction_exists = React.objects.get(comment=comment, reacted_by=user)
-        if reaction_exists.reaction == reaction_type:
-            reaction_exists.delete()
-        elif reaction_exists.reaction != reaction_type:
-            reaction_exists.reaction = reaction_type
-            reaction_exists.reacted_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            reaction_exists.save()
-        else:
-            React.objects.create(reaction=reaction_type, comment=comment, reacted_by=user,
-                                 reacted_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
-    except User.DoesNotExist:
+def get_locked_reaction(model, target, pk, user_id, missing_target):
+    """
+    Locks the post or comment with SELECT ... FOR UPDATE, checking in the same statement that the user exists,
+    and only then reads the user's reaction on it. Reactions to one post or comment are counted one after the
+    other, and the second of two concurrent ones sees the reaction the first committed. The user is checked
+    here because the foreign key is only checked at the outermost commit, which a caller's transaction
+    would delay past this task.
+
+    :returns: the user's reaction type on it, None when they have not reacted
+    """
+    user_exists = model.objects.select_for_update().filter(pk=pk) \
+        .annotate(user_exists=Exists(User.objects.filter(pk=user_id))).values_list('user_exists', flat=True)
+    user_exists = list(user_exists)
+    if not user_exists:
+        raise missing_target
+    if not user_exists[0]:
         raise InvalidUserException("User id is not defined")
+    return React.objects.filter(**{target: pk, 'reacted_by_id': user_id}).values_list('reaction', flat=True).first()
+
+
+def upsert_reaction(react, target):
+    React.objects.bulk_create([react], update_conflicts=True, unique_fields=[target, 'reacted_by'],
+                              update_fields=['reaction', 'reacted_at'])
+    # bulk_create sends no post_save
+    invalidate_models(React)
 
 
 def get_total_reaction_count():
@@ -145,27 +167,28 @@ def get_total_reaction_count():
 def get_reaction_metrics(post_id):
     """Return total count for each reaction type"""
     try:
-        post = Post.objects.get(post_id=post_id)
-        love = Q(reaction=ReactionType.LOVE.value)
-        lit = Q(reaction=ReactionType.LIT.value)
-        up = Q(reaction=ReactionType.UP.value)
-        down = Q(reaction=ReactionType.DOWN.value)
-        wow = Q(reaction=ReactionType.WOW.value)
-        sad = Q(reaction=ReactionType.SAD.value)
-        angry = Q(reaction=ReactionType.ANGRY.value)
-        post = Q(post=post)
-
-        metrics = {"LOVE": React.objects.filter(post & love).count(),
-             "LIT": React.objects.filter(post & lit).count(),
-             "UP": React.objects.filter(post & up).count(),
-             "DOWN": React.objects.filter(post & down).count(),
-             "WOW": React.objects.filter(post & wow).count(),
-             "SAD": React.objects.filter(post & sad).count(),
-             "ANGRY": React.objects.filter(post & angry).count()}
-
-        return metrics
-    except Post.DoesNotExist:
-        raise InvalidPostException("post id is defined")
+        post_id = int(post_id)
+    except (TypeError, ValueError):
+        raise InvalidPostException("Post id is not defined")
+    metrics = get_reaction_metrics_bulk([post_id])
+    if post_id not in metrics:
+        raise InvalidPostException("Post id is not defined")
+    return metrics[post_id]
+
+
+def get_reaction_metrics_bulk(post_ids):
+    """
+    Reads the count of every reaction type of every post from its counter columns, one query by primary key.
+
+    :returns: {
+        1: {"WOW": 0, "LIT": 2, "LOVE": 1, "HA": 0, "UP": 0, "DOWN": 0, "ANGRY": 0, "SAD": 0},
+        ...
+    }
+    Posts that do not exist are left out.
+    """
+    metrics = {reaction_type.name: F(REACTION_COUNT_FIELDS[reaction_type.value]) for reaction_type in ReactionType}
+    rows = Post.objects.filter(post_id__in=post_ids).order_by().values('post_id', **metrics)
+    return {row.pop('post_id'): row for row in rows}
 
 
 def delete_post(user_id, post_id):
@@ -177,6 +200,7 @@ def delete_post(user_id, post_id):
         post = Post.objects.get(pk=post_id)
 
         if post.posted_by == user:
+            # Comments, replies and reactions cascade with the post, so no other row holds counts of them
             post.delete()
             print(f"post No {post_id} deleted and comments and reactions to it also deleted")
         else:
@@ -222,6 +246,7 @@ def get_posts_reacted_by_user(user_id):
         raise InvalidUserException
 
 
+@reads_from_replica
 def get_reactions_to_post(post_id):
     """
     :returns: [
@@ -229,22 +254,10 @@ def get_reactions_to_post(post_id):
         ...
     ]
     """
-    try:
-        post = Post.objects.get(post_id=post_id)
-        reactions = React.objects.filter(post=post).select_related('post__posted_by')
-
-        react_list = []
-
-        for r in reactions:
-            react_dict = {}
-            react_dict.update(r.reacted_by.get_user_dict())
-            react_dict['reaction'] = r.reaction
-            react_list.append(react_dict)
-
-        return react_list
-
-    except (Post.DoesNotExist, Post.MultipleObjectsReturned):
+    if not Post.objects.filter(post_id=post_id).exists():
         raise InvalidPostException
+    reactions = React.objects.filter(post_id=post_id).values_list(*REACTION_COLUMNS)
+    return [serialize_reaction(row) for row in reactions]
 
 
 # Exceptions not working properly
@@ -299,51 +312,12 @@ def get_reactions_to_post(post_id):
     """
 
 
+@reads_from_replica
 def get_post(post_id):
-    try:
-
-        post = Post.objects.get(pk=post_id)
-        reactions = React.objects.filter(post=post).select_related('post','reacted_by','comment')
-        comments = Comment.objects.filter(post=post).select_related('commented_by')
-        reacted_to_comment = React.objects.filter(comment__in=comments).select_related('comment')
-        all_comments = []
-        post_obj = {}
-        post_obj.update(post.get_post_dict())
-        all_types = []
-        for react in reactions:
-            if react.reaction not in all_types:
-                all_types.append(react.reaction)
-        post_obj.update({"reactions": {"count": reactions.count(), "type": all_types}})
-        del post_obj['group']
-        for comment in comments:
-            comment_obj = {}
-            comment_obj.update(comment.get_comment_dict())
-            reaction_type = []
-
-            for react in reacted_to_comment:
-                if react.reaction not in reaction_type:
-                    reaction_type.append(react.reaction)
-            comment_obj.update({"reactions": {"count": reacted_to_comment.count(), "type": reaction_type}})
-            replies = Comment.objects.filter(reply=comment)
-            reaction_to_reply = React.objects.filter(comment__in=replies)
-            reply_comments = []
-            reply_reaction_type = []
-            for y in replies:
-                y = y.get_comment_dict()
-                y.update({"reactions": {"count": reaction_to_reply.count(), "type": reply_reaction_type}})
-                reply_comments.append(y)
-            comment_obj.update({"replies": reply_comments})
-
-            for react in reaction_to_reply:
-                if react.reaction not in reply_reaction_type:
-                    reply_reaction_type.append(react.reaction)
-
-            all_comments.append(comment_obj)
-
-        post_obj.update({"comments": all_comments})
-        return post_obj
-    except Post.DoesNotExist:
+    rows = get_post_rows(Post.objects.filter(pk=post_id), include_group=False)
+    if not rows:
         raise InvalidPostException("post id doesn't exist")
+    return build_post_trees(rows)[0]
 
 
 def get_user_posts(user_id):
@@ -367,14 +341,6 @@ def get_replies_for_comment(comment_id):
         "comment_content": "Thanks...",
     }]
     """
-    replies = []
-    try:
-
-        comment = Comment.objects.get(pk=comment_id)
-        reply = Comment.objects.filter(reply=comment)
-        for y in reply:
-            replies.append(y.get_comment_dict())
-        return replies
-
-    except Comment.DoesNotExist:
+    if not Comment.objects.filter(pk=comment_id).exists():
         raise InvalidCommentException("Comment is not created")
+    return [serialize_comment(row) for row in get_comment_rows(Comment.objects.filter(reply_id=comment_id))]
@@ -1,3 +1,392 @@
-from django.shortcuts import render
+import asyncio
+import hmac
+from inspect import isawaitable
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed, \
+    HttpResponseNotFound, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import ensure_csrf_cookie
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, validate
+
+from fb_post.async_execution import AsyncDatabaseMiddleware, database_sync_to_async
+from fb_post.cache import get_response_cache_key, get_cached_response, set_cached_response
+from fb_post.complexity import get_query_cost_rule
+from fb_post.encoders import get_json_encoder, should_stream
+from fb_post.instrumentation import render_metrics
+from fb_post.loaders import Loaders, AsyncLoaders
+from fb_post.persisted_queries import resolve_query, get_document_read_models, get_validated_document
+from fb_post.routers import read_replica
+from fb_post.sqlite import serialized_writes
+from fb_post.utils.export import CSV_COLUMNS, PostExport
+
+
+class BatchedGraphQLView(GraphQLView):
+    """
+    Attaches a fresh set of DataLoaders to every request so nested resolvers
+    share one IN (...) query per level instead of one query per parent row,
+    serves repeated read-only operations from the response cache and rejects
+    documents over the cost budget before they execute. Queries read from the
+    replica database when one is configured, see fb_post.routers, and on SQLite
+    mutations are queued behind each other, see fb_post.sqlite.
+
+    Documents may be sent as persisted query hashes and are parsed and
+    validated once per distinct query text, see fb_post.persisted_queries.
+    Subscriptions are served over WebSocket, see fb_post.subscriptions.
+    Responses are encoded by fb_post.encoders, and streamed in chunks when
+    they hold many list items.
+    """
+
+    @method_decorator(ensure_csrf_cookie)
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(HttpResponseNotAllowed(["GET", "POST"], "GraphQL only supports GET and POST requests."))
+
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return super().dispatch(request, *args, **kwargs)
+            if self.batch:
+                responses = [self.get_response_data(request, entry) for entry in data]
+                return self.render_json(request, [response[0] for response in responses],
+                                        max((response[1] for response in responses), default=200))
+            return self.render_json(request, *self.get_response_data(request, data))
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    def get_response_data(self, request, data):
+        """
+        :returns: (response dict, status code)
+        """
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = self.execute_graphql_request(request, data, query, variables, operation_name)
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True or execution_result.errors:
+            set_rollback()
+        return self.get_result_data(request, execution_result, id)
+
+    def get_result_data(self, request, execution_result, id):
+        status_code = 200
+        response = {}
+        if execution_result.errors:
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+        if execution_result.errors and any(not getattr(e, "path", None) for e in execution_result.errors):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+        extensions = getattr(request, 'graphql_extensions', None)
+        if extensions:
+            response["extensions"] = extensions
+        return response, status_code
+
+    def render_json(self, request, payload, status_code):
+        encoder = get_json_encoder()
+        if self.pretty or request.GET.get("pretty"):
+            content = encoder.dumps(payload, pretty=True)
+        elif should_stream(payload):
+            return StreamingHttpResponse(self.get_streaming_content(encoder.iter_encode(payload)),
+                                         status=status_code, content_type="application/json")
+        else:
+            content = encoder.dumps(payload)
+        return HttpResponse(status=status_code, content=content, content_type="application/json")
+
+    @staticmethod
+    def get_streaming_content(chunks):
+        return chunks
+
+    def get_context(self, request):
+        context = super().get_context(request)
+        context.loaders = Loaders()
+        return context
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        document, operation_ast, query_hash, result = self.get_document(request, data, query, operation_name,
+                                                                        show_graphiql)
+        if document is None:
+            return result
+
+        cache_key, result = self.get_cached_result(request, document, operation_ast, query_hash, operation_name,
+                                                   variables)
+        if result is not None:
+            return result
+
+        cost_errors = self.validate_cost(request, document, variables)
+        if cost_errors:
+            return ExecutionResult(data=None, errors=cost_errors)
+
+        result = self.execute_document(request, document, operation_ast, variables, operation_name)
+        self.cache_result(request, cache_key, result)
+        return result
+
+    def get_document(self, request, data, query, operation_name, show_graphiql=False):
+        """
+        :returns: (document, operation, query hash, None) or, when the request ends here, (None, None, None, result)
+        """
+        try:
+            query, query_hash = resolve_query(query, self.get_extensions(request, data))
+        except GraphQLError as error:
+            return None, None, None, ExecutionResult(errors=[error])
+        if not query:
+            if show_graphiql:
+                return None, None, None, None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        document, validation_errors = get_validated_document(self.schema.graphql_schema, query, query_hash)
+        if validation_errors:
+            return None, None, None, ExecutionResult(data=None, errors=validation_errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if request.method.lower() == "get" and operation_ast is not None \
+                and operation_ast.operation != OperationType.QUERY:
+            if show_graphiql:
+                return None, None, None, None
+            raise HttpError(HttpResponseNotAllowed(
+                ["POST"], f"Can only perform a {operation_ast.operation.value} operation from a POST request."
+            ))
+        if operation_ast is not None and operation_ast.operation == OperationType.SUBSCRIPTION:
+            path = getattr(settings, 'GRAPHQL_WEBSOCKET_PATH', '/graphql')
+            return None, None, None, ExecutionResult(errors=[GraphQLError(
+                f"Subscriptions are served over WebSocket at {path}")])
+
+        profile = getattr(request, 'graphql_profile', None)
+        if profile is not None and operation_ast is not None and operation_ast.name is not None:
+            profile.operation_name = operation_ast.name.value
+        return document, operation_ast, query_hash, None
+
+    def get_cached_result(self, request, document, operation_ast, query_hash, operation_name, variables):
+        """
+        :returns: (cache key, cached result), the key is None for operations that are not cached
+        """
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return None, None
+        read_models = get_document_read_models(self.schema.graphql_schema, document, query_hash)
+        cache_key = get_response_cache_key(query_hash, operation_name, variables, read_models)
+        cached = get_cached_response(cache_key)
+        if cached is None:
+            return cache_key, None
+        request.graphql_extensions = cached["extensions"]
+        return cache_key, ExecutionResult(data=cached["data"])
+
+    def validate_cost(self, request, document, variables):
+        return validate(self.schema.graphql_schema, document,
+                        [get_query_cost_rule(variables, self.get_cost_reporter(request))])
+
+    @staticmethod
+    def cache_result(request, cache_key, result):
+        if cache_key is not None and not result.errors:
+            set_cached_response(cache_key, {"data": result.data,
+                                            "extensions": getattr(request, 'graphql_extensions', None)})
+
+    def get_execute_options(self, request, variables, operation_name):
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+        return execute_options
+
+    def execute_document(self, request, document, operation_ast, variables, operation_name):
+        schema = self.schema.graphql_schema
+        try:
+            execute_options = self.get_execute_options(request, variables, operation_name)
+
+            if operation_ast is not None and operation_ast.operation == OperationType.MUTATION:
+                with serialized_writes():
+                    if graphene_settings.ATOMIC_MUTATIONS is True \
+                            or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True:
+                        with transaction.atomic():
+                            result = execute(schema, document, **execute_options)
+                            if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                                transaction.set_rollback(True)
+                        return result
+                    return execute(schema, document, **execute_options)
+
+            if operation_ast is not None and operation_ast.operation == OperationType.QUERY:
+                with read_replica():
+                    return execute(schema, document, **execute_options)
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    @staticmethod
+    def get_extensions(request, data):
+        if isinstance(data, dict) and data.get("extensions"):
+            return data["extensions"]
+        return request.GET.get("extensions")
+
+    @staticmethod
+    def get_cost_reporter(request):
+        def report_cost(cost, depth):
+            request.graphql_extensions = {"cost": {
+                "estimated": cost, "maximum": getattr(settings, 'GRAPHQL_MAX_QUERY_COST', 10000),
+                "depth": depth, "maximumDepth": getattr(settings, 'GRAPHQL_MAX_QUERY_DEPTH', 10),
+            }}
+        return report_cost
+
+    def json_encode(self, request, d, pretty=False):
+        extensions = getattr(request, 'graphql_extensions', None)
+        if extensions:
+            d = {**d, "extensions": extensions}
+        return get_json_encoder().dumps(d, pretty=self.pretty or pretty or bool(request.GET.get("pretty")))
+
+
+class AsyncBatchedGraphQLView(BatchedGraphQLView):
+    """
+    ASGI counterpart of BatchedGraphQLView, with the same caching, cost limits and persisted queries.
+
+    Queries are executed on the event loop: root fields and DataLoader batches run in worker threads, so
+    independent root fields of one document wait on the database at the same time, see
+    fb_post.async_execution. Mutations run as in BatchedGraphQLView, in one worker thread.
+    GraphiQL is served by the sync view.
+    """
+    view_is_async = True
+
+    @method_decorator(ensure_csrf_cookie)
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(HttpResponseNotAllowed(["GET", "POST"], "GraphQL only supports GET and POST requests."))
+
+            data = self.parse_body(request)
+            if self.batch:
+                responses = await asyncio.gather(*(self.get_async_response(request, entry) for entry in data))
+                return self.render_json(request, [response[0] for response in responses],
+                                        max((response[1] for response in responses), default=200))
+            return self.render_json(request, *await self.get_async_response(request, data))
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    async def get_async_response(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = await self.execute_graphql_request_async(request, data, query, variables, operation_name)
+        return self.get_result_data(request, execution_result, id)
+
+    @staticmethod
+    async def get_streaming_content(chunks):
+        # an async iterator lets the ASGI handler send each chunk as it is encoded
+        for chunk in chunks:
+            yield chunk
+
+    async def execute_graphql_request_async(self, request, data, query, variables, operation_name):
+        document, operation_ast, query_hash, result = self.get_document(request, data, query, operation_name)
+        if document is None:
+            return result
+
+        cache_key, result = self.get_cached_result(request, document, operation_ast, query_hash, operation_name,
+                                                   variables)
+        if result is not None:
+            return result
+
+        # the cost estimate may read table statistics
+        cost_errors = await database_sync_to_async(self.validate_cost)(request, document, variables)
+        if cost_errors:
+            return ExecutionResult(data=None, errors=cost_errors)
+
+        if operation_ast is not None and operation_ast.operation == OperationType.QUERY:
+            result = await self.execute_query_async(request, document, variables, operation_name)
+        else:
+            result = await database_sync_to_async(self.execute_document)(
+                request, document, operation_ast, variables, operation_name)
+        self.cache_result(request, cache_key, result)
+        return result
+
+    async def execute_query_async(self, request, document, variables, operation_name):
+        try:
+            execute_options = self.get_execute_options(request, variables, operation_name)
+            execute_options["context_value"].loaders = AsyncLoaders()
+            execute_options["middleware"] = [*(execute_options["middleware"] or []), AsyncDatabaseMiddleware()]
+            with read_replica():
+                result = execute(self.schema.graphql_schema, document, **execute_options)
+                if isawaitable(result):
+                    result = await result
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+async def iterate_in_sync_thread(iterator):
+    """
+    Async iterator over a sync one reading from the database, advanced in the thread sync views run in, so
+    an ASGI server sends each chunk as it is read
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await next_chunk(iterator, None)) is not None:
+        yield chunk
+
+
+def check_bearer_token(request, token):
+    """
+    :returns: the response refusing a request that does not send "Authorization: Bearer <token>", None when it
+        does; a 404 when no token is configured, so the endpoint is disabled by default
+    """
+    if not token:
+        return HttpResponseNotFound()
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponseForbidden()
+    return None
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Requests must send "Authorization: Bearer <settings.METRICS_API_TOKEN>", the
+    endpoint is disabled without a token.
+    """
+    refused = check_bearer_token(request, getattr(settings, 'METRICS_API_TOKEN', None))
+    if refused is not None:
+        return refused
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4")
+
+
+@require_GET
+def export_posts_view(request):
+    """
+    Streams the export_posts command output. ?format=ndjson (default) or csv, ?table= for CSV and ?after= a
+    watermark; the watermark of this export is returned in the X-Export-Watermark header. Requests must
+    send "Authorization: Bearer <settings.EXPORT_API_TOKEN>", the endpoint is disabled without a token.
+    """
+    refused = check_bearer_token(request, getattr(settings, 'EXPORT_API_TOKEN', None))
+    if refused is not None:
+        return refused
+
+    export_format = request.GET.get("format", "ndjson")
+    table = request.GET.get("table", "posts")
+    if export_format not in ("ndjson", "csv") or table not in CSV_COLUMNS:
+        return HttpResponseBadRequest(f"format is ndjson or csv, table one of {', '.join(CSV_COLUMNS)}")
+    try:
+        export = PostExport(request.GET.get("after"))
+    except Exception as error:
+        return HttpResponseBadRequest(f"Invalid watermark: {error}")
+
+    if export_format == "ndjson":
+        chunks, content_type = export.iter_ndjson(), "application/x-ndjson"
+    else:
+        chunks, content_type = export.iter_csv(table), "text/csv; charset=utf-8"
+    if isinstance(request, ASGIRequest):
+        chunks = iterate_in_sync_thread(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    if export.watermark:
+        response["X-Export-Watermark"] = export.watermark
+    return response